@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the analysis functions on synthetic SAP extracts
+
+Generates USR02, AGR_USERS, USR12, AGR_1251 and AGR_AGRS extracts of the requested size,
+parses them the way uploads are parsed, and times each analyzer. With
+--baseline, the row by row analyzers pinned in benchmarks/reference are
+timed on the same data, to reproduce the speedup of the vectorized ones;
+each analyzer must return the same results as its baseline first.
+
+Usage:
+    python benchmarks/bench_analyzers.py --users 300000 --repeat 3
+    python benchmarks/bench_analyzers.py --users 100000 --baseline
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# Add the service directory to the Python path to make imports work
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions.file_parser import parse_file_to_dataframe
+from functions.data_loader import validate_data
+from functions.user_analyzer import analyze_users
+from functions.role_analyzer import analyze_roles
+from functions.auth_analyzer import AuthorizationRecords, analyze_authorizations
+from functions.risk_scorer import get_risk_features, score_users
+from functions.sod_analyzer import analyze_sod
+from functions.cross_analyzer import analyze_cross
+from functions.value_index import AuthorizationValueIndex, get_users_with_access
+from functions.critical_access import analyze_critical_access
+from functions.role_hierarchy import RoleHierarchy
+from functions.role_mining import analyze_role_mining
+from functions.redundant_roles import analyze_redundant_roles
+from functions.effective_auth import EFFECTIVE_AUTH_KEY, build_effective_authorizations
+from benchmarks.reference import user_analyzer as reference_users
+from benchmarks.reference import role_analyzer as reference_roles
+from benchmarks.reference import auth_analyzer as reference_auths
+
+# Analyzers timed by the benchmark, in order
+BENCHMARKS = [
+    ('analyze_users', analyze_users),
+    ('analyze_roles', analyze_roles),
+    ('analyze_authorizations', analyze_authorizations),
+    ('analyze_cross', analyze_cross)
+]
+
+# Row by row implementations the analyzers replaced, timed with --baseline
+BASELINES = {
+    'analyze_users': reference_users.analyze_users,
+    'analyze_roles': reference_roles.analyze_roles,
+    'analyze_authorizations': reference_auths.analyze_authorizations
+}
+
+
+def make_extracts(n_users, seed=0):
+    """
+    Generate synthetic USR02, AGR_USERS, USR12, AGR_1251 and AGR_AGRS extracts.
+
+    Args:
+        n_users (int): Number of users in USR02
+        seed (int): Random seed
+
+    Returns:
+        dict: Mapping of table key to CSV bytes
+    """
+    rng = np.random.default_rng(seed)
+    clients = rng.choice(['100', '200'], n_users)
+    users = np.array([f"USER{i:07d}" for i in range(n_users)])
+
+    usr02 = pd.DataFrame({
+        'MANDT': clients,
+        'BNAME': users,
+        'USTYP': rng.choice(['A', 'B', 'C', 'L', 'S', ''], n_users),
+        'UFLAG': rng.choice(['0', '64', '128', 'X'], n_users),
+        'GLTGV': rng.choice(['20200101', '20210615', '00000000'], n_users),
+        'GLTGB': rng.choice(['99991231', '20230101', '20261231', ''], n_users),
+        'TRDAT': rng.choice(['', '20240101', '20250310', '20231215', '00000000'], n_users),
+        'LTIME': rng.choice(['', '101500', '235959', '000000'], n_users),
+        'PWDLGNDATE': rng.choice(['', '20220101', '20240701'], n_users),
+        'PWDLGNTIME': rng.choice(['', '083000', '120000'], n_users),
+        'PWDINITIAL': rng.choice(['', 'X'], n_users)
+    })
+
+    roles = np.array([f"Z_ROLE_{i:03d}" for i in range(200)] + ['SAP_ALL', 'SAP_NEW'])
+    role_count = rng.integers(0, 6, n_users)
+    role_users = np.repeat(np.arange(n_users), role_count)
+    agr_users = pd.DataFrame({
+        'MANDT': clients[role_users],
+        'AGR_NAME': rng.choice(roles, len(role_users)),
+        'UNAME': users[role_users],
+        'FROM_DAT': '20200101',
+        'TO_DAT': rng.choice(['99991231', '20230101', '20270101', ''], len(role_users)),
+        'EXCLUDE': rng.choice(['', 'X'], len(role_users), p=[0.9, 0.1]),
+        'ORG_FLAG': ''
+    })
+
+    objects = np.array(['S_TCODE', 'S_USER_GRP', 'S_ADMI_FCD', 'S_DEVELOP', 'F_BKPF_BUK', 'S_TABU_DIS'])
+    auth_count = rng.integers(0, 8, n_users)
+    auth_users = np.repeat(np.arange(n_users), auth_count)
+    usr12 = pd.DataFrame({
+        'MANDT': clients[auth_users],
+        'UNAME': users[auth_users],
+        'OBJCT': rng.choice(objects, len(auth_users)),
+        'AUTH': rng.choice(['A1', 'A2', 'A3'], len(auth_users)),
+        'FIELD': rng.choice(['ACTVT', 'TCD', 'BUKRS', 'DICBERCLS'], len(auth_users)),
+        'VON': rng.choice(['*', '01', '02', '03', 'SU01', 'SE38', 'Z*', '1000'], len(auth_users)),
+        'BIS': rng.choice(['', '03', '*', '2000'], len(auth_users))
+    })
+
+    # Authorization values of every role of both clients
+    role_clients = np.repeat(['100', '200'], len(roles))
+    role_names = np.tile(roles, 2)
+    value_count = rng.integers(20, 400, len(role_names))
+    value_roles = np.repeat(np.arange(len(role_names)), value_count)
+    agr_1251 = pd.DataFrame({
+        'MANDT': role_clients[value_roles],
+        'AGR_NAME': role_names[value_roles],
+        'OBJECT': rng.choice(objects, len(value_roles)),
+        'AUTH': rng.choice(['T1', 'T2'], len(value_roles)),
+        'FIELD': rng.choice(['ACTVT', 'TCD', 'BUKRS', 'DICBERCLS'], len(value_roles)),
+        'LOW': rng.choice(['*', '01', '02', '03', 'SU01', 'SE38', 'PF*', '1000'], len(value_roles)),
+        'HIGH': rng.choice(['', '03', '2000'], len(value_roles)),
+        'DELETED': rng.choice(['', 'X'], len(value_roles), p=[0.95, 0.05])
+    })
+
+    # The last 50 roles are composites of 3 to 10 other roles, some nested
+    member_count = rng.integers(3, 11, 2 * 50)
+    composites = np.repeat(np.arange(len(roles) - 50, len(roles)), 2)
+    member_composites = np.repeat(composites, member_count)
+    agr_agrs = pd.DataFrame({
+        'MANDT': np.repeat(np.tile(['100', '200'], 50), member_count),
+        'AGR_NAME': roles[member_composites],
+        'CHILD_AGR': roles[rng.integers(0, len(roles) - 40, len(member_composites))]
+    })
+
+    return {
+        table: df.to_csv(sep=';', index=False).encode('utf-8')
+        for table, df in [
+            ('usr02', usr02), ('agr_users', agr_users), ('usr12', usr12),
+            ('agr_1251', agr_1251), ('agr_agrs', agr_agrs)
+        ]
+    }
+
+
+def check_baseline(name, result, expected):
+    """
+    Check that an analyzer returns the same results as its baseline.
+    
+    Keys the baseline does not return (indexes and encodings) are ignored,
+    and columnar authorization records are compared as a list of dicts.
+    
+    Args:
+        name (str): Analyzer name
+        result (dict): Result of the analyzer
+        expected (dict): Result of the baseline analyzer
+        
+    Raises:
+        AssertionError: If a result differs from the baseline
+    """
+    for key, value in expected.items():
+        actual = result.get(key)
+        if isinstance(actual, AuthorizationRecords):
+            actual = list(actual)
+        assert actual == value, f"{name} differs from its baseline in '{key}'"
+
+
+def check_composite_validity():
+    """
+    Check that expanding composite roles keeps the active assignment of a
+    single role granted with several validities.
+    
+    BOB holds S_ROLE through an expired composite (C_OLD), then through an
+    active one (C_NEW), and also directly with an expired validity.
+    
+    Raises:
+        AssertionError: If S_ROLE is not actively assigned after expansion
+    """
+    agr_agrs = pd.DataFrame({
+        'MANDT': ['100', '100'],
+        'AGR_NAME': ['C_OLD', 'C_NEW'],
+        'CHILD_AGR': ['S_ROLE', 'S_ROLE']
+    })
+    hierarchy = RoleHierarchy(agr_agrs)
+    for first_role in ['C_OLD', 'S_ROLE']:
+        agr_users = pd.DataFrame({
+            'MANDT': ['100', '100'],
+            'AGR_NAME': [first_role, 'C_NEW'],
+            'UNAME': ['BOB', 'BOB'],
+            'FROM_DAT': ['20100101', '20200101'],
+            'TO_DAT': ['20151231', '99991231'],
+            'EXCLUDE': ['', '']
+        })
+        data = {'agr_users_df': hierarchy.expand(agr_users)}
+        with contextlib.redirect_stdout(io.StringIO()):
+            role_analysis = analyze_roles(data)
+        active = [
+            assignment['role_name']
+            for assignment, is_active in zip(role_analysis['role_assignments'], role_analysis['assignment_active'])
+            if is_active
+        ]
+        assert 'S_ROLE' in active, f"S_ROLE inactive after expanding {first_role} and C_NEW"
+
+
+def make_sod_rules(n_rules, seed=0):
+    """
+    Generate synthetic SoD rules over the roles and objects of make_extracts.
+    
+    Args:
+        n_rules (int): Number of rules
+        seed (int): Random seed
+        
+    Returns:
+        list: Conflict rules, as in CONFIG['sod_rules']
+    """
+    rng = np.random.default_rng(seed)
+    objects = ['S_TCODE', 'S_USER_GRP', 'S_ADMI_FCD', 'S_DEVELOP', 'F_BKPF_BUK', 'S_TABU_DIS']
+    
+    def role_set():
+        # Exact names, with a prefix pattern now and then
+        roles = [f"Z_ROLE_{i:03d}" for i in rng.integers(0, 200, rng.integers(1, 4))]
+        if rng.random() < 0.05:
+            roles.append(f"Z_ROLE_{rng.integers(0, 20):02d}*")
+        rule_set = {'roles': roles}
+        if rng.random() < 0.02:
+            rule_set['objects'] = [str(rng.choice(objects))]
+        return rule_set
+    
+    return [
+        {'conflict_type': f"rule_{i}", 'sets': [role_set(), role_set()]}
+        for i in range(n_rules)
+    ]
+
+
+def make_critical_rules(n_rules, seed=0):
+    """
+    Generate synthetic critical access rules over the USR12 values of make_extracts.
+    
+    Args:
+        n_rules (int): Number of rules
+        seed (int): Random seed
+        
+    Returns:
+        list: Critical access rules, as in CONFIG['critical_access_rules']
+    """
+    rng = np.random.default_rng(seed)
+    objects = ['S_TCODE', 'S_USER_GRP', 'S_ADMI_FCD', 'S_DEVELOP', 'F_BKPF_BUK', 'S_TABU_DIS']
+    fields = ['ACTVT', 'TCD', 'BUKRS', 'DICBERCLS']
+    values = ['01', '02', '03', 'SU01', 'SE38', 'ZX01', '1000', '1500', '2500']
+    
+    def condition():
+        if rng.random() < 0.1:
+            return {'object': str(rng.choice(objects))}
+        return {'object': str(rng.choice(objects)), 'field': str(rng.choice(fields)), 'value': str(rng.choice(values))}
+    
+    return [
+        {'rule_id': f"rule_{i}", 'conditions': [condition() for _ in range(rng.integers(1, 4))]}
+        for i in range(n_rules)
+    ]
+
+
+def load_extracts(extracts):
+    """
+    Parse and validate synthetic extracts like uploaded files.
+
+    Args:
+        extracts (dict): Mapping of table key to CSV bytes
+
+    Returns:
+        dict: Data dictionary expected by the analyzers
+    """
+    data = {}
+    for table, content in extracts.items():
+        df, _ = parse_file_to_dataframe(f"{table}.csv", io.BytesIO(content), table=table)
+        data[f"{table}_df"] = df
+    validate_data(data)
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SAP analyzers on synthetic data")
+    parser.add_argument('--users', type=int, default=100000, help="Number of USR02 users")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per analyzer (best is reported)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    parser.add_argument('--sod-rules', type=int, default=1000, help="Number of SoD rules")
+    parser.add_argument('--critical-rules', type=int, default=1000, help="Number of critical access rules")
+    parser.add_argument(
+        '--baseline', action='store_true',
+        help="Also time the row by row reference analyzers (once each, slow)"
+    )
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = load_extracts(make_extracts(args.users, args.seed))
+    print(
+        f"USR02: {len(data['usr02_df'])} rows, AGR_USERS: {len(data['agr_users_df'])} rows, "
+        f"USR12: {len(data['usr12_df'])} rows, AGR_1251: {len(data['agr_1251_df'])} rows, "
+        f"AGR_AGRS: {len(data['agr_agrs_df'])} rows"
+    )
+
+    for name, analyzer in BENCHMARKS:
+        if args.baseline and name in BASELINES:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = BASELINES[name](data)
+            baseline_seconds = time.perf_counter() - started
+            with contextlib.redirect_stdout(io.StringIO()):
+                check_baseline(name, analyzer(data), expected)
+        
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            # The analyzers log progress to stdout
+            with contextlib.redirect_stdout(io.StringIO()):
+                analyzer(data)
+            timings.append(time.perf_counter() - started)
+        print(f"{name}: best {min(timings):.3f}s over {args.repeat} runs")
+        
+        if args.baseline and name in BASELINES:
+            print(
+                f"{name} baseline (iterrows): {baseline_seconds:.3f}s, "
+                f"{baseline_seconds / min(timings):.1f}x slower"
+            )
+    
+    # Composite role closure, then expansion of the assignments through it
+    check_composite_validity()
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        hierarchy = RoleHierarchy(data['agr_agrs_df'])
+        timings.append(time.perf_counter() - started)
+    print(f"role hierarchy closure: best {min(timings):.3f}s over {args.repeat} runs ({hierarchy.pair_count} pairs)")
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        expanded = hierarchy.expand(data['agr_users_df'])
+        timings.append(time.perf_counter() - started)
+    print(
+        f"composite role expansion: best {min(timings):.3f}s over {args.repeat} runs "
+        f"({len(expanded) - len(data['agr_users_df'])} assignments added)"
+    )
+    
+    # Risk scoring and SoD detection run on the analysis results
+    with contextlib.redirect_stdout(io.StringIO()):
+        user_analysis = analyze_users(data)
+        role_analysis = analyze_roles(data)
+        auth_analysis = analyze_authorizations(data)
+        features = get_risk_features(user_analysis, auth_analysis)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        score_users(features)
+        timings.append(time.perf_counter() - started)
+    print(f"score_users: best {min(timings):.3f}s over {args.repeat} runs")
+    
+    rules = make_sod_rules(args.sod_rules, args.seed)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            sod_analysis = analyze_sod(role_analysis, auth_analysis, rules)
+        timings.append(time.perf_counter() - started)
+    print(
+        f"analyze_sod: best {min(timings):.3f}s over {args.repeat} runs "
+        f"({len(rules)} rules, {sod_analysis['count']} conflicts)"
+    )
+    
+    # Value index build, then "who can run SU01" queries on the cached index
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        auth_analysis['value_index'] = AuthorizationValueIndex(auth_analysis['authorizations'])
+        timings.append(time.perf_counter() - started)
+    print(f"value_index build: best {min(timings):.3f}s over {args.repeat} runs")
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        access = get_users_with_access(auth_analysis, 'S_TCODE', 'TCD', 'SU01')
+        timings.append(time.perf_counter() - started)
+    print(f"get_users_with_access: best {min(timings):.3f}s over {args.repeat} runs ({access['count']} users)")
+    
+    rules = make_critical_rules(args.critical_rules, args.seed)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            critical_access = analyze_critical_access(auth_analysis, rules)
+        timings.append(time.perf_counter() - started)
+    print(
+        f"analyze_critical_access: best {min(timings):.3f}s over {args.repeat} runs "
+        f"({len(rules)} rules, {critical_access['matched_rules']} matched)"
+    )
+    
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            role_mining = analyze_role_mining(role_analysis)
+        timings.append(time.perf_counter() - started)
+    print(
+        f"analyze_role_mining: best {min(timings):.3f}s over {args.repeat} runs "
+        f"({role_mining['profile_count']} role sets, {role_mining['cluster_count']} clusters)"
+    )
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            redundant_roles = analyze_redundant_roles(role_analysis)
+        timings.append(time.perf_counter() - started)
+    print(
+        f"analyze_redundant_roles: best {min(timings):.3f}s over {args.repeat} runs "
+        f"({len(redundant_roles['identical_groups'])} identical groups, {redundant_roles['subset_count']} subsets)"
+    )
+    
+    # Authorizations held through roles, then queries and scoring with them
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            effective = build_effective_authorizations(data, role_analysis)
+        timings.append(time.perf_counter() - started)
+    print(f"build_effective_authorizations: best {min(timings):.3f}s over {args.repeat} runs")
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        holders = effective.condition_users('S_TCODE', 'TCD', 'SU01')
+        timings.append(time.perf_counter() - started)
+    print(f"effective condition_users: best {min(timings):.3f}s over {args.repeat} runs ({len(holders)} users)")
+    auth_analysis[EFFECTIVE_AUTH_KEY] = effective
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        get_risk_features(user_analysis, auth_analysis)
+        timings.append(time.perf_counter() - started)
+    print(f"get_risk_features with roles: best {min(timings):.3f}s over {args.repeat} runs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+"""
+Reference implementations for the benchmarks
+
+Pinned copies of the row by row analyzers, timed by
+bench_analyzers.py --baseline next to the current ones.
+"""
@@ -5,6 +5,10 @@ Config package for SAP User Analysis Tool
 from config.config import (
     CONFIG, 
     REQUIRED_FIELDS, 
+    OPTIONAL_FIELDS,
+    CATEGORICAL_FIELDS,
+    SAP_DATE_FIELDS,
+    SAP_TIME_FIELDS,
     SAP_MANDT_FIELD, 
     SAP_USER_FIELD, 
     SAP_ROLE_USER_FIELD, 
@@ -14,6 +18,10 @@ from config.config import (
 __all__ = [
     'CONFIG',
     'REQUIRED_FIELDS',
+    'OPTIONAL_FIELDS',
+    'CATEGORICAL_FIELDS',
+    'SAP_DATE_FIELDS',
+    'SAP_TIME_FIELDS',
     'SAP_MANDT_FIELD',
     'SAP_USER_FIELD',
     'SAP_ROLE_USER_FIELD',
@@ -9,10 +9,25 @@ CONFIG = {
     'usr02_file': 'usr02.csv',
     'agr_users_file': 'agr_users.csv',
     'usr12_file': 'usr12.csv',
+    'agr_1251_file': 'agr_1251.csv',  # Optional: role authorization values
+    'agr_agrs_file': 'agr_agrs.csv',  # Optional: composite role members
     
     # Input file directory (default is current directory)
     'input_dir': '.',
     
+    # Loading configuration
+    'mandt': None,  # Only keep rows for this client (None keeps all clients)
+    'read_chunk_rows': 500000,  # Rows parsed per chunk when filtering by client
+    'parse_workers': 3,  # Threads parsing uploaded tables concurrently
+    
+    # Parsed table cache (shared on disk between workers)
+    'table_cache_enabled': True,
+    'table_cache_dir': None,  # None means a directory in the system temp dir
+    'table_cache_max_bytes': 2 * 1024 ** 3,  # Least recently used entries are evicted above this size
+    
+    # Composite role closures (AGR_AGRS) kept in memory, by content hash
+    'role_hierarchy_cache_size': 16,
+    
     # Output configuration
     'output_file': None,  # None means output to console
     'output_format': 'text',  # Options: 'text', 'csv', 'html', 'json'
@@ -37,12 +52,137 @@ CONFIG = {
         'S': 'Service User'
     },
     
+    # Risk scoring configuration
+    'critical_auth_objects': ['S_ADMI_FCD', 'SAP_ALL', 'S_DEVELOP'],
+    'risk_weights': {
+        'user_type': {  # Base points per user type
+            'Dialog User': 10,
+            'System User': 20,
+            'Communication User': 15
+        },
+        'initial_password': 25,
+        'expired_unlocked': 15,  # Account expired but not locked
+        'critical_object': 20,  # Per critical authorization object held
+        'wildcard': 2,  # Per wildcard authorization value
+        'wildcard_cap': 20,  # Maximum wildcard penalty
+        'max_score': 100
+    },
+    
+    # Segregation of duties rules: a user conflicts with a rule when their
+    # active roles or authorization objects match every set of the rule
+    # (patterns accept * and ? wildcards and ignore case)
+    'sod_rules': [
+        {
+            'conflict_type': 'finance_payment',
+            'sets': [
+                {'roles': ['*FI_GL_POST*', '*FI_AP_INVOICE*', '*FI_AR_INVOICE*']},
+                {'roles': ['*FI_PAYMENT*', '*F110*']}
+            ]
+        },
+        {
+            'conflict_type': 'purchase_payment',
+            'sets': [
+                {'roles': ['*MM_PURCHAS*', '*MM_PO_CREATE*', '*ME21N*']},
+                {'roles': ['*FI_PAYMENT*', '*F110*']}
+            ]
+        },
+        {
+            'conflict_type': 'system_admin_finance',
+            'sets': [
+                {'roles': ['SAP_ALL', '*BASIS_ADMIN*'], 'objects': ['S_ADMI_FCD']},
+                {'roles': ['*FI_*'], 'objects': ['F_BKPF_BUK']}
+            ]
+        }
+    ],
+    
+    # Critical access rules: a user matches a rule when their authorizations
+    # satisfy all of its conditions (an object, optionally with a field value;
+    # VON/BIS ranges and trailing * wildcards are honoured). Conditions on the
+    # same object must be satisfied by a single authorization (same AUTH) of
+    # the user; without the AUTH field, by any authorizations of the object
+    'critical_access_rules': [
+        {
+            'rule_id': 'system_administration',
+            'description': 'System administration functions (S_ADMI_FCD)',
+            'risk': 'high',
+            'conditions': [{'object': 'S_ADMI_FCD'}]
+        },
+        {
+            'rule_id': 'development',
+            'description': 'ABAP development workbench access (S_DEVELOP)',
+            'risk': 'high',
+            'conditions': [{'object': 'S_DEVELOP'}]
+        },
+        {
+            'rule_id': 'user_maintenance',
+            'description': 'Create or change users (SU01 with S_USER_GRP change)',
+            'risk': 'high',
+            'conditions': [
+                {'object': 'S_TCODE', 'field': 'TCD', 'value': 'SU01'},
+                {'object': 'S_USER_GRP', 'field': 'ACTVT', 'value': '02'}
+            ]
+        },
+        {
+            'rule_id': 'role_maintenance',
+            'description': 'Change roles (PFCG with S_USER_AGR change)',
+            'risk': 'high',
+            'conditions': [
+                {'object': 'S_TCODE', 'field': 'TCD', 'value': 'PFCG'},
+                {'object': 'S_USER_AGR', 'field': 'ACTVT', 'value': '02'}
+            ]
+        },
+        {
+            'rule_id': 'debug_replace',
+            'description': 'Change values in the debugger (S_DEVELOP DEBUG with change)',
+            'risk': 'high',
+            'conditions': [
+                {'object': 'S_DEVELOP', 'field': 'OBJTYPE', 'value': 'DEBUG'},
+                {'object': 'S_DEVELOP', 'field': 'ACTVT', 'value': '02'}
+            ]
+        },
+        {
+            'rule_id': 'table_maintenance',
+            'description': 'Maintain tables directly (SM30 with S_TABU_DIS change)',
+            'risk': 'medium',
+            'conditions': [
+                {'object': 'S_TCODE', 'field': 'TCD', 'value': 'SM30'},
+                {'object': 'S_TABU_DIS', 'field': 'ACTVT', 'value': '02'}
+            ]
+        },
+        {
+            'rule_id': 'program_execution',
+            'description': 'Run any report (SA38)',
+            'risk': 'medium',
+            'conditions': [{'object': 'S_TCODE', 'field': 'TCD', 'value': 'SA38'}]
+        }
+    ],
+    
+    'critical_access_max_users': 1000,  # Users listed per critical access rule (None lists them all)
+    
+    # Cross analysis configuration
+    'inactive_login_days': 90,  # Unlocked accounts without a login for longer are inactive
+    'critical_inactive_days': 180,  # Inactive accounts without a login for longer are critical
+    'high_privilege_roles': ['SAP_ALL', 'SAP_NEW', '*ADMIN*', '*BASIS*'],  # Role name patterns (* and ? wildcards)
+    'shared_high_privilege_min_users': 2,  # High privilege roles held by this many users are reported as shared
+    
+    # Role mining configuration: users whose active role sets have a Jaccard
+    # similarity of at least the threshold are clustered
+    'role_mining_threshold': 0.8,
+    'role_mining_hashes': 100,  # MinHash values per role set (more find more similar pairs, slower)
+    'role_mining_max_clusters': 100,  # Largest clusters reported (None reports them all)
+    'role_mining_max_users': 100,  # Users listed per cluster and outliers listed (None lists them all)
+    
+    # Redundant roles configuration
+    'redundant_roles_min_users': 2,  # Roles with fewer active users are not reported
+    'redundant_roles_max_results': 1000,  # Identical groups and subsets reported (None reports them all)
+    
     # Statistics configuration
     'recent_login_days': 30,  # Number of days to consider for "recent login" statistic
     'top_roles_count': 5,  # Number of top roles to show in summary
     
     # Report section flags (enable/disable sections)
     'include_user_details': True,
+    'user_report_fields': None,  # Fields of each report user (None means details, roles, authorizations and risk_score)
     'include_role_details': True,
     'include_auth_details': True,
     'include_summary': True
@@ -65,5 +205,29 @@ REQUIRED_FIELDS = {
     ],
     'usr12': [
         'MANDT', 'UNAME', 'OBJCT', 'FIELD', 'VON', 'BIS'
+    ],
+    'agr_1251': [
+        'MANDT', 'AGR_NAME', 'OBJECT', 'FIELD', 'LOW', 'HIGH'
+    ],
+    'agr_agrs': [
+        'MANDT', 'AGR_NAME', 'CHILD_AGR'
     ]
-}
\ No newline at end of file
+}
+
+# Fields read when present even though the analysis can run without them
+OPTIONAL_FIELDS = {
+    'usr02': ['UFLAG', 'PWDINITIAL'],
+    'agr_users': ['EXCLUDE', 'ORG_FLAG'],
+    'usr12': ['AUTH'],
+    'agr_1251': ['AUTH', 'DELETED'],
+    'agr_agrs': []
+}
+
+# Fields loaded as categoricals (low-cardinality codes)
+CATEGORICAL_FIELDS = ['MANDT', 'USTYP', 'AGR_NAME', 'CHILD_AGR', 'OBJCT', 'OBJECT', 'FIELD']
+
+# Fields holding SAP dates (YYYYMMDD), loaded as Int32 with 00000000 as missing
+SAP_DATE_FIELDS = ['GLTGV', 'GLTGB', 'TRDAT', 'PWDLGNDATE', 'FROM_DAT', 'TO_DAT']
+
+# Fields holding SAP times (HHMMSS), loaded as Int32 with 000000 as missing
+SAP_TIME_FIELDS = ['LTIME', 'PWDLGNTIME']
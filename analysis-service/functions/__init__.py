@@ -8,20 +8,69 @@ This package contains modules for various analysis functions:
 - auth_analyzer: Analyze user authorizations (USR12)
 - report_generator: Generate reports from analysis results
 - formatters: Utility functions to format SAP data
+- file_parser: Parse uploaded extract files into DataFrames
+- table_cache: Content-addressed on-disk cache of parsed tables
+- user_index: Per-user row indexes for drill-downs
+- encoding: Shared integer IDs of users, roles and authorization objects
+- risk_scorer: Vectorized user risk scoring
+- sod_analyzer: Segregation of duties conflicts
+- cross_analyzer: Cross-table findings (ghost users, inactive accounts, privileged access)
+- value_index: Authorization value index (who can access a value)
+- critical_access: Critical authorization combination rules
+- effective_auth: Authorizations held through roles (AGR_1251)
+- role_hierarchy: Composite role expansion (AGR_AGRS)
+- role_mining: Clusters of users with similar role sets (MinHash/LSH)
+- redundant_roles: Roles with identical or subsumed user populations
 """
 
 from functions.data_loader import load_data, validate_data
-from functions.user_analyzer import analyze_users, get_user_details
-from functions.auth_analyzer import analyze_authorizations, get_user_authorizations
+from functions.user_analyzer import UserRecords, analyze_users, get_user_details, index_users
+from functions.auth_analyzer import (
+    analyze_authorizations,
+    get_user_authorizations,
+    get_user_authorization_list,
+    AuthorizationRecords
+)
 from functions.role_analyzer import analyze_roles, get_user_roles
 from functions.report_generator import generate_report, output_report
+from functions.user_index import UserIndex
+from functions.encoding import DataEncoding, get_encoding
+from functions.risk_scorer import get_risk_features, score_users, RISK_FACTORS
+from functions.sod_analyzer import analyze_sod, get_compiled_ruleset, CompiledRuleset
+from functions.cross_analyzer import analyze_cross
+from functions.value_index import AuthorizationValueIndex, get_value_index, get_users_with_access
+from functions.critical_access import analyze_critical_access
+from functions.role_hierarchy import RoleHierarchy, get_role_hierarchy, expand_composite_roles
+from functions.role_mining import analyze_role_mining
+from functions.redundant_roles import analyze_redundant_roles
+from functions.effective_auth import (
+    EffectiveAuthorizations,
+    build_effective_authorizations,
+    get_role_users_with_access
+)
+from functions.file_parser import parse_file_to_dataframe, parse_workbook, sniff_dialect
+from functions.table_cache import (
+    TableCache,
+    get_table_cache,
+    parse_file_cached,
+    parse_workbook_cached,
+    upload_digest
+)
 from functions.formatters import (
     format_sap_date,
     format_sap_time,
     format_sap_datetime,
     format_user_type,
     format_boolean_flag,
-    format_validity_period
+    format_validity_period,
+    format_sap_date_series,
+    format_sap_time_series,
+    format_sap_datetime_series,
+    format_user_type_series,
+    format_boolean_flag_series,
+    format_validity_period_series,
+    decode_sap_date_series,
+    decode_sap_datetime_series
 )
 
 __all__ = [
@@ -32,6 +81,8 @@ __all__ = [
     # User analyzer
     'analyze_users',
     'get_user_details',
+    'index_users',
+    'UserRecords',
     
     # Role analyzer
     'analyze_roles',
@@ -40,16 +91,82 @@ __all__ = [
     # Auth analyzer
     'analyze_authorizations',
     'get_user_authorizations',
+    'get_user_authorization_list',
+    'AuthorizationRecords',
+    
+    # User index
+    'UserIndex',
+    
+    # Encoding
+    'DataEncoding',
+    'get_encoding',
+    
+    # Risk scorer
+    'get_risk_features',
+    'score_users',
+    'RISK_FACTORS',
+    
+    # SoD analyzer
+    'analyze_sod',
+    'get_compiled_ruleset',
+    'CompiledRuleset',
+    
+    # Cross analyzer
+    'analyze_cross',
+    
+    # Value index
+    'AuthorizationValueIndex',
+    'get_value_index',
+    'get_users_with_access',
+    
+    # Critical access
+    'analyze_critical_access',
+    
+    # Role hierarchy
+    'RoleHierarchy',
+    'get_role_hierarchy',
+    'expand_composite_roles',
+    
+    # Role mining
+    'analyze_role_mining',
+    
+    # Redundant roles
+    'analyze_redundant_roles',
+    
+    # Effective authorizations
+    'EffectiveAuthorizations',
+    'build_effective_authorizations',
+    'get_role_users_with_access',
     
     # Report generator
     'generate_report',
     'output_report',
     
+    # File parser
+    'parse_file_to_dataframe',
+    'parse_workbook',
+    'sniff_dialect',
+    
+    # Table cache
+    'TableCache',
+    'get_table_cache',
+    'parse_file_cached',
+    'parse_workbook_cached',
+    'upload_digest',
+    
     # Formatters
     'format_sap_date',
     'format_sap_time',
     'format_sap_datetime',
     'format_user_type',
     'format_boolean_flag',
-    'format_validity_period'
+    'format_validity_period',
+    'format_sap_date_series',
+    'format_sap_time_series',
+    'format_sap_datetime_series',
+    'format_user_type_series',
+    'format_boolean_flag_series',
+    'format_validity_period_series',
+    'decode_sap_date_series',
+    'decode_sap_datetime_series'
 ]
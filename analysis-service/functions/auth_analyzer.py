@@ -5,9 +5,109 @@ Authorization analyzer module for the SAP User Analysis Tool
 This module analyzes authorization data from the USR12 table.
 """
 
+from collections.abc import Sequence
+import numpy as np
 import pandas as pd
+from functions.formatters import map_unique_values
+from functions.user_index import UserIndex
+from functions.encoding import get_encoding
 from config import CONFIG, SAP_MANDT_FIELD, SAP_AUTH_USER_FIELD
 
+# Typical wildcard patterns in SAP authorization values
+WILDCARD_PATTERNS = ['*', '%']
+
+
+class AuthorizationRecords(Sequence):
+    """
+    Read-only sequence of authorization records stored column by column.
+    
+    USR12 can hold tens of millions of rows, so the records are kept as
+    columns and only turned into dictionaries (client, username, object,
+    field, from_value, to_value, is_wildcard) when they are accessed.
+    
+    The columns may also hold an 'auth' Series, the authorization (AUTH) a
+    value belongs to, which is not part of the dictionaries.
+    """
+    
+    FIELDS = ['client', 'username', 'object', 'field', 'from_value', 'to_value', 'is_wildcard']
+    
+    # Records converted at a time while iterating
+    ITER_BLOCK_SIZE = 65536
+    
+    def __init__(self, columns, user_ids=None, object_ids=None):
+        """
+        Args:
+            columns (dict): One Series per field in FIELDS, all with the
+                same RangeIndex
+            user_ids (ndarray): Encoded user ID of each record, if known
+            object_ids (ndarray): Encoded object ID of each record (-1 for
+                no object), if known
+        """
+        self.columns = columns
+        self.user_ids = user_ids
+        self.object_ids = object_ids
+    
+    def __len__(self):
+        return len(self.columns['client'])
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(np.arange(len(self))[index])
+        return {field: self.columns[field].iat[index] for field in self.FIELDS}
+    
+    def __iter__(self):
+        for start in range(0, len(self), self.ITER_BLOCK_SIZE):
+            block = [
+                self.columns[field].iloc[start:start + self.ITER_BLOCK_SIZE].tolist()
+                for field in self.FIELDS
+            ]
+            for values in zip(*block):
+                yield dict(zip(self.FIELDS, values))
+    
+    def __repr__(self):
+        return f"AuthorizationRecords({len(self)} records)"
+    
+    def take(self, positions):
+        """
+        Select records by position.
+        
+        Args:
+            positions (array-like): Record positions
+            
+        Returns:
+            AuthorizationRecords: Selected records, in the given order
+        """
+        return AuthorizationRecords(
+            {field: values.take(positions).reset_index(drop=True) for field, values in self.columns.items()},
+            user_ids=None if self.user_ids is None else self.user_ids[positions],
+            object_ids=None if self.object_ids is None else self.object_ids[positions]
+        )
+    
+    def for_user(self, client, username):
+        """
+        Select the records of a user.
+        
+        Args:
+            client (str): Client ID
+            username (str): Username
+            
+        Returns:
+            AuthorizationRecords: Records of the user, in their original order
+        """
+        mask = (
+            (self.columns['client'] == client).to_numpy(dtype=bool)
+            & (self.columns['username'] == username).to_numpy(dtype=bool)
+        )
+        return self.take(np.flatnonzero(mask))
+    
+    def to_frame(self):
+        """
+        Returns:
+            DataFrame: One row per record, one column per field
+        """
+        return pd.DataFrame(self.columns, columns=self.FIELDS)
+
+
 def analyze_authorizations(data):
     """
     Analyze authorization data from the USR12 table.
@@ -59,86 +159,95 @@ def analyze_authorizations(data):
         print("WARNING: OBJCT column missing, returning empty analysis")
         return auth_analysis
     
-    # Get unique authorization objects
-    unique_objects = data['usr12_df']['OBJCT'].unique()
+    usr12_df = data['usr12_df']
+    encoding = get_encoding(data)
+    auth_analysis['encoding'] = encoding
+    
+    # Get unique authorization objects, in order of first appearance
+    object_codes, unique_objects = encoding.object_ids, encoding.objects
     auth_analysis['stats']['total_auth_objects'] = len(unique_objects)
     
     print(f"Found {len(unique_objects)} unique authorization objects")
     
-    # Process each authorization
-    for index, auth in data['usr12_df'].iterrows():
-        try:
-            # Get key fields with error handling
-            if SAP_MANDT_FIELD not in auth:
-                print(f"Warning: MANDT field ({SAP_MANDT_FIELD}) not found for auth at index {index}")
-                client = "000"  # Default client as fallback
-            else:
-                client = auth[SAP_MANDT_FIELD]
-            
-            if SAP_AUTH_USER_FIELD not in auth:
-                print(f"Error: Username field ({SAP_AUTH_USER_FIELD}) not found for auth at index {index}")
-                continue  # Skip this authorization
-            
-            username = auth[SAP_AUTH_USER_FIELD]
-            
-            if pd.isna(username) or str(username).strip() == '':
-                print(f"Warning: Empty username at index {index}, skipping")
-                continue
-            
-            if 'OBJCT' not in auth:
-                print(f"Error: OBJCT field not found for auth at index {index}")
-                continue
-                
-            object_name = auth['OBJCT']
-            field_name = auth.get('FIELD', '')
-            from_value = auth.get('VON', '')
-            to_value = auth.get('BIS', '')
-            
-            # Create authorization data structure
-            authorization = {
-                'client': client,
-                'username': username,
-                'object': object_name,
-                'field': field_name,
-                'from_value': from_value,
-                'to_value': to_value,
-                'is_wildcard': _is_wildcard_value(from_value, to_value)
-            }
-            
-            # Update statistics
-            auth_analysis['stats']['total_authorizations'] += 1
-            
-            # Track auth objects per user
-            user_key = f"{client}:{username}"
-            if user_key not in auth_analysis['stats']['auth_objects_per_user']:
-                auth_analysis['stats']['auth_objects_per_user'][user_key] = set()
-            auth_analysis['stats']['auth_objects_per_user'][user_key].add(object_name)
-            
-            # Track top auth objects
-            if object_name in auth_analysis['stats']['top_auth_objects']:
-                auth_analysis['stats']['top_auth_objects'][object_name] += 1
-            else:
-                auth_analysis['stats']['top_auth_objects'][object_name] = 1
-            
-            # Add authorization to results
-            auth_analysis['authorizations'].append(authorization)
-            
-        except Exception as e:
-            print(f"Error processing authorization at index {index}: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+    if SAP_MANDT_FIELD in usr12_df.columns:
+        clients = usr12_df[SAP_MANDT_FIELD]
+    else:
+        print(f"Warning: MANDT field ({SAP_MANDT_FIELD}) not found, using default client 000")
+        clients = pd.Series('000', index=usr12_df.index, dtype=object)
+    
+    def column(field):
+        if field in usr12_df.columns:
+            return usr12_df[field]
+        return pd.Series('', index=usr12_df.index, dtype=object)
+    
+    # Skip authorizations without a username
+    if SAP_AUTH_USER_FIELD not in usr12_df.columns:
+        print(f"Error: Username field ({SAP_AUTH_USER_FIELD}) not found, no authorization can be processed")
+    usernames = column(SAP_AUTH_USER_FIELD)
+    user_ids = encoding.user_ids['usr12']
+    has_username = user_ids >= 0
+    skipped = int((~has_username).sum())
+    if skipped:
+        print(f"Warning: {skipped} authorizations with an empty username skipped")
+    kept = np.flatnonzero(has_username)
+    
+    from_values = column('VON')
+    to_values = column('BIS')
+    is_wildcard = (_is_wildcard_column(from_values) | _is_wildcard_column(to_values)).to_numpy()
+    
+    def kept_rows(values):
+        return values.iloc[kept].reset_index(drop=True)
+    
+    auth_analysis['authorizations'] = AuthorizationRecords({
+        'client': kept_rows(clients),
+        'username': kept_rows(usernames),
+        'object': kept_rows(usr12_df['OBJCT']),
+        'field': kept_rows(column('FIELD')),
+        'from_value': kept_rows(from_values),
+        'to_value': kept_rows(to_values),
+        'is_wildcard': pd.Series(is_wildcard[kept]).astype(object),
+        **({'auth': kept_rows(usr12_df['AUTH'])} if 'AUTH' in usr12_df.columns else {})
+    }, user_ids=user_ids[kept], object_ids=object_codes[kept])
+    
+    # Index the authorizations of each user for drill-downs
+    records = auth_analysis['authorizations']
+    auth_analysis['user_index'] = UserIndex.from_ids(records.user_ids, encoding.user_keys)
+    
+    # Update statistics
+    auth_analysis['stats']['total_authorizations'] = len(kept)
+    
+    # Track distinct auth objects per user, users in order of first appearance
+    # (records without an object count as one NaN object)
+    user_codes, kept_user_ids = pd.factorize(records.user_ids)
+    kept_object_codes, kept_object_ids = pd.factorize(records.object_ids)
+    width = max(len(kept_object_ids), 1)
+    user_objects = pd.unique(user_codes.astype(np.int64) * width + kept_object_codes)
+    objects_per_user = np.bincount(user_objects // width, minlength=len(kept_user_ids))
+    auth_analysis['stats']['auth_objects_per_user'] = {
+        user_key: int(count)
+        for user_key, count in zip(encoding.user_labels(kept_user_ids), objects_per_user)
+    }
+    
+    # Track top auth objects, in order of first appearance
+    kept_object_counts = np.bincount(kept_object_codes, minlength=len(kept_object_ids))
+    auth_analysis['stats']['top_auth_objects'] = {
+        unique_objects[object_id] if object_id >= 0 else np.nan: int(count)
+        for object_id, count in zip(kept_object_ids.tolist(), kept_object_counts)
+    }
     
     # Calculate auth object frequency
-    auth_objects = data['usr12_df']['OBJCT'].value_counts().to_dict()
+    auth_counts = np.bincount(object_codes[object_codes >= 0], minlength=len(unique_objects))
     
     # Add auth object data
-    for object_name in unique_objects:
-        object_data = {
+    object_fields = _get_fields_per_object(object_codes, column('FIELD'), len(unique_objects))
+    auth_analysis['auth_objects'] = [
+        {
             'object_name': object_name,
-            'auth_count': auth_objects.get(object_name, 0),
-            'fields': _get_fields_for_object(data['usr12_df'], object_name)
+            'auth_count': int(auth_counts[code]),
+            'fields': object_fields[code]
         }
-        auth_analysis['auth_objects'].append(object_data)
+        for code, object_name in enumerate(unique_objects)
+    ]
     
     # Sort auth objects by count
     auth_analysis['auth_objects'] = sorted(
@@ -147,12 +256,6 @@ def analyze_authorizations(data):
         reverse=True
     )
     
-    # Convert sets to counts for auth_objects_per_user
-    for user_key in auth_analysis['stats']['auth_objects_per_user']:
-        auth_analysis['stats']['auth_objects_per_user'][user_key] = len(
-            auth_analysis['stats']['auth_objects_per_user'][user_key]
-        )
-    
     print(f"Analysis complete. Found {auth_analysis['stats']['total_authorizations']} authorizations")
     print("======= ANALYZE AUTHORIZATIONS FUNCTION COMPLETED =======\n")
     
@@ -173,10 +276,7 @@ def get_user_authorizations(auth_data, client, username):
     user_auths = {}
     
     # Filter authorizations for the user
-    user_auth_list = [
-        auth for auth in auth_data.get('authorizations', [])
-        if auth['client'] == client and auth['username'] == username
-    ]
+    user_auth_list = get_user_authorization_list(auth_data, client, username)
     
     # Group by object
     for auth in user_auth_list:
@@ -187,6 +287,29 @@ def get_user_authorizations(auth_data, client, username):
     
     return user_auths
 
+def get_user_authorization_list(auth_data, client, username):
+    """
+    Get the authorization records of a specific user.
+    
+    Args:
+        auth_data (dict): Authorization analysis data
+        client (str): Client ID
+        username (str): Username
+        
+    Returns:
+        Sequence: Authorization records of the user, in their original order
+    """
+    authorizations = auth_data.get('authorizations', [])
+    if 'user_index' in auth_data:
+        return authorizations.take(auth_data['user_index'].positions(client, username))
+    if isinstance(authorizations, AuthorizationRecords):
+        return authorizations.for_user(client, username)
+    
+    return [
+        auth for auth in authorizations
+        if auth['client'] == client and auth['username'] == username
+    ]
+
 def _is_wildcard_value(from_value, to_value):
     """
     Check if an authorization value is a wildcard.
@@ -198,31 +321,52 @@ def _is_wildcard_value(from_value, to_value):
     Returns:
         bool: True if wildcard, False otherwise
     """
-    # Check for typical wildcard patterns in SAP
-    wildcard_patterns = ['*', '%']
-    
     # Check if either value contains a wildcard
-    for pattern in wildcard_patterns:
+    for pattern in WILDCARD_PATTERNS:
         if str(from_value).strip() == pattern or str(to_value).strip() == pattern:
             return True
     
     return False
 
-def _get_fields_for_object(usr12_df, object_name):
+def _is_wildcard_column(values):
     """
-    Get list of unique fields for a specific authorization object.
+    Check a column of authorization values for wildcards.
     
     Args:
-        usr12_df (DataFrame): USR12 DataFrame
-        object_name (str): Authorization object name
+        values (Series): From or to values
         
     Returns:
-        list: List of field names
+        Series: True where the value is a wildcard, as _is_wildcard_value
+            decides it
+    """
+    return map_unique_values(
+        values, lambda value: str(value).strip() in WILDCARD_PATTERNS
+    ).astype(bool)
+
+def _get_fields_per_object(object_codes, fields, object_count):
     """
-    # Filter DataFrame for the object
-    object_auths = usr12_df[usr12_df['OBJCT'] == object_name]
+    Get the list of unique fields of every authorization object in one pass.
     
-    # Get unique fields
-    fields = object_auths['FIELD'].unique().tolist()
+    Args:
+        object_codes (ndarray): Object code of each USR12 row (-1 for missing)
+        fields (Series): FIELD column of USR12
+        object_count (int): Number of distinct objects
+        
+    Returns:
+        list: For each object code, its fields in order of first appearance
+    """
+    field_codes, field_names = pd.factorize(fields, use_na_sentinel=False)
+    field_names = np.asarray(field_names, dtype=object)
+    
+    # Distinct (object, field) pairs, in order of first appearance
+    valid = object_codes >= 0
+    pairs = pd.unique(
+        object_codes[valid].astype(np.int64) * max(len(field_names), 1) + field_codes[valid]
+    )
+    pair_objects = pairs // max(len(field_names), 1)
+    pair_fields = pairs % max(len(field_names), 1)
     
-    return fields
\ No newline at end of file
+    order = np.argsort(pair_objects, kind='stable')
+    bounds = np.searchsorted(pair_objects[order], np.arange(object_count + 1))
+    ordered_fields = field_names[pair_fields[order]].tolist()
+    return [ordered_fields[bounds[code]:bounds[code + 1]] for code in range(object_count)]
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Critical access analyzer module for the SAP User Analysis Tool
+
+This module evaluates a catalog of critical authorization combinations
+(CONFIG['critical_access_rules']) against the USR12 authorizations of every
+user. A rule lists conditions on an authorization object, optionally
+narrowed to a field value, e.g. S_TCODE TCD=SU01 together with S_USER_GRP
+ACTVT=02; a user matches a rule when their authorizations satisfy all of
+its conditions.
+
+Conditions on the same object must be satisfied by a single authorization
+of the user, e.g. S_DEVELOP OBJTYPE=DEBUG and ACTVT=02 in the same
+S_DEVELOP authorization (USR12 AUTH), not DEBUG display in one and change
+of programs in another. A rule is thus a set of requirements, one per
+object, each a group of conditions.
+
+Requirements are deduplicated across the catalog and each distinct one is
+resolved once to the sorted IDs of the users satisfying it, through the
+authorization value index (see functions.value_index), so VON/BIS ranges
+and prefix wildcards are honoured. A requirement with several conditions
+intersects the (holder, AUTH) keys of the records satisfying each of them.
+A rule is then the intersection of the user sets of its requirements,
+computed from the smallest set with binary searches.
+
+When AGR_1251 was loaded, a requirement is also satisfied by the users
+whose active roles grant it (see functions.effective_auth), through a
+single (role, AUTH) authorization.
+
+Without the AUTH field (in USR12, or in AGR_1251 when it was loaded), the
+authorizations a value belongs to are unknown: every condition is then a
+requirement of its own, satisfied by any authorization of the user.
+"""
+
+import numpy as np
+import pandas as pd
+from functions.value_index import get_value_index
+from functions.user_index import factorize_users
+from functions.effective_auth import EFFECTIVE_AUTH_KEY
+from config import CONFIG
+
+# Intersections probe the larger set by binary search when it is this many
+# times larger than the smaller one, and mark it in a mask otherwise
+SEARCH_RATIO = 16
+
+
+def analyze_critical_access(auth_analysis, rules=None, config=None):
+    """
+    Find the users matching each critical access rule.
+
+    Args:
+        auth_analysis (dict): Authorization analysis results
+        rules (list): Critical access rules (defaults to
+            config['critical_access_rules'])
+        config (dict): Configuration settings (defaults to CONFIG)
+
+    Returns:
+        dict: Dictionary with the 'rule_count', the number of 'matched_rules',
+            the number of distinct 'user_count' matching a rule, and the
+            'rules' with at least one user (rule_id, description, risk,
+            user_count, and the first config['critical_access_max_users']
+            users as client/username), in catalog order
+    """
+    print("\n======= ANALYZE CRITICAL ACCESS FUNCTION STARTED =======")
+    config = config or CONFIG
+    rules = config['critical_access_rules'] if rules is None else rules
+    max_users = config.get('critical_access_max_users')
+
+    index = get_value_index(auth_analysis)
+    records = index.records
+    effective = auth_analysis.get(EFFECTIVE_AUTH_KEY)
+    # ID of each encoding user ID, for the users of role authorizations
+    effective_ids = None
+    if records.user_ids is not None and 'encoding' in auth_analysis:
+        user_ids = records.user_ids
+        user_keys = auth_analysis['encoding'].user_keys
+    elif effective is not None:
+        codes, user_keys = factorize_users(
+            np.concatenate([
+                records.columns['client'].to_numpy(dtype=object),
+                np.array([client for client, _ in effective.encoding.user_keys], dtype=object)
+            ]),
+            np.concatenate([
+                records.columns['username'].to_numpy(dtype=object),
+                np.array([username for _, username in effective.encoding.user_keys], dtype=object)
+            ])
+        )
+        user_ids, effective_ids = codes[:len(records)], codes[len(records):]
+    else:
+        user_ids, user_keys = factorize_users(records.columns['client'], records.columns['username'])
+
+    # Conditions on one object are checked per authorization when AUTH is known
+    by_authorization = 'auth' in records.columns and (effective is None or 'auth' in effective.records.columns)
+    if not by_authorization:
+        print("Warning: AUTH not loaded, conditions on one object may be satisfied by different authorizations")
+
+    # Resolve every distinct requirement once, to sorted distinct user IDs
+    requirement_users = {}
+    holds = np.zeros(len(user_keys), dtype=bool)
+    for rule in rules:
+        for requirement in _requirements(rule, by_authorization):
+            if requirement not in requirement_users:
+                holders = _requirement_holders(index, user_ids, requirement)
+                if effective is not None:
+                    role_holders = effective.roles_users(
+                        _requirement_holders(effective.index, effective.row_roles, requirement)
+                    )
+                    if effective_ids is not None:
+                        role_holders = effective_ids[role_holders]
+                    holders = np.concatenate([holders, role_holders])
+                holds[holders] = True
+                requirement_users[requirement] = np.flatnonzero(holds)
+                holds[holders] = False
+    print(f"Resolved {len(requirement_users)} distinct requirements of {len(rules)} rules")
+
+    matched_rules = []
+    matched = np.zeros(len(user_keys), dtype=bool)
+    for rule in rules:
+        users = _intersect_all(
+            [requirement_users[requirement] for requirement in _requirements(rule, by_authorization)], holds
+        )
+        if not len(users):
+            continue
+        matched[users] = True
+        matched_rules.append({
+            'rule_id': rule['rule_id'],
+            'description': rule.get('description', ''),
+            'risk': rule.get('risk', 'high'),
+            'user_count': len(users),
+            'users': [
+                {'client': user_keys[user][0], 'username': user_keys[user][1]}
+                for user in users[:max_users].tolist()
+            ]
+        })
+
+    user_count = int(matched.sum())
+
+    print(f"Evaluated {len(rules)} critical access rules, {len(matched_rules)} matched {user_count} users")
+    print("======= ANALYZE CRITICAL ACCESS FUNCTION COMPLETED =======\n")
+
+    return {
+        'rule_count': len(rules),
+        'matched_rules': len(matched_rules),
+        'user_count': user_count,
+        'rules': matched_rules
+    }
+
+
+def _condition_key(condition):
+    """
+    Get the (object, field, value) key of a condition.
+
+    Args:
+        condition (dict): Condition with an 'object' and, optionally, a
+            'field' and the 'value' it must grant
+
+    Returns:
+        tuple: (object, field, value), field and value None for a condition
+            on the object alone
+    """
+    if condition.get('field') is None:
+        return (condition['object'], None, None)
+    return (condition['object'], condition['field'], condition['value'])
+
+
+def _requirements(rule, by_authorization):
+    """
+    Group the conditions of a rule into requirements.
+
+    Args:
+        rule (dict): Critical access rule
+        by_authorization (bool): Group the conditions on the same object,
+            to be satisfied by a single authorization
+
+    Returns:
+        list: Requirements, each a sorted tuple of distinct condition keys
+            (see _condition_key), in order of first appearance
+    """
+    keys = [_condition_key(condition) for condition in rule['conditions']]
+    if not by_authorization:
+        return [(key,) for key in dict.fromkeys(keys)]
+    objects = {}
+    for key in keys:
+        objects.setdefault(key[0], set()).add(key)
+    # None sorts before the field names of the same object
+    return [tuple(sorted(group, key=lambda key: (key[1] or '', key[2] or ''))) for group in objects.values()]
+
+
+def _requirement_holders(index, holders, requirement):
+    """
+    Get the holders of the records satisfying a requirement.
+
+    Args:
+        index (AuthorizationValueIndex): Value index of the records
+        holders (ndarray): Holder (user or role ID) of each record
+        requirement (tuple): Condition keys on one object, as returned by
+            _requirements
+
+    Returns:
+        ndarray: Holders with a record satisfying the condition, or with an
+            authorization (AUTH) whose records satisfy all the conditions,
+            possibly repeated
+    """
+    if len(requirement) == 1:
+        return holders[_condition_positions(index, requirement[0])]
+
+    # (holder, authorization) keys satisfying every condition
+    positions = [_condition_positions(index, key) for key in requirement]
+    auth_codes, auths = pd.factorize(
+        index.records.columns['auth'].take(np.concatenate(positions)).astype(object), use_na_sentinel=False
+    )
+    width = max(len(auths), 1)
+    bounds = np.cumsum([0] + [len(condition_positions) for condition_positions in positions])
+    keys = None
+    for condition_positions, start, stop in zip(positions, bounds[:-1], bounds[1:]):
+        condition_keys = np.unique(holders[condition_positions].astype(np.int64) * width + auth_codes[start:stop])
+        keys = condition_keys if keys is None else np.intersect1d(keys, condition_keys, assume_unique=True)
+    return np.unique(keys // width)
+
+
+def _condition_positions(index, key):
+    """
+    Get the authorization records satisfying a condition.
+
+    Args:
+        index (AuthorizationValueIndex): Value index of the authorizations
+        key (tuple): Condition key, as returned by _condition_key
+
+    Returns:
+        ndarray: Positions of the records satisfying the condition
+    """
+    object_name, field, value = key
+    if field is None:
+        return index.object_positions(object_name)
+    return index.positions(object_name, field, value)
+
+
+def _intersect_all(user_sets, scratch):
+    """
+    Intersect sorted arrays of distinct user IDs.
+
+    Args:
+        user_sets (list): Sorted arrays of distinct user IDs
+        scratch (ndarray): All-False boolean array over the user IDs, left
+            all-False
+
+    Returns:
+        ndarray: Sorted user IDs present in every array
+    """
+    if not user_sets:
+        return np.zeros(0, dtype=np.int64)
+    user_sets = sorted(user_sets, key=len)
+    users = user_sets[0]
+    for other in user_sets[1:]:
+        if not len(users):
+            break
+        if len(users) * SEARCH_RATIO < len(other):
+            # Much smaller set: binary search its users in the larger one
+            found = np.searchsorted(other, users)
+            found[found == len(other)] = 0
+            users = users[other[found] == users]
+        else:
+            # Sets of similar sizes: mark the larger one
+            scratch[other] = True
+            users = users[scratch[users]]
+            scratch[other] = False
+    return users
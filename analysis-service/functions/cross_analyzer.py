@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Cross analyzer module for the SAP User Analysis Tool
+
+This module correlates USR02, AGR_USERS and USR12 on their (client, user)
+keys to find ghost users, users without roles, inactive active accounts
+and privileged access issues.
+
+The keys of the three tables share the user IDs of the data encoding; each
+finding is then an anti-join or a semi-join computed with boolean masks
+over the user IDs, so every table is scanned a single time.
+"""
+
+import fnmatch
+import re
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from functions.formatters import (
+    format_sap_date_series,
+    format_boolean_flag_series,
+    decode_sap_date_series,
+    map_unique_values
+)
+from functions.user_analyzer import get_validity_expired_series
+from functions.role_analyzer import get_assignment_expired_series
+from functions.encoding import get_encoding
+from models.models import CrossAnalysisResults, PrivilegedAccessIssues, SharedHighPrivilegeAccount
+from config import CONFIG, SAP_USER_FIELD, SAP_ROLE_USER_FIELD, SAP_AUTH_USER_FIELD
+
+def analyze_cross(data, sod_analysis=None, config=None):
+    """
+    Cross-analyze the user, role and authorization tables.
+
+    Args:
+        data (dict): Dictionary containing DataFrames for each loaded table
+        sod_analysis (dict): Segregation of duties results, as returned by
+            analyze_sod, reported as segregationOfDutiesIssues
+        config (dict): Configuration settings (defaults to CONFIG)
+
+    Returns:
+        CrossAnalysisResults: Ghost users and users without roles (each user
+            as a client and username dictionary, as the same username can
+            exist in several clients), inactive active users, SoD issues and
+            privileged access issues
+    """
+    print("\n======= ANALYZE CROSS FUNCTION STARTED =======")
+    config = config or CONFIG
+    today = datetime.now().strftime(config['sap_date_format'])
+
+    encoding = get_encoding(data)
+    keys = encoding.user_keys
+
+    # Skip the rows without a username
+    usr02, usr02_codes = _user_rows(data.get('usr02_df'), SAP_USER_FIELD, encoding.user_ids['usr02'])
+    agr_users, agr_codes = _user_rows(
+        data.get('agr_users_df'), SAP_ROLE_USER_FIELD, encoding.user_ids['agr_users']
+    )
+    role_ids = encoding.role_ids[encoding.user_ids['agr_users'] >= 0]
+    _, usr12_codes = _user_rows(data.get('usr12_df'), SAP_AUTH_USER_FIELD, encoding.user_ids['usr12'])
+
+    in_usr02 = np.zeros(len(keys), dtype=bool)
+    in_usr02[usr02_codes] = True
+    in_agr_users = np.zeros(len(keys), dtype=bool)
+    in_agr_users[agr_codes] = True
+    in_usr12 = np.zeros(len(keys), dtype=bool)
+    in_usr12[usr12_codes] = True
+
+    # Ghost users: roles or authorizations without a USR02 record (anti-join)
+    ghost_codes = np.flatnonzero((in_agr_users | in_usr12) & ~in_usr02)
+    ghost_users = _user_entries(keys, ghost_codes)
+
+    # Users without roles: USR02 records without any AGR_USERS row (anti-join)
+    without_roles = pd.unique(usr02_codes[~in_agr_users[usr02_codes]])
+    users_without_roles = _user_entries(keys, without_roles)
+
+    inactive_users = _get_inactive_active_users(usr02, today, config)
+    privileged_access = _get_privileged_access_issues(
+        agr_users, agr_codes, role_ids, in_usr02, encoding, today, config
+    )
+
+    print(f"Found {len(ghost_users)} ghost users, {len(users_without_roles)} users without roles, "
+          f"{len(inactive_users)} inactive active users and "
+          f"{privileged_access.highPrivilegeRolesCount} high privilege roles")
+    print("======= ANALYZE CROSS FUNCTION COMPLETED =======\n")
+
+    if sod_analysis is None or 'error' in sod_analysis:
+        sod_analysis = {'count': 0, 'conflicts': []}
+
+    return CrossAnalysisResults(
+        ghostUsers={'count': len(ghost_users), 'users': ghost_users},
+        usersWithoutRoles={'count': len(users_without_roles), 'users': users_without_roles},
+        inactiveActiveUsers={'count': len(inactive_users), 'users': inactive_users},
+        segregationOfDutiesIssues=sod_analysis,
+        privilegedAccessIssues=privileged_access
+    )
+
+def _get_inactive_active_users(usr02, today, config):
+    """
+    Find unlocked, valid accounts that have not logged in recently.
+
+    Args:
+        usr02 (DataFrame): USR02 rows with a username
+        today (str): Current date in SAP format
+        config (dict): Configuration settings
+
+    Returns:
+        list: One dictionary per account (username, lastLogin,
+            daysSinceLogin, status), 'Never' / 'Never logged in' for
+            accounts that never logged in
+    """
+    locked = format_boolean_flag_series(_column(usr02, 'UFLAG')) == 'Yes'
+    expired = get_validity_expired_series(_column(usr02, 'GLTGB'), today).astype(bool)
+
+    last_login = decode_sap_date_series(_column(usr02, 'TRDAT'))
+    days = (pd.Timestamp(datetime.strptime(today, config['sap_date_format'])) - last_login).dt.days
+    never = last_login.isna()
+    inactive = (~locked & ~expired & (never | (days > config['inactive_login_days']))).to_numpy()
+
+    rows = usr02[inactive]
+    days = days[inactive]
+    never = never[inactive]
+    critical = never | (days > config['critical_inactive_days'])
+    last_login = format_sap_date_series(_column(rows, 'TRDAT')).where(~never, 'Never')
+
+    return [
+        {
+            'username': username,
+            'lastLogin': login,
+            'daysSinceLogin': 'Never logged in' if is_never else int(day_count),
+            'status': 'Critical' if is_critical else 'High Risk'
+        }
+        for username, login, day_count, is_never, is_critical in zip(
+            rows['_username'].tolist(),
+            last_login.tolist(),
+            days.fillna(0).tolist(),
+            never.tolist(),
+            critical.tolist()
+        )
+    ]
+
+def _get_privileged_access_issues(agr_users, agr_codes, role_ids, in_usr02, encoding, today, config):
+    """
+    Find the high privilege roles and who holds them.
+
+    Args:
+        agr_users (DataFrame): AGR_USERS rows with a username
+        agr_codes (ndarray): User ID of each row
+        role_ids (ndarray): Role ID of each row (-1 for no role)
+        in_usr02 (ndarray): Whether each user ID has a USR02 record
+        encoding (DataEncoding): Encoding of the tables
+        today (str): Current date in SAP format
+        config (dict): Configuration settings
+
+    Returns:
+        PrivilegedAccessIssues: High privilege roles, their active
+            assignments to USR02 users and the roles held by several users
+    """
+    patterns = re.compile('|'.join(
+        fnmatch.translate(pattern.upper()) for pattern in config['high_privilege_roles']
+    ) or '(?!)')
+    # Match the role vocabulary once, then look the roles up by ID
+    # (the extra False entry is looked up by rows without a role, ID -1)
+    is_high_role = np.array(
+        [not pd.isna(role) and bool(patterns.match(str(role).upper())) for role in encoding.roles] + [False],
+        dtype=bool
+    )
+    is_high = is_high_role[role_ids]
+    high_roles = [encoding.roles[role_id] for role_id in pd.unique(role_ids[is_high]).tolist()]
+
+    # Active assignments of USR02 users (semi-join)
+    excluded = (_column(agr_users, 'EXCLUDE') == 'X').to_numpy(dtype=bool)
+    expired = get_assignment_expired_series(_column(agr_users, 'TO_DAT'), today).to_numpy(dtype=bool)
+    active = np.flatnonzero(is_high & ~excluded & ~expired & in_usr02[agr_codes])
+
+    rows = agr_users.iloc[active]
+    open_ended = map_unique_values(_column(rows, 'TO_DAT'), _is_open_ended).tolist()
+    usernames = rows['_username'].tolist()
+    role_values = _column(agr_users, 'AGR_NAME').astype(object).to_numpy()[active]
+
+    users_with_high_privilege = [
+        {
+            'username': username,
+            'role': role,
+            'fromDate': from_date,
+            'toDate': None if is_open_ended else to_date
+        }
+        for username, role, from_date, to_date, is_open_ended in zip(
+            usernames,
+            role_values.tolist(),
+            format_sap_date_series(_column(rows, 'FROM_DAT')).tolist(),
+            format_sap_date_series(_column(rows, 'TO_DAT')).tolist(),
+            open_ended
+        )
+    ]
+
+    # Distinct holders of each role, in order of first assignment
+    role_codes, holder_role_ids = pd.factorize(role_ids[active])
+    pairs = pd.DataFrame({'role': role_codes, 'user': agr_codes[active], 'username': usernames})
+    pairs = pairs.drop_duplicates(['role', 'user']).sort_values('role', kind='stable')
+    holders = pairs.groupby('role', sort=True)['username'].agg(list)
+
+    shared_accounts = [
+        SharedHighPrivilegeAccount(role=encoding.roles[holder_role_ids[code]], users=users, userCount=len(users))
+        for code, users in holders.items()
+        if len(users) >= config['shared_high_privilege_min_users']
+    ]
+
+    return PrivilegedAccessIssues(
+        highPrivilegeRolesCount=len(high_roles),
+        highPrivilegeRoles=high_roles,
+        usersWithHighPrivilege=users_with_high_privilege,
+        sharedHighPrivilegeAccounts=shared_accounts
+    )
+
+def _user_entries(keys, codes):
+    """
+    Decode user IDs to client and username dictionaries.
+
+    Args:
+        keys (list): (client, username) of each user ID
+        codes (ndarray): User IDs
+
+    Returns:
+        list: One {'client', 'username'} dictionary per ID, in order
+    """
+    return [{'client': keys[code][0], 'username': keys[code][1]} for code in codes.tolist()]
+
+def _user_rows(df, user_field, user_ids):
+    """
+    Get the rows of a table that have a username.
+
+    Args:
+        df (DataFrame): Table, or None if it was not loaded
+        user_field (str): Username field of the table
+        user_ids (ndarray): Encoded user ID of each row (-1 for no username)
+
+    Returns:
+        tuple: (DataFrame of the rows, with the username in '_username';
+            user ID of each row). No rows when the table or its username
+            field is missing
+    """
+    if df is None or user_field not in df.columns:
+        return pd.DataFrame({'_username': pd.Series([], dtype=object)}), np.zeros(0, dtype=np.int32)
+    has_username = user_ids >= 0
+    return df[has_username].assign(_username=df[user_field].astype(object)), user_ids[has_username]
+
+def _column(df, field):
+    """
+    Get a field of a table, empty strings when the field is missing.
+
+    Args:
+        df (DataFrame): Table rows
+        field (str): Field name
+
+    Returns:
+        Series: Field values
+    """
+    if field in df.columns:
+        return df[field]
+    return pd.Series('', index=df.index, dtype=object)
+
+def _is_open_ended(date_str):
+    """
+    Check whether an end date leaves an assignment open-ended.
+
+    Args:
+        date_str: End date in SAP format
+
+    Returns:
+        bool: True for a missing or permanent (9999..., 2999...) date
+    """
+    if pd.isna(date_str) or str(date_str).strip() in ('', '0', '00000000'):
+        return True
+    return str(date_str).strip().startswith(('9999', '2999'))
@@ -6,16 +6,24 @@ This module handles loading and validating data from the required CSV files:
 - USR02: User master data
 - AGR_USERS: User role assignments
 - USR12: User authorizations
+- AGR_1251: Role authorization values (optional)
+- AGR_AGRS: Composite role members (optional)
 """
 
 import os
 import pandas as pd
-from config import CONFIG, REQUIRED_FIELDS
+from config import CONFIG, REQUIRED_FIELDS, SAP_DATE_FIELDS, SAP_TIME_FIELDS, SAP_MANDT_FIELD
+from functions.file_parser import parse_file_to_dataframe
 
 def load_data(config):
     """
     Load data from the required CSV files.
     
+    Only the fields listed in REQUIRED_FIELDS and OPTIONAL_FIELDS are read,
+    already typed, and restricted to config['mandt'] when it is set.
+    AGR_1251 and AGR_AGRS are loaded as 'agr_1251_df' and 'agr_agrs_df'
+    when their file exists.
+    
     Args:
         config (dict): Configuration dictionary
         
@@ -45,221 +53,182 @@ def load_data(config):
                 f"file is in the specified directory."
             )
     
+    tables = [
+        ('usr02_df', 'usr02', usr02_path),
+        ('agr_users_df', 'agr_users', agr_users_path),
+        ('usr12_df', 'usr12', usr12_path)
+    ]
+    for key, table in [('agr_1251_df', 'agr_1251'), ('agr_agrs_df', 'agr_agrs')]:
+        file_name = config.get(f'{table}_file')
+        if file_name and os.path.isfile(os.path.join(config['input_dir'], file_name)):
+            tables.append((key, table, os.path.join(config['input_dir'], file_name)))
+    
     # Load data from CSV files
     try:
-        data['usr02_df'] = pd.read_csv(usr02_path)
-        data['agr_users_df'] = pd.read_csv(agr_users_path)
-        data['usr12_df'] = pd.read_csv(usr12_path)
+        for key, table, file_path in tables:
+            with open(file_path, 'rb') as f:
+                data[key], _ = parse_file_to_dataframe(
+                    file_path, f, table=table, mandt=config.get('mandt')
+                )
         return data
     except Exception as e:
         raise Exception(f"Error loading data: {str(e)}")
 
+# Fields checked by validate_data for each table, with the username field
+VALIDATED_TABLES = [
+    ('usr02', 'usr02_df', 'USR02', ['BNAME', 'USTYP'], 'BNAME'),
+    ('agr_users', 'agr_users_df', 'AGR_USERS', ['UNAME', 'AGR_NAME'], 'UNAME'),
+    ('usr12', 'usr12_df', 'USR12', ['UNAME', 'VON', 'BIS'], 'UNAME')
+]
+
+# Optional tables checked by validate_data when they were loaded; missing
+# fields are reported as warnings since the analysis runs without them
+OPTIONAL_VALIDATED_TABLES = [
+    ('agr_1251', 'agr_1251_df', 'AGR_1251', ['AGR_NAME', 'OBJECT', 'FIELD', 'LOW']),
+    ('agr_agrs', 'agr_agrs_df', 'AGR_AGRS', ['AGR_NAME', 'CHILD_AGR'])
+]
+
 def validate_data(data):
     """
-    Validate that the loaded data has the required fields.
+    Validate that the loaded data has the required fields and prepare it
+    for analysis.
+    
+    Column names are upper-cased in place, without copying the tables.
+    Client and user statistics are computed from a single pass over the
+    (MANDT, username) columns of each table.
     
     Args:
         data (dict): Dictionary containing DataFrames for each loaded table
         
-    Raises:
-        ValueError: If any required field is missing
+    Returns:
+        dict: Validation report with 'valid', 'errors', 'warnings',
+            per-table statistics under 'tables', 'common_clients' and
+            'common_users' (users found in both USR02 and AGR_USERS)
     """
-    validation_errors = []
-    
-    # Print column names for debugging
-    print("Validating data with the following columns:")
-    print("AGR_USERS columns:", data['agr_users_df'].columns.tolist())
-    print("USR02 columns:", data['usr02_df'].columns.tolist())
-    print("USR12 columns:", data['usr12_df'].columns.tolist())
-    
-    # Create case-insensitive column maps for each DataFrame
-    agr_columns = {col.upper(): col for col in data['agr_users_df'].columns}
-    usr02_columns = {col.upper(): col for col in data['usr02_df'].columns}
-    usr12_columns = {col.upper(): col for col in data['usr12_df'].columns}
-    
-    print("AGR_USERS case-insensitive map:", agr_columns)
-    print("USR02 case-insensitive map:", usr02_columns)
-    print("USR12 case-insensitive map:", usr12_columns)
-    
-    # Standardize column names to make them case-insensitive - this is critical for SAP data
-    # Some extractions may use lowercase or mixed case column names
-    print("Standardizing column names to uppercase...")
-    
-    # Create a copy of each DataFrame with standardized column names
-    data['usr02_df_std'] = data['usr02_df'].copy()
-    data['agr_users_df_std'] = data['agr_users_df'].copy()
-    data['usr12_df_std'] = data['usr12_df'].copy()
-    
-    # Rename columns to uppercase in the standardized DataFrames
-    data['usr02_df_std'].columns = [col.upper() for col in data['usr02_df'].columns]
-    data['agr_users_df_std'].columns = [col.upper() for col in data['agr_users_df'].columns]
-    data['usr12_df_std'].columns = [col.upper() for col in data['usr12_df'].columns]
-    
-    # Use standardized DataFrames for the rest of validation and processing
-    data['usr02_df'] = data['usr02_df_std']
-    data['agr_users_df'] = data['agr_users_df_std']
-    data['usr12_df'] = data['usr12_df_std']
-    
-    print("Columns after standardization:")
-    print("AGR_USERS columns:", data['agr_users_df'].columns.tolist())
-    print("USR02 columns:", data['usr02_df'].columns.tolist())
-    print("USR12 columns:", data['usr12_df'].columns.tolist())
-    
-    # Check for required fields in USR02 with case insensitivity
-    required_usr02 = ['BNAME', 'USTYP']
-    missing_usr02 = []
-    for field in required_usr02:
-        if field.upper() not in [col.upper() for col in data['usr02_df'].columns]:
-            missing_usr02.append(field)
-            print(f"Missing USR02 field: {field}")
-    
-    if missing_usr02:
-        err_msg = f"Required fields missing from USR02 table: {', '.join(missing_usr02)}"
-        validation_errors.append(err_msg)
-        print(err_msg)
-    
-    # Check for required fields in AGR_USERS with case insensitivity
-    required_agr = ['UNAME', 'AGR_NAME']
-    missing_agr = []
-    for field in required_agr:
-        if field.upper() not in [col.upper() for col in data['agr_users_df'].columns]:
-            missing_agr.append(field)
-            print(f"Missing AGR_USERS field: {field}")
-    
-    if missing_agr:
-        err_msg = f"Required fields missing from AGR_USERS table: {', '.join(missing_agr)}"
-        validation_errors.append(err_msg)
-        print(err_msg)
-    
-    # Check for required fields in USR12 with case insensitivity
-    required_usr12 = ['UNAME', 'VON', 'BIS']
-    missing_usr12 = []
-    for field in required_usr12:
-        if field.upper() not in [col.upper() for col in data['usr12_df'].columns]:
-            missing_usr12.append(field)
-            print(f"Missing USR12 field: {field}")
-    
-    if missing_usr12:
-        err_msg = f"Required fields missing from USR12 table: {', '.join(missing_usr12)}"
-        validation_errors.append(err_msg)
-        print(err_msg)
-    
-    # Check for data consistency
-    if data['usr02_df'].empty:
-        err_msg = "USR02 table contains no data"
-        validation_errors.append(err_msg)
-        print(err_msg)
-    else:
-        print(f"USR02 contains {len(data['usr02_df'])} rows of data")
-    
-    if data['agr_users_df'].empty:
-        err_msg = "AGR_USERS table contains no data"
-        validation_errors.append(err_msg)
-        print(err_msg)
-    else:
-        print(f"AGR_USERS contains {len(data['agr_users_df'])} rows of data")
-    
-    if data['usr12_df'].empty:
-        err_msg = "USR12 table contains no data"
-        validation_errors.append(err_msg)
-        print(err_msg)
-    else:
-        print(f"USR12 contains {len(data['usr12_df'])} rows of data")
-    
-    # Check if there's at least one common client across all tables
-    if 'MANDT' in data['agr_users_df'].columns and 'MANDT' in data['usr02_df'].columns and 'MANDT' in data['usr12_df'].columns:
-        usr02_clients = set(data['usr02_df']['MANDT'].unique())
-        agr_users_clients = set(data['agr_users_df']['MANDT'].unique())
-        usr12_clients = set(data['usr12_df']['MANDT'].unique())
+    report = {
+        'valid': True,
+        'errors': [],
+        'warnings': [],
+        'tables': {},
+        'common_clients': [],
+        'common_users': 0
+    }
+    
+    users_by_table = {}
+    clients_by_table = {}
+    for table, key, label, required, user_field in VALIDATED_TABLES:
+        df = data[key]
+        # Standardize column names in place - some extractions use lowercase or mixed case
+        df.columns = [str(col).upper() for col in df.columns]
+        
+        missing = [field for field in required if field not in df.columns]
+        if missing:
+            report['errors'].append(
+                f"Required fields missing from {label} table: {', '.join(missing)}"
+            )
+        if df.empty:
+            report['errors'].append(f"{label} table contains no data")
         
-        print(f"USR02 clients: {usr02_clients}")
-        print(f"AGR_USERS clients: {agr_users_clients}")
-        print(f"USR12 clients: {usr12_clients}")
+        stats = {
+            'rows': len(df),
+            'columns': df.columns.tolist(),
+            'missing_fields': missing
+        }
         
-        # Check if there's at least one common client across all tables
-        common_clients = usr02_clients.intersection(agr_users_clients, usr12_clients)
+        # One pass over the key columns gives both the clients and the users
+        key_fields = [field for field in [SAP_MANDT_FIELD, user_field] if field in df.columns]
+        keys = df[key_fields].drop_duplicates() if key_fields else pd.DataFrame()
+        if SAP_MANDT_FIELD in keys.columns:
+            clients_by_table[table] = set(keys[SAP_MANDT_FIELD].astype(str).unique())
+            stats['clients'] = sorted(clients_by_table[table])
+        if user_field in keys.columns:
+            users_by_table[table] = set(keys[user_field].astype(str).unique())
+            stats['unique_users'] = len(users_by_table[table])
+        
+        report['tables'][table] = stats
+    
+    for table, key, label, required in OPTIONAL_VALIDATED_TABLES:
+        df = data.get(key)
+        if df is None:
+            continue
+        df.columns = [str(col).upper() for col in df.columns]
+        missing = [field for field in required if field not in df.columns]
+        if missing:
+            report['warnings'].append(
+                f"Warning: Fields missing from {label} table, it is ignored: {', '.join(missing)}"
+            )
+        report['tables'][table] = {
+            'rows': len(df),
+            'columns': df.columns.tolist(),
+            'missing_fields': missing
+        }
+    
+    # Check if there's at least one common client across all tables
+    if len(clients_by_table) == len(VALIDATED_TABLES):
+        common_clients = set.intersection(*clients_by_table.values())
+        report['common_clients'] = sorted(common_clients)
         if not common_clients:
-            warn_msg = "Warning: No common clients (MANDT) found across all tables"
-            print(warn_msg)
-        else:
-            print(f"Common clients across all tables: {common_clients}")
+            report['warnings'].append("Warning: No common clients (MANDT) found across all tables")
     else:
-        warn_msg = "Warning: MANDT field not found in all tables, skipping client validation"
-        print(warn_msg)
+        report['warnings'].append("Warning: MANDT field not found in all tables, skipping client validation")
     
     # Check for data consistency between tables
-    if 'BNAME' in data['usr02_df'].columns and 'UNAME' in data['agr_users_df'].columns:
-        usr02_users = set(data['usr02_df']['BNAME'].astype(str).unique())
-        agr_users = set(data['agr_users_df']['UNAME'].astype(str).unique())
-        
-        print(f"Found {len(usr02_users)} unique users in USR02")
-        print(f"Found {len(agr_users)} unique users in AGR_USERS")
-        
-        common_users = usr02_users.intersection(agr_users)
-        print(f"Found {len(common_users)} users in common between USR02 and AGR_USERS")
-        
+    if 'usr02' in users_by_table and 'agr_users' in users_by_table:
+        common_users = users_by_table['usr02'] & users_by_table['agr_users']
+        report['common_users'] = len(common_users)
         if not common_users:
-            warn_msg = "Warning: No common users found between USR02 and AGR_USERS tables"
-            print(warn_msg)
-            validation_errors.append(warn_msg)
-
+            report['errors'].append("Warning: No common users found between USR02 and AGR_USERS tables")
+    
     # Prepare data for easier analysis (convert date/time fields to strings)
     _prepare_data(data)
     
-    # Add sample data info for debugging
-    print("\nSample data validation:")
-    if not data['usr02_df'].empty:
-        print("First user from USR02:", data['usr02_df'].iloc[0]['BNAME'] if 'BNAME' in data['usr02_df'].columns else "BNAME column not found")
-    
-    if not data['agr_users_df'].empty:
-        print("First user-role assignment from AGR_USERS:", 
-              f"User: {data['agr_users_df'].iloc[0]['UNAME'] if 'UNAME' in data['agr_users_df'].columns else 'UNAME not found'}, "
-              f"Role: {data['agr_users_df'].iloc[0]['AGR_NAME'] if 'AGR_NAME' in data['agr_users_df'].columns else 'AGR_NAME not found'}")
+    report['valid'] = not report['errors']
+    print(f"Validation complete: {len(report['errors'])} errors, {len(report['warnings'])} warnings")
     
-    if validation_errors:
-        raise ValueError(", ".join(validation_errors))
-    
-    return True
+    return report
 
 def _prepare_data(data):
     """
     Prepare data for analysis by converting data types and ensuring consistency.
     
+    Columns already typed by the schema-driven loader (categorical keys,
+    Int32 dates and times) are left as they are. Other columns are replaced
+    one at a time, so the tables themselves are never copied.
+    
     Args:
         data (dict): Dictionary containing DataFrames for each loaded table
     """
-    print("Preparing data for analysis...")
-    
-    # Convert MANDT to string in all tables to ensure consistent joining
-    for table_name in ['usr02_df', 'agr_users_df', 'usr12_df']:
-        if 'MANDT' in data[table_name].columns:
-            data[table_name]['MANDT'] = data[table_name]['MANDT'].astype(str)
-            print(f"Converted MANDT to string in {table_name}")
-    
-    # Convert date fields to strings in USR02
-    date_fields = ['GLTGV', 'GLTGB', 'TRDAT', 'PWDLGNDATE']
-    for field in date_fields:
-        if field in data['usr02_df'].columns:
-            data['usr02_df'][field] = data['usr02_df'][field].astype(str)
-            print(f"Converted {field} to string in USR02")
-    
-    # Convert time fields to strings in USR02
-    time_fields = ['LTIME', 'PWDLGNTIME']
-    for field in time_fields:
-        if field in data['usr02_df'].columns:
-            data['usr02_df'][field] = data['usr02_df'][field].astype(str)
-            print(f"Converted {field} to string in USR02")
-    
-    # Convert date fields to strings in AGR_USERS
-    date_fields = ['FROM_DAT', 'TO_DAT']
-    for field in date_fields:
-        if field in data['agr_users_df'].columns:
-            data['agr_users_df'][field] = data['agr_users_df'][field].astype(str)
-            print(f"Converted {field} to string in AGR_USERS")
-    
-    # Handle NaN values
-    for table_name in ['usr02_df', 'agr_users_df', 'usr12_df']:
-        data[table_name] = data[table_name].fillna('')
-        print(f"Filled NaN values in {table_name}")
+    # Untyped MANDT, date and time fields are compared as strings
+    string_fields = {
+        'usr02_df': [SAP_MANDT_FIELD] + SAP_DATE_FIELDS + SAP_TIME_FIELDS,
+        'agr_users_df': [SAP_MANDT_FIELD] + SAP_DATE_FIELDS,
+        'usr12_df': [SAP_MANDT_FIELD],
+        'agr_1251_df': [SAP_MANDT_FIELD],
+        'agr_agrs_df': [SAP_MANDT_FIELD]
+    }
+    
+    for table_name, fields in string_fields.items():
+        df = data.get(table_name)
+        if df is None:
+            continue
+        for col in df.columns:
+            series = df[col]
+            if _is_typed(series):
+                continue
+            if col in fields:
+                df[col] = series.astype(str)
+            elif series.hasnans:
+                # Handle NaN values
+                df[col] = series.fillna('')
+
+def _is_typed(series):
+    """
+    Check whether a column was typed by the schema-driven loader.
     
-    print("Data preparation complete")
\ No newline at end of file
+    Args:
+        series (Series): Column to check
+        
+    Returns:
+        bool: True for categorical and nullable integer columns
+    """
+    return isinstance(series.dtype, (pd.CategoricalDtype, pd.Int32Dtype))
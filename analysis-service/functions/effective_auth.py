@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Effective authorizations module for the SAP User Analysis Tool
+
+This module derives the authorizations users receive through their roles
+from AGR_1251 (the authorization values of each role) and the active
+AGR_USERS assignments. Roles are client dependent, so a role is a
+(MANDT, AGR_NAME) key.
+
+The two sides are kept apart, as two sparse matrices:
+- users x roles: the active assignments, stored compressed by user and by
+  role (sorted pairs plus the bounds of each user's or role's slice);
+- roles x authorization values: the AGR_1251 rows, searchable by value
+  through an authorization value index (see functions.value_index).
+
+The effective authorizations of the users are the product of the two,
+which is never materialized: a query resolves the roles granting a value,
+then unions the users of those roles (users x role vector), and per-user
+totals are weighted sums over the assignment pairs (users x role values).
+A role change only replaces the AGR_1251 rows of that role, in a new
+instance: an instance is never modified once built, so it can be read from
+several threads while an update is computed.
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+from functions.auth_analyzer import AuthorizationRecords, _is_wildcard_column
+from functions.value_index import AuthorizationValueIndex
+from functions.user_index import factorize_users
+from config import SAP_MANDT_FIELD
+
+# Analysis results key holding the effective authorizations
+EFFECTIVE_AUTH_KEY = 'effective_authorizations'
+
+# AGR_1251 fields read as authorization record fields
+ROLE_AUTH_FIELDS = {
+    'client': SAP_MANDT_FIELD,
+    'username': 'AGR_NAME',
+    'object': 'OBJECT',
+    'field': 'FIELD',
+    'from_value': 'LOW',
+    'to_value': 'HIGH'
+}
+
+
+class EffectiveAuthorizations:
+    """
+    Authorizations users hold through their active roles.
+
+    User IDs are those of the analysis encoding (see functions.encoding).
+
+    Attributes:
+        encoding (DataEncoding): Encoding of the analysed tables
+        role_keys (list): (client, role name) of each role code
+        records (AuthorizationRecords): AGR_1251 rows, the role name in
+            the 'username' field
+        row_roles (ndarray): Role code of each record
+        index (AuthorizationValueIndex): Value index of the records
+    """
+
+    def __init__(self, role_analysis, agr_1251_df):
+        """
+        Build the user x role and role x value matrices.
+
+        Args:
+            role_analysis (dict): Role analysis results, with the encoded
+                assignments
+            agr_1251_df (DataFrame): AGR_1251 table
+        """
+        self.encoding = role_analysis['encoding']
+        # Assignment rows of each user, to find a user's ID
+        self._user_index = role_analysis.get('user_index')
+        self._assignment_user_ids = role_analysis['assignment_user_ids']
+
+        user_ids = role_analysis['assignment_user_ids']
+        role_ids = role_analysis['assignment_role_ids']
+        kept = role_analysis['assignment_active'] & (user_ids >= 0) & (role_ids >= 0)
+        user_ids = user_ids[kept].astype(np.int64)
+        role_ids = role_ids[kept]
+
+        # Roles are keyed by the client of the assigned user and the role name
+        user_clients = np.array([client for client, _ in self.encoding.user_keys], dtype=object)
+        role_names = np.array(list(self.encoding.roles), dtype=object)
+        columns = _role_columns(agr_1251_df)
+        codes, self.role_keys = factorize_users(
+            pd.concat([pd.Series(user_clients[user_ids], dtype=object), columns['client']], ignore_index=True),
+            pd.concat([pd.Series(role_names[role_ids], dtype=object), columns['username']], ignore_index=True)
+        )
+        self._role_codes = {key: code for code, key in enumerate(self.role_keys)}
+        assignment_roles = codes[:len(user_ids)].astype(np.int64)
+
+        # Distinct (user, role) pairs, sorted by user then role
+        role_count = max(len(self.role_keys), 1)
+        pairs = np.unique(user_ids * role_count + assignment_roles)
+        self._pair_users = pairs // role_count
+        self._pair_roles = pairs % role_count
+        self._user_bounds = np.searchsorted(self._pair_users, np.arange(self.encoding.user_count + 1))
+
+        # The same pairs by role; users stay sorted within each role
+        order = np.argsort(self._pair_roles, kind='stable')
+        self._role_users = self._pair_users[order]
+        self._role_bounds = np.searchsorted(self._pair_roles[order], np.arange(len(self.role_keys) + 1))
+
+        self._set_records(columns, codes[len(user_ids):])
+
+    def _set_records(self, columns, row_roles):
+        """
+        Index the role authorization records.
+
+        Args:
+            columns (dict): Record fields, as returned by _role_columns
+            row_roles (ndarray): Role code of each record
+        """
+        self.records = AuthorizationRecords(columns)
+        self.row_roles = np.asarray(row_roles, dtype=np.int64)
+        self.index = AuthorizationValueIndex(self.records)
+
+        self._row_order = np.argsort(self.row_roles, kind='stable')
+        self._row_bounds = np.searchsorted(self.row_roles[self._row_order], np.arange(len(self.role_keys) + 1))
+
+    @property
+    def role_count(self):
+        return len(self.role_keys)
+
+    @property
+    def assignment_count(self):
+        return len(self._pair_users)
+
+    def with_updated_roles(self, agr_1251_df):
+        """
+        Replace the authorization values of the roles of an AGR_1251 extract.
+
+        Rows of other roles and the user x role matrix are kept as they are.
+        This instance is left unchanged; the arrays it shares with the new
+        one are never modified in place.
+
+        Args:
+            agr_1251_df (DataFrame): AGR_1251 rows of the changed roles (all
+                the rows of each role; a role with only DELETED rows loses
+                its authorizations)
+
+        Returns:
+            EffectiveAuthorizations: Effective authorizations with the new
+                values
+        """
+        columns = _role_columns(agr_1251_df, keep_deleted=True)
+        deleted = columns.pop('deleted')
+
+        updated = copy.copy(self)
+        updated.role_keys = list(self.role_keys)
+        updated._role_codes = dict(self._role_codes)
+
+        # Roles not seen before have no user
+        row_roles = []
+        for key in zip(columns['client'].astype(str).tolist(), columns['username'].astype(str).tolist()):
+            if key not in updated._role_codes:
+                updated._role_codes[key] = len(updated.role_keys)
+                updated.role_keys.append(key)
+            row_roles.append(updated._role_codes[key])
+        row_roles = np.array(row_roles, dtype=np.int64)
+        updated._role_bounds = np.append(
+            self._role_bounds,
+            np.full(len(updated.role_keys) + 1 - len(self._role_bounds), self._role_bounds[-1])
+        )
+
+        changed = np.zeros(len(updated.role_keys), dtype=bool)
+        changed[row_roles] = True
+        kept = np.flatnonzero(~changed[self.row_roles])
+        added = np.flatnonzero(~deleted)
+
+        merged = {
+            field: pd.concat(
+                [self.records.columns[field].take(kept), columns[field].take(added)], ignore_index=True
+            )
+            for field in self.records.columns
+            if field in columns
+        }
+        updated._set_records(merged, np.concatenate([self.row_roles[kept], row_roles[added]]))
+        print(f"Updated the authorizations of {int(changed.sum())} roles ({len(added)} rows)")
+        return updated
+
+    def roles_users(self, roles):
+        """
+        Get the users holding any of some roles.
+
+        Args:
+            roles (array-like): Role codes
+
+        Returns:
+            ndarray: Sorted distinct user IDs
+        """
+        roles = np.unique(np.asarray(roles, dtype=np.int64))
+        starts = self._role_bounds[roles]
+        lengths = self._role_bounds[roles + 1] - starts
+        if not lengths.sum():
+            return np.zeros(0, dtype=np.int64)
+        # Concatenated slices of the roles
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.unique(self._role_users[positions])
+
+    def condition_users(self, object_name, field=None, value=None):
+        """
+        Get the users whose roles grant an object, or a value of one of its
+        fields.
+
+        Args:
+            object_name (str): Authorization object (e.g. S_TCODE)
+            field (str): Authorization field (e.g. TCD), None for the object
+                whatever its values
+            value (str): Value checked (e.g. SU01)
+
+        Returns:
+            ndarray: Sorted distinct user IDs
+        """
+        if field is None:
+            positions = self.index.object_positions(object_name)
+        else:
+            positions = self.index.positions(object_name, field, value)
+        return self.roles_users(self.row_roles[positions])
+
+    def user_totals(self, role_values):
+        """
+        Sum a value of each role over the active roles of every user.
+
+        Args:
+            role_values (ndarray): Value of each role code
+
+        Returns:
+            ndarray: Total of each user ID
+        """
+        return np.bincount(
+            self._pair_users,
+            weights=np.asarray(role_values, dtype=np.float64)[self._pair_roles],
+            minlength=self.encoding.user_count
+        )
+
+    def user_any(self, role_flags):
+        """
+        Combine flags of each role over the active roles of every user.
+
+        Args:
+            role_flags (ndarray): Boolean flags of each role code, one row
+                per role with one or more columns
+
+        Returns:
+            ndarray: Flags of each user ID, True where any of the user's
+                active roles has the flag
+        """
+        role_flags = np.asarray(role_flags, dtype=bool)
+        flags = np.zeros((self.encoding.user_count,) + role_flags.shape[1:], dtype=bool)
+        # Pairs are sorted by user, so each user with roles is one segment
+        starts = self._user_bounds[:-1]
+        has_roles = self._user_bounds[1:] > starts
+        if has_roles.any():
+            flags[has_roles] = np.logical_or.reduceat(
+                role_flags[self._pair_roles], starts[has_roles], axis=0
+            )
+        return flags
+
+    def role_row_counts(self, mask):
+        """
+        Count the records of each role in a mask.
+
+        Args:
+            mask (ndarray): Boolean mask over the records
+
+        Returns:
+            ndarray: Number of masked records of each role code
+        """
+        return np.bincount(self.row_roles[mask], minlength=len(self.role_keys))
+
+    def user_ids_of(self, clients, usernames):
+        """
+        Find the encoding IDs of (client, username) keys.
+
+        Args:
+            clients (array-like): Client of each key
+            usernames (array-like): Username of each key
+
+        Returns:
+            ndarray: User ID of each key, -1 for users unknown to the encoding
+        """
+        return self.encoding.user_ids_of(clients, usernames)
+
+    def user_authorizations(self, client, username):
+        """
+        Get the authorizations a user holds through their active roles.
+
+        Args:
+            client (str): Client ID
+            username (str): Username
+
+        Returns:
+            list: One dictionary per AGR_1251 row of the user's roles
+                (role, object, field, from_value, to_value, is_wildcard)
+        """
+        if self._user_index is None:
+            return []
+        positions = self._user_index.positions(client, username)
+        if not len(positions):
+            return []
+        user_id = int(self._assignment_user_ids[positions[0]])
+
+        roles = self._pair_roles[self._user_bounds[user_id]:self._user_bounds[user_id + 1]]
+        rows = np.concatenate(
+            [self._row_order[self._row_bounds[role]:self._row_bounds[role + 1]] for role in roles.tolist()]
+            + [np.zeros(0, dtype=np.int64)]
+        )
+        return [
+            {
+                'role': auth['username'],
+                'object': auth['object'],
+                'field': auth['field'],
+                'from_value': None if pd.isna(auth['from_value']) else auth['from_value'],
+                'to_value': None if pd.isna(auth['to_value']) else auth['to_value'],
+                'is_wildcard': bool(auth['is_wildcard'])
+            }
+            for auth in self.records.take(rows)
+        ]
+
+
+def build_effective_authorizations(data, role_analysis):
+    """
+    Build the effective authorizations of an analysis when AGR_1251 was loaded.
+
+    Args:
+        data (dict): Dictionary containing DataFrames for each loaded table
+        role_analysis (dict): Role analysis results
+
+    Returns:
+        EffectiveAuthorizations: Effective authorizations, or None without
+            AGR_1251 or without encoded role assignments
+    """
+    agr_1251_df = data.get('agr_1251_df')
+    if agr_1251_df is None or 'assignment_user_ids' not in role_analysis:
+        return None
+    missing = [field for field in ROLE_AUTH_FIELDS.values() if field not in agr_1251_df.columns and field != 'HIGH']
+    if missing:
+        print(f"AGR_1251 is missing {', '.join(missing)}, role authorizations are ignored")
+        return None
+
+    print("\n======= BUILD EFFECTIVE AUTHORIZATIONS FUNCTION STARTED =======")
+    effective = EffectiveAuthorizations(role_analysis, agr_1251_df)
+    print(f"Indexed {len(effective.records)} authorization values of {effective.role_count} roles "
+          f"and {effective.assignment_count} active assignments")
+    print("======= BUILD EFFECTIVE AUTHORIZATIONS FUNCTION COMPLETED =======\n")
+    return effective
+
+
+def get_role_users_with_access(effective, object_name, field, value):
+    """
+    Find the users whose active roles grant a value.
+
+    Args:
+        effective (EffectiveAuthorizations): Effective authorizations
+        object_name (str): Authorization object (e.g. S_TCODE)
+        field (str): Authorization field (e.g. TCD)
+        value (str): Value checked (e.g. SU01)
+
+    Returns:
+        dict: The user 'count' and the 'users' (client, username and the
+            granting 'roles' of each user), by user ID
+    """
+    granting = np.unique(effective.row_roles[effective.index.positions(object_name, field, value)])
+
+    users = {}
+    for role in granting.tolist():
+        members = effective.roles_users([role])
+        for user_id in members.tolist():
+            users.setdefault(user_id, []).append(effective.role_keys[role][1])
+
+    keys = effective.encoding.user_keys
+    return {
+        'count': len(users),
+        'users': [
+            {'client': keys[user_id][0], 'username': keys[user_id][1], 'roles': roles}
+            for user_id, roles in sorted(users.items())
+        ]
+    }
+
+
+def _role_columns(agr_1251_df, keep_deleted=False):
+    """
+    Read AGR_1251 rows as authorization record fields.
+
+    Args:
+        agr_1251_df (DataFrame): AGR_1251 table
+        keep_deleted (bool): Keep the rows flagged DELETED, and return the
+            flags under 'deleted'
+
+    Returns:
+        dict: One Series per field of AuthorizationRecords.FIELDS, and the
+            'auth' of each row when AUTH exists, all with a RangeIndex (rows
+            without a role name are dropped)
+    """
+    df = agr_1251_df
+    kept = df['AGR_NAME'].notna().to_numpy() if 'AGR_NAME' in df.columns else np.zeros(len(df), dtype=bool)
+    deleted = np.zeros(len(df), dtype=bool)
+    if 'DELETED' in df.columns:
+        deleted = (df['DELETED'].astype(object).fillna('').astype(str).str.strip().str.upper() == 'X').to_numpy()
+    if not keep_deleted:
+        kept &= ~deleted
+    positions = np.flatnonzero(kept)
+
+    columns = {}
+    for field, column in ROLE_AUTH_FIELDS.items():
+        if column in df.columns:
+            columns[field] = df[column].astype(object).take(positions).reset_index(drop=True)
+        elif field == 'client':
+            columns[field] = pd.Series('000', index=range(len(positions)), dtype=object)
+        else:
+            columns[field] = pd.Series(np.nan, index=range(len(positions)), dtype=object)
+    columns['is_wildcard'] = (
+        _is_wildcard_column(columns['from_value']) | _is_wildcard_column(columns['to_value'])
+    ).reset_index(drop=True)
+    if 'AUTH' in df.columns:
+        columns['auth'] = df['AUTH'].astype(object).take(positions).reset_index(drop=True)
+    if keep_deleted:
+        columns['deleted'] = deleted[positions]
+    return columns
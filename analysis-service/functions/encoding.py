@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Dictionary encoding module for the SAP User Analysis Tool
+
+This module maps the users ((MANDT, BNAME/UNAME) keys), roles (AGR_NAME),
+authorization objects (OBJCT) and fields (FIELD) of USR02, AGR_USERS and
+USR12 to dense integer IDs shared by the three tables. The encoding is
+built once per analysis and kept in the data dictionary, so analyzers
+join, group and count on int32 arrays and only decode the IDs they
+render.
+"""
+
+import weakref
+import numpy as np
+import pandas as pd
+from functions.user_index import factorize_users
+from config import SAP_MANDT_FIELD, SAP_USER_FIELD, SAP_ROLE_USER_FIELD, SAP_AUTH_USER_FIELD
+
+# Tables encoded, with their data key and username field
+ENCODED_TABLES = [
+    ('usr02', 'usr02_df', SAP_USER_FIELD),
+    ('agr_users', 'agr_users_df', SAP_ROLE_USER_FIELD),
+    ('usr12', 'usr12_df', SAP_AUTH_USER_FIELD)
+]
+
+# Data dictionary key holding the encoding
+ENCODING_KEY = 'encoding'
+
+
+class DataEncoding:
+    """
+    Integer IDs of the users, roles, objects and fields of the loaded tables.
+
+    Row-aligned ID arrays are int32, with -1 for rows without a value (no
+    username, no role name...). IDs are numbered in order of first
+    appearance (USR02, then AGR_USERS, then USR12 for users).
+
+    Attributes:
+        user_keys (list): (client, username) of each user ID, as strings
+        roles (list): Role name of each role ID
+        objects (list): Object name of each object ID
+        fields (list): Field name of each field ID
+        user_ids (dict): User ID of each row, by table
+        role_ids (ndarray): Role ID of each AGR_USERS row
+        object_ids (ndarray): Object ID of each USR12 row
+        field_ids (ndarray): Field ID of each USR12 row
+    """
+
+    def __init__(self, data):
+        """
+        Encode the tables of a data dictionary.
+
+        Args:
+            data (dict): Dictionary containing DataFrames for each loaded table
+        """
+        tables = [(table, data.get(key), user_field) for table, key, user_field in ENCODED_TABLES]
+        self._tables = _table_states(data)
+
+        # Users of the three tables share one dictionary
+        clients = []
+        usernames = []
+        for _, df, user_field in tables:
+            if df is None or user_field not in df.columns:
+                rows = 0 if df is None else len(df)
+                clients.append(pd.Series('', index=range(rows), dtype=object))
+                usernames.append(pd.Series(np.nan, index=range(rows), dtype=object))
+                continue
+            if SAP_MANDT_FIELD in df.columns:
+                clients.append(df[SAP_MANDT_FIELD].astype(object).reset_index(drop=True))
+            else:
+                clients.append(pd.Series('000', index=range(len(df)), dtype=object))
+            usernames.append(df[user_field].astype(object).reset_index(drop=True))
+
+        all_usernames = pd.concat(usernames, ignore_index=True)
+        codes, keys = factorize_users(pd.concat(clients, ignore_index=True), all_usernames)
+
+        # Rows without a username get -1; blanks are checked once per key
+        blank_keys = np.array([not username.strip() for _, username in keys], dtype=bool)
+        valid = ~all_usernames.isna().to_numpy() & ~blank_keys[codes]
+        used = np.zeros(len(keys), dtype=bool)
+        used[codes[valid]] = True
+        dense = np.cumsum(used) - 1
+        ids = np.where(valid, dense[codes], -1).astype(np.int32)
+
+        self.user_keys = [key for key, is_used in zip(keys, used.tolist()) if is_used]
+        bounds = np.cumsum([0] + [len(series) for series in usernames])
+        self.user_ids = {
+            table: ids[start:stop]
+            for (table, _, _), start, stop in zip(tables, bounds[:-1], bounds[1:])
+        }
+
+        agr_users_df = data.get('agr_users_df')
+        self.role_ids, self.roles = _encode_column(agr_users_df, 'AGR_NAME')
+        usr12_df = data.get('usr12_df')
+        self.object_ids, self.objects = _encode_column(usr12_df, 'OBJCT')
+        self.field_ids, self.fields = _encode_column(usr12_df, 'FIELD')
+
+    @property
+    def user_count(self):
+        return len(self.user_keys)
+
+    def matches(self, data):
+        """
+        Check that the encoding was built from the current tables of data.
+
+        Args:
+            data (dict): Dictionary containing DataFrames for each loaded table
+
+        Returns:
+            bool: True if no table was replaced, resized or given a key
+                column since the encoding was built
+        """
+        for (ref, length, columns), (current, current_length, current_columns) in zip(
+            self._tables, _table_states(data)
+        ):
+            if (ref is None) != (current is None):
+                return False
+            # The weak reference is dead once its table was collected, so a
+            # new table allocated at the same address does not match
+            if ref is not None and (ref() is not current() or (length, columns) != (current_length, current_columns)):
+                return False
+        return True
+
+    def user_ids_of(self, clients, usernames):
+        """
+        Find the IDs of (client, username) keys.
+
+        Args:
+            clients (array-like): Client of each key
+            usernames (array-like): Username of each key
+
+        Returns:
+            ndarray: User ID of each key, -1 for users unknown to the encoding
+        """
+        keys = self.user_keys
+        clients = pd.Series(clients, dtype=object).reset_index(drop=True)
+        codes, uniques = factorize_users(
+            pd.concat([clients, pd.Series([client for client, _ in keys], dtype=object)], ignore_index=True),
+            pd.concat([
+                pd.Series(usernames, dtype=object).reset_index(drop=True),
+                pd.Series([username for _, username in keys], dtype=object)
+            ], ignore_index=True)
+        )
+        ids = np.full(len(uniques), -1, dtype=np.int64)
+        ids[codes[len(clients):]] = np.arange(len(keys))
+        return ids[codes[:len(clients)]]
+
+    def user_labels(self, user_ids):
+        """
+        Decode user IDs to 'client:username' labels.
+
+        Args:
+            user_ids (array-like): User IDs
+
+        Returns:
+            list: 'client:username' of each ID
+        """
+        keys = self.user_keys
+        return [f"{keys[user_id][0]}:{keys[user_id][1]}" for user_id in np.asarray(user_ids).tolist()]
+
+
+def get_encoding(data):
+    """
+    Get the encoding of a data dictionary, building it on first use.
+
+    The encoding is rebuilt when a table was replaced or a key column added
+    since it was built (e.g. an analyzer filled a missing column).
+
+    Args:
+        data (dict): Dictionary containing DataFrames for each loaded table
+
+    Returns:
+        DataEncoding: Encoding of the tables
+    """
+    encoding = data.get(ENCODING_KEY)
+    if encoding is None or not encoding.matches(data):
+        encoding = DataEncoding(data)
+        data[ENCODING_KEY] = encoding
+    return encoding
+
+
+def _encode_column(df, field):
+    """
+    Encode a column as int32 IDs in order of first appearance.
+
+    Args:
+        df (DataFrame): Table, or None if it was not loaded
+        field (str): Field to encode
+
+    Returns:
+        tuple: (int32 ID of each row, -1 for missing values; list of values
+            indexed by ID)
+    """
+    if df is None or field not in df.columns:
+        return np.full(0 if df is None else len(df), -1, dtype=np.int32), []
+    codes, uniques = pd.factorize(df[field])
+    return codes.astype(np.int32), list(uniques.astype(object))
+
+
+def _table_states(data):
+    """
+    Identify the tables and key columns an encoding is built from.
+
+    Args:
+        data (dict): Dictionary containing DataFrames for each loaded table
+
+    Returns:
+        list: (weak reference to the table, its length, which key columns
+            exist) for each encoded table, (None, 0, ()) for tables not loaded
+    """
+    states = []
+    for _, key, user_field in ENCODED_TABLES:
+        df = data.get(key)
+        if df is None:
+            states.append((None, 0, ()))
+            continue
+        columns = tuple(
+            field in df.columns
+            for field in (SAP_MANDT_FIELD, user_field, 'AGR_NAME', 'OBJCT', 'FIELD')
+        )
+        states.append((weakref.ref(df), len(df), columns))
+    return states
@@ -0,0 +1,1118 @@
+#!/usr/bin/env python3
+"""
+File parser module for the SAP User Analysis Tool
+
+This module turns uploaded SAP extracts (CSV, TXT, Excel) into DataFrames.
+.xlsx workbooks are streamed row by row from a read-only openpyxl
+worksheet; a workbook holding USR02, AGR_USERS and USR12 (and optionally
+AGR_1251 and AGR_AGRS) as separate sheets can be parsed in a single pass with
+parse_workbook.
+Delimited text files go through a sniffer that inspects only the first few
+KB of the file to choose the encoding, delimiter, quote character and
+header row, so the full file is parsed exactly once by the C engine.
+SAP list downloads (SE16/ALV "unconverted" text: pipe-framed rows between
+---- ruler lines, with the header repeated on every page) are recognised
+by the sniffer and streamed line by line by parse_sap_list.
+
+When the SAP table is known, only the columns listed for it in
+REQUIRED_FIELDS/OPTIONAL_FIELDS are read. Key fields become categoricals,
+SAP dates and times become Int32, and rows for other clients are dropped
+chunk by chunk while the file is read.
+
+Uploads are never read into memory as a whole: parsers work on the
+spooled temporary file behind the upload, which keeps at most
+UPLOAD_SPOOL_MAX_SIZE bytes in memory and rolls the rest over to disk.
+Compressed uploads (.gz, .bz2, .zip) are decompressed as a stream while
+the parser reads them; a zip may hold the three tables (and AGR_1251,
+AGR_AGRS), which are told apart by file name.
+"""
+
+import bz2
+
+import codecs
+import csv
+import gzip
+import io
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from collections import Counter
+from datetime import date, datetime, time
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.api.types import union_categoricals
+from config import (
+    CONFIG,
+    REQUIRED_FIELDS,
+    OPTIONAL_FIELDS,
+    CATEGORICAL_FIELDS,
+    SAP_DATE_FIELDS,
+    SAP_TIME_FIELDS,
+    SAP_MANDT_FIELD
+)
+
+# Number of bytes inspected by the sniffer
+SNIFF_SAMPLE_SIZE = 16 * 1024
+
+# Candidate delimiters, in order of preference when scores are equal
+CANDIDATE_DELIMITERS = [',', ';', '\t', '|']
+
+# Candidate quote characters
+CANDIDATE_QUOTECHARS = ['"', "'"]
+
+# Normalized name fragments identifying each SAP table in sheet and file names
+TABLE_NAME_PATTERNS = [
+    ('AGRUSERS', 'agr_users'),
+    ('USR02', 'usr02'),
+    ('USR12', 'usr12'),
+    ('UST12', 'usr12'),
+    ('AGR1251', 'agr_1251'),
+    ('AGRAGRS', 'agr_agrs')
+]
+
+# Ruler lines framing SAP list output (----, |---|, |---+---|)
+SAP_LIST_RULER = re.compile(r'^[|+-]*-{5,}[|+-]*$')
+
+# Line terminators of the CSV parser (pandas counts skiprows in these lines)
+LINE_BREAK = re.compile(r'\r\n|\r|\n')
+
+# Extensions of the extract files the parsers read
+SUPPORTED_EXTENSIONS = ('.csv', '.txt', '.xlsx', '.xls')
+
+# Compressed containers accepted around the extract files
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.zip')
+
+# Size of the chunks copied when an upload has to be re-spooled
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Bytes kept in memory before a spooled upload rolls over to disk
+UPLOAD_SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def open_upload(upload, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Get a seekable binary file object for an uploaded file without reading
+    the upload into memory.
+
+    Starlette already streams multipart uploads into a spooled temporary
+    file, which is used directly. Anything that is not seekable is copied
+    chunk by chunk into a new spooled temporary file.
+
+    Args:
+        upload (UploadFile): Uploaded file
+        chunk_size (int): Size of the chunks copied when re-spooling
+
+    Returns:
+        file: Seekable binary file object positioned at the start
+    """
+    source = upload.file
+    if _is_seekable(source):
+        source.seek(0)
+        return source
+
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE)
+    shutil.copyfileobj(source, spool, chunk_size)
+    spool.seek(0)
+    return spool
+
+
+def is_supported_upload(filename):
+    """
+    Check whether an uploaded file name has an extension the parsers accept.
+
+    Args:
+        filename (str): The name of the file
+
+    Returns:
+        bool: True for extract files, compressed or not. The content of a
+            zip archive is only checked when it is opened.
+    """
+    name = filename.lower()
+    if name.endswith('.zip'):
+        return True
+    if name.endswith(('.gz', '.bz2')):
+        name = os.path.splitext(name)[0]
+    return name.endswith(SUPPORTED_EXTENSIONS)
+
+
+def open_archive(filename, buffer):
+    """
+    Open the extract files inside a compressed upload as decompressing streams.
+
+    Nothing is decompressed up front: each stream inflates the data as the
+    parser reads it. .xlsx members are the exception, as openpyxl needs
+    random access; they are still zip-compressed, so their bytes are
+    spooled as they are.
+
+    Args:
+        filename (str): The name of the uploaded file
+        buffer: Seekable binary file object with the upload
+
+    Returns:
+        list: (member file name, binary file object) tuples; a single tuple
+            for .gz and .bz2 files, and an empty list for other files
+
+    Raises:
+        ValueError: If the upload is not a valid archive
+    """
+    name = filename.lower()
+    try:
+        if name.endswith(('.gz', '.bz2')):
+            member_name = os.path.splitext(filename)[0]
+            if name.endswith('.gz'):
+                stream = gzip.GzipFile(fileobj=buffer, mode='rb')
+            else:
+                stream = bz2.BZ2File(buffer, mode='rb')
+            return [(member_name, _member_stream(member_name, stream))]
+        if name.endswith('.zip'):
+            archive = zipfile.ZipFile(buffer)
+            return [
+                (info.filename, _member_stream(info.filename, archive.open(info)))
+                for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith('__MACOSX/')
+                and info.filename.lower().endswith(SUPPORTED_EXTENSIONS)
+            ]
+    except (OSError, EOFError, zipfile.BadZipFile) as e:
+        raise ValueError(f"Could not open archive {filename}: {str(e)}")
+    return []
+
+
+def open_table_upload(filename, buffer, table=None):
+    """
+    Get the file to parse for a table from a possibly compressed upload.
+
+    Args:
+        filename (str): The name of the uploaded file
+        buffer: Seekable binary file object with the upload
+        table (str): SAP table key, used to pick the member of a zip
+            archive holding several tables
+
+    Returns:
+        tuple: (file name, binary file object) to hand to the parser
+
+    Raises:
+        ValueError: If the archive holds no file for the table
+    """
+    if not filename.lower().endswith(COMPRESSED_EXTENSIONS):
+        return filename, buffer
+
+    members = open_archive(filename, buffer)
+    if len(members) == 1:
+        return members[0]
+    for member_name, stream in members:
+        if table_for_name(os.path.basename(member_name)) == table:
+            return member_name, stream
+    raise ValueError(f"Archive {filename} has no file for {str(table).upper()}")
+
+
+def open_archive_tables(filename, buffer):
+    """
+    Route the members of a zip archive to the SAP tables they hold.
+
+    Args:
+        filename (str): The name of the uploaded archive
+        buffer: Seekable binary file object with the archive
+
+    Returns:
+        dict: Mapping of table key to a (member file name, binary file
+            object) tuple; members whose name matches no table are ignored
+    """
+    tables = {}
+    for member_name, stream in open_archive(filename, buffer):
+        table = table_for_name(os.path.basename(member_name))
+        if table is not None and table not in tables:
+            tables[table] = (member_name, stream)
+    return tables
+
+
+def sniff_dialect(buffer, sample_size=SNIFF_SAMPLE_SIZE):
+    """
+    Detect the dialect of a delimited text file from its first bytes.
+
+    Args:
+        buffer: Seekable binary file object
+        sample_size (int): Number of bytes to inspect
+
+    Returns:
+        dict: Detected dialect with keys 'format' ('delimited' or
+            'sap_list'), 'encoding', 'delimiter', 'quotechar' and
+            'header_row' (number of lines before the header)
+    """
+    buffer.seek(0)
+    sample = buffer.read(sample_size)
+    buffer.seek(0)
+
+    # The sample is complete when the whole file fits in it
+    truncated = len(sample) == sample_size
+    encoding, text = _detect_encoding(sample, truncated)
+
+    lines = _split_lines(text)
+    if truncated and len(lines) > 1:
+        # The last line is most likely cut in the middle
+        lines = lines[:-1]
+
+    quotechar = _detect_quotechar(text)
+    delimiter, field_count = _detect_delimiter(lines, quotechar)
+    header_row = _detect_header_row(lines, delimiter, quotechar, field_count)
+
+    return {
+        'format': 'sap_list' if _detect_sap_list(lines) else 'delimited',
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'quotechar': quotechar,
+        'header_row': header_row
+    }
+
+
+def parse_file_to_dataframe(filename, buffer, table=None, mandt=None):
+    """
+    Parse a file buffer into a pandas DataFrame.
+
+    Args:
+        filename (str): The name of the file
+        buffer: Seekable binary file object with the file content
+        table (str): SAP table key in REQUIRED_FIELDS ('usr02', 'agr_users',
+            'usr12', 'agr_1251', 'agr_agrs'). When given, only the analyzed columns are read and typed.
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        tuple: (DataFrame, dict) with the parsed data and the dialect used
+
+    Raises:
+        Exception: If the file cannot be parsed
+    """
+    print(f"Attempting to parse file: {filename}")
+
+    if filename.lower().endswith('.xlsx'):
+        print(f"Streaming Excel file: {filename}")
+        workbook = load_workbook(buffer, read_only=True, data_only=True)
+        try:
+            sheet_name = _sheet_for_table(workbook.sheetnames, table)
+            df = _read_worksheet(workbook[sheet_name], table, mandt)
+        finally:
+            workbook.close()
+        print(f"Successfully parsed sheet {sheet_name} with {len(df)} rows and {len(df.columns)} columns")
+        return df, {'format': 'excel', 'sheet': sheet_name}
+
+    if filename.lower().endswith('.xls'):
+        print(f"Parsing Excel file: {filename}")
+        options = {'dtype': str} if table else {}
+        try:
+            df = pd.read_excel(buffer, **options)
+        except Exception as e:
+            print(f"Error with default Excel parsing: {str(e)}")
+            buffer.seek(0)
+            df = pd.read_excel(buffer, engine='openpyxl', **options)
+        if table:
+            df = apply_table_schema(df, table, mandt)
+        print(f"Successfully parsed Excel file with {len(df)} rows and {len(df.columns)} columns")
+        return df, {'format': 'excel'}
+
+    dialect = sniff_dialect(buffer)
+
+    if dialect['format'] == 'sap_list':
+        print(f"Streaming SAP list output: {filename} with encoding {dialect['encoding']}")
+        try:
+            df = _read_sap_list(buffer, dialect, table, mandt)
+            if len(df.columns) > 1:
+                print(f"Successfully parsed {filename}: {len(df)} rows and {len(df.columns)} columns")
+                return df, dict(dialect)
+            print(f"SAP list parsing produced a single column for {filename}")
+        except Exception as e:
+            print(f"SAP list parsing failed for {filename}: {str(e)}")
+        dialect['format'] = 'delimited'
+
+    print(f"Parsing CSV-like file: {filename} with dialect {dialect}")
+
+    try:
+        df = _read_delimited(buffer, dialect, table, mandt)
+        if len(df.columns) > 1:
+            print(f"Successfully parsed {filename}: {len(df)} rows and {len(df.columns)} columns")
+            return df, dict(dialect)
+        print(f"Sniffed dialect produced a single column for {filename}")
+    except Exception as e:
+        print(f"Parsing with sniffed dialect failed for {filename}: {str(e)}")
+
+    # The sniffer could not make sense of the file, fall back to the slow paths
+    try:
+        buffer.seek(0)
+        df = pd.read_csv(buffer, sep=None, engine='python', encoding_errors='replace')
+        if table:
+            df = apply_table_schema(df, table, mandt)
+        if len(df) > 0:
+            print(f"Successfully parsed with flexible options: {len(df)} rows and {len(df.columns)} columns")
+            return df, {'format': 'delimited', 'engine': 'python', 'encoding': 'utf-8'}
+    except Exception as e:
+        print(f"Flexible parsing failed for {filename}: {str(e)}")
+
+    try:
+        buffer.seek(0)
+        df = pd.read_fwf(buffer, encoding_errors='replace')
+        if table:
+            df = apply_table_schema(df, table, mandt)
+        if len(df) > 0:
+            print(f"Successfully parsed as fixed-width file: {len(df)} rows")
+            return df, {'format': 'fixed_width'}
+    except Exception as fw_error:
+        print(f"Fixed-width parsing also failed: {str(fw_error)}")
+
+    raise Exception(f"Could not parse file {filename} with any available method")
+
+
+def parse_workbook(filename, buffer, mandt=None):
+    """
+    Parse every SAP table sheet of an .xlsx workbook in one pass over the file.
+
+    Sheets are matched to tables by name (USR02, AGR_USERS, USR12/UST12,
+    AGR_1251, AGR_AGRS); other sheets are ignored.
+
+    Args:
+        filename (str): The name of the file
+        buffer: Seekable binary file object with the workbook
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        dict: Mapping of table key to a (DataFrame, dict) tuple as returned
+            by parse_file_to_dataframe
+    """
+    print(f"Streaming Excel workbook: {filename}")
+    workbook = load_workbook(buffer, read_only=True, data_only=True)
+    tables = {}
+    try:
+        for sheet_name in workbook.sheetnames:
+            table = table_for_name(sheet_name)
+            if table is None or table in tables:
+                continue
+            df = _read_worksheet(workbook[sheet_name], table, mandt)
+            print(f"Parsed sheet {sheet_name} as {table.upper()}: {len(df)} rows")
+            tables[table] = (df, {'format': 'excel', 'sheet': sheet_name})
+    finally:
+        workbook.close()
+    return tables
+
+
+def parse_sap_list(lines, table=None, mandt=None):
+    """
+    Parse SAP list output (SE16/ALV text download) from an iterator of lines.
+
+    Ruler lines, title lines and the header repeated on each page are
+    skipped, and padded cells are trimmed. Lines are consumed one at a
+    time, so the file never has to fit in memory.
+
+    Args:
+        lines: Iterator of text lines
+        table (str): SAP table key in REQUIRED_FIELDS, or None to read
+            every column untyped
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        DataFrame: Parsed data, typed like the delimited path
+    """
+    rows = _sap_list_rows(lines)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    names = [cell or f"Unnamed: {i}" for i, cell in enumerate(header)]
+    return _read_rows(names, rows, table, mandt)
+
+
+def table_for_name(name):
+    """
+    Identify the SAP table held by a sheet or file from its name.
+
+    Args:
+        name (str): Sheet or file name
+
+    Returns:
+        str: Table key in REQUIRED_FIELDS, or None if the name matches no table
+    """
+    normalized = re.sub(r'[^A-Z0-9]', '', str(name).upper())
+    for pattern, table in TABLE_NAME_PATTERNS:
+        if pattern in normalized:
+            return table
+    return None
+
+
+def get_table_schema(table):
+    """
+    Get the columns and dtypes read for a SAP table.
+
+    Args:
+        table (str): SAP table key in REQUIRED_FIELDS
+
+    Returns:
+        dict: Mapping of column name to dtype ('category', 'date', 'time' or 'str')
+    """
+    schema = {}
+    for field in REQUIRED_FIELDS[table] + OPTIONAL_FIELDS.get(table, []):
+        if field in CATEGORICAL_FIELDS:
+            schema[field] = 'category'
+        elif field in SAP_DATE_FIELDS:
+            schema[field] = 'date'
+        elif field in SAP_TIME_FIELDS:
+            schema[field] = 'time'
+        else:
+            schema[field] = 'str'
+    return schema
+
+
+def apply_table_schema(df, table, mandt=None):
+    """
+    Prune, filter and type an already parsed DataFrame with a table schema.
+
+    Used for inputs that cannot be pruned while parsing (Excel and the
+    fallback parsers). Column names are matched case-insensitively.
+
+    Args:
+        df (DataFrame): Parsed data
+        table (str): SAP table key in REQUIRED_FIELDS
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        DataFrame: Typed data with upper-case column names
+    """
+    schema = get_table_schema(table)
+    selected = _select_columns(df.columns, schema)
+    if not selected:
+        print(f"None of the {table.upper()} fields were found, keeping all columns untyped")
+        return df
+
+    df = df[list(selected)].rename(columns=selected)
+    for column in df.columns:
+        if schema[column] in ('category', 'str'):
+            df[column] = df[column].fillna('').astype(str)
+    df = _filter_client(df, mandt)
+    df = _apply_sap_types(df, schema)
+    for column, dtype in schema.items():
+        if dtype == 'category' and column in df.columns:
+            df[column] = df[column].astype('category')
+    return df.reset_index(drop=True)
+
+
+def _select_columns(columns, schema):
+    """
+    Map the columns of a file to the schema fields they hold.
+
+    Args:
+        columns (list): Column names as found in the file
+        schema (dict): Table schema from get_table_schema
+
+    Returns:
+        dict: Mapping of original column name to schema field name
+    """
+    selected = {}
+    for column in columns:
+        field = str(column).strip().upper()
+        if field in schema and field not in selected.values():
+            selected[column] = field
+    return selected
+
+
+def _filter_client(df, mandt):
+    """
+    Drop the rows of other clients.
+
+    Args:
+        df (DataFrame): Data with schema field names
+        mandt (str): Client to keep, or None to keep all clients
+
+    Returns:
+        DataFrame: Rows for the requested client
+    """
+    if mandt is None or SAP_MANDT_FIELD not in df.columns:
+        return df
+
+    column = df[SAP_MANDT_FIELD]
+    mandt = str(mandt).strip()
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Compare the few category labels instead of every row
+        matching = [c for c in column.cat.categories if str(c).strip() == mandt]
+        return df[column.isin(matching)]
+    return df[column.astype(str).str.strip() == mandt]
+
+
+def _apply_sap_types(df, schema):
+    """
+    Convert SAP date and time columns to Int32 in place.
+
+    Args:
+        df (DataFrame): Data with schema field names
+        schema (dict): Table schema from get_table_schema
+
+    Returns:
+        DataFrame: The same DataFrame
+    """
+    for column in df.columns:
+        dtype = schema.get(column)
+        if dtype in ('date', 'time'):
+            df[column] = _to_sap_int(df[column])
+    return df
+
+
+def _to_sap_int(series):
+    """
+    Convert SAP date or time values to Int32.
+
+    Each distinct value is converted once. Separators ('2024-01-31',
+    '10:15:00') and float renderings ('20240131.0') are accepted. The SAP
+    initial values 00000000 and 000000 (0) are missing, as in the string
+    formatters.
+
+    Args:
+        series (Series): Raw values
+
+    Returns:
+        Series: Int32 values with <NA> for missing or invalid entries
+    """
+    codes, uniques = pd.factorize(series)
+    digits = (
+        pd.Series(uniques, dtype=object).astype(str)
+        .str.strip()
+        .str.replace(r'\.0*$', '', regex=True)
+        .str.replace(r'\D', '', regex=True)
+    )
+    values = pd.to_numeric(digits, errors='coerce')
+    invalid = values.isna() | (values <= 0) | (values > np.iinfo(np.int32).max)
+    converted = pd.array(values.where(~invalid), dtype='Float64').astype('Int32')
+    result = converted.take(codes, allow_fill=True)
+    return pd.Series(result, index=series.index, name=series.name)
+
+
+def _sheet_for_table(sheet_names, table):
+    """
+    Pick the worksheet to read for a table.
+
+    Args:
+        sheet_names (list): Sheet names of the workbook
+        table (str): SAP table key, or None
+
+    Returns:
+        str: Name of the sheet named after the table, or of the first sheet
+    """
+    if table:
+        for sheet_name in sheet_names:
+            if table_for_name(sheet_name) == table:
+                return sheet_name
+    return sheet_names[0]
+
+
+def _read_worksheet(worksheet, table, mandt):
+    """
+    Stream a read-only worksheet into a DataFrame, building typed columns
+    row by row.
+
+    Args:
+        worksheet: openpyxl read-only worksheet
+        table (str): SAP table key in REQUIRED_FIELDS, or None to read
+            every column untyped
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        DataFrame: Parsed data
+    """
+    # The dimension stored in exported files is often wrong
+    worksheet.reset_dimensions()
+    rows = worksheet.iter_rows(values_only=True)
+
+    header = next((row for row in rows if any(_cell_text(v).strip() for v in row)), None)
+    if header is None:
+        return pd.DataFrame()
+    names = [_cell_text(v) or f"Unnamed: {i}" for i, v in enumerate(header)]
+    return _read_rows(names, rows, table, mandt)
+
+
+def _read_rows(names, rows, table, mandt):
+    """
+    Build typed columns from an iterator of rows, chunk by chunk.
+
+    Args:
+        names (list): Column names
+        rows: Iterator of row value sequences (cell values or strings)
+        table (str): SAP table key in REQUIRED_FIELDS, or None to read
+            every column untyped
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        DataFrame: Parsed data
+    """
+    schema = get_table_schema(table) if table else {}
+    selected = _select_columns(names, schema)
+    if not selected:
+        if table:
+            print(f"None of the {table.upper()} fields were found, keeping all columns untyped")
+        schema = {}
+        selected = {name: name for name in names}
+    positions = [(i, selected[name]) for i, name in enumerate(names) if name in selected]
+    fields = [field for _, field in positions]
+
+    mandt_position = None
+    if mandt is not None and SAP_MANDT_FIELD in fields:
+        mandt_position = positions[fields.index(SAP_MANDT_FIELD)][0]
+        mandt = str(mandt).strip()
+
+    chunks = []
+    columns = [[] for _ in positions]
+    for row in rows:
+        if mandt_position is not None:
+            value = row[mandt_position] if mandt_position < len(row) else None
+            if _cell_text(value).strip() != mandt:
+                continue
+        values = [row[i] if i < len(row) else None for i, _ in positions]
+        if all(v is None for v in values):
+            continue
+        for column, value in zip(columns, values):
+            column.append(value)
+        if len(columns[0]) >= CONFIG['read_chunk_rows']:
+            chunks.append(_rows_chunk(columns, fields, schema))
+            columns = [[] for _ in positions]
+
+    if columns[0] or not chunks:
+        chunks.append(_rows_chunk(columns, fields, schema))
+    return _concat_chunks(chunks, schema)
+
+
+def _rows_chunk(columns, fields, schema):
+    """
+    Build a typed DataFrame chunk from values collected row by row.
+
+    Args:
+        columns (list): One list of cell values per column
+        fields (list): Column names
+        schema (dict): Table schema from get_table_schema (empty when untyped)
+
+    Returns:
+        DataFrame: Typed chunk
+    """
+    data = {}
+    for field, values in zip(fields, columns):
+        kind = schema.get(field)
+        if kind in ('category', 'str'):
+            data[field] = pd.Series([_cell_text(v) for v in values], dtype=object)
+        elif kind in ('date', 'time'):
+            raw = pd.Series([_sap_cell(v, kind) for v in values], dtype=object)
+            data[field] = _to_sap_int(raw)
+        else:
+            data[field] = pd.Series(values, dtype=object)
+    return pd.DataFrame(data)
+
+
+def _read_sap_list(buffer, dialect, table=None, mandt=None):
+    """
+    Stream a SAP list download through parse_sap_list.
+
+    Args:
+        buffer: Seekable binary file object
+        dialect (dict): Dialect returned by sniff_dialect
+        table (str): SAP table key in REQUIRED_FIELDS, or None
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        DataFrame: Parsed data
+    """
+    buffer.seek(0)
+    try:
+        return _parse_sap_list_buffer(buffer, dialect['encoding'], table, mandt)
+    except UnicodeDecodeError:
+        print(f"Encoding {dialect['encoding']} failed beyond the sample, retrying with latin1")
+        dialect['encoding'] = 'latin1'
+        buffer.seek(0)
+        return _parse_sap_list_buffer(buffer, 'latin1', table, mandt)
+
+
+def _parse_sap_list_buffer(buffer, encoding, table, mandt):
+    """
+    Decode a binary file line by line and parse it as SAP list output.
+
+    Args:
+        buffer: Binary file object positioned at the start
+        encoding (str): File encoding
+        table (str): SAP table key in REQUIRED_FIELDS, or None
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        DataFrame: Parsed data
+    """
+    text = io.TextIOWrapper(buffer, encoding=encoding, newline=None)
+    try:
+        return parse_sap_list(text, table, mandt)
+    finally:
+        # Leave the upload open for the caller
+        text.detach()
+
+
+def _sap_list_rows(lines):
+    """
+    Yield the cells of the header and data lines of SAP list output.
+
+    The first row yielded is the header; later copies of it (page headers)
+    are dropped, as are rulers, blank lines and lines without cells.
+
+    Args:
+        lines: Iterator of text lines
+
+    Returns:
+        generator: Lists of trimmed cell strings
+    """
+    header = None
+    for line in lines:
+        line = line.strip()
+        if not line or '|' not in line or SAP_LIST_RULER.match(line):
+            continue
+        cells = _split_sap_list_line(line)
+        if header is None:
+            header = cells
+        elif cells == header:
+            continue
+        yield cells
+
+
+def _split_sap_list_line(line):
+    """
+    Split a stripped SAP list line into trimmed cells.
+
+    Args:
+        line (str): Line without surrounding whitespace
+
+    Returns:
+        list: Cell strings
+    """
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|'):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split('|')]
+
+
+def _cell_text(value):
+    """
+    Render an Excel cell value as the text SAP exported.
+
+    Args:
+        value: Cell value from openpyxl
+
+    Returns:
+        str: Cell text ('' for empty cells, no '.0' on whole numbers)
+    """
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _sap_cell(value, kind):
+    """
+    Render an Excel date or time cell in SAP format.
+
+    Args:
+        value: Cell value from openpyxl
+        kind (str): 'date' or 'time'
+
+    Returns:
+        str: YYYYMMDD for dates, HHMMSS for times, the cell text otherwise
+    """
+    if isinstance(value, (datetime, time)) and kind == 'time':
+        return value.strftime('%H%M%S')
+    if isinstance(value, date):
+        return value.strftime('%Y%m%d')
+    return _cell_text(value)
+
+
+def _member_stream(name, stream):
+    """
+    Prepare a decompressing stream for the parsers.
+
+    Args:
+        name (str): Name of the compressed file
+        stream: Binary file object decompressing the file
+
+    Returns:
+        file: The stream itself, or a spooled copy for .xlsx files
+    """
+    if not name.lower().endswith('.xlsx'):
+        return stream
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE)
+    shutil.copyfileobj(stream, spool, UPLOAD_CHUNK_SIZE)
+    spool.seek(0)
+    return spool
+
+
+def _is_seekable(fileobj):
+    """
+    Check whether a file object supports seeking.
+
+    Args:
+        fileobj: File object
+
+    Returns:
+        bool: True if the file object can be rewound
+    """
+    try:
+        # SpooledTemporaryFile has no seekable() before Python 3.11
+        seekable = getattr(fileobj, 'seekable', None)
+        if seekable is not None:
+            return seekable()
+        fileobj.tell()
+        return True
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def _read_delimited(buffer, dialect, table=None, mandt=None):
+    """
+    Run a single C-engine parse of a delimited file with a known dialect.
+
+    Args:
+        buffer: Seekable binary file object
+        dialect (dict): Dialect returned by sniff_dialect
+        table (str): SAP table key in REQUIRED_FIELDS, or None to read
+            every column untyped
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        DataFrame: Parsed data
+    """
+    options = {
+        'sep': dialect['delimiter'],
+        'quotechar': dialect['quotechar'],
+        'skiprows': dialect['header_row'],
+        'engine': 'c'
+    }
+
+    buffer.seek(0)
+    try:
+        return _read_csv(buffer, dialect['encoding'], options, table, mandt)
+    except UnicodeDecodeError:
+        # The sample decoded cleanly but a later part of the file did not;
+        # latin1 accepts any byte sequence
+        print(f"Encoding {dialect['encoding']} failed beyond the sample, retrying with latin1")
+        dialect['encoding'] = 'latin1'
+        buffer.seek(0)
+        return _read_csv(buffer, 'latin1', options, table, mandt)
+
+
+def _read_csv(buffer, encoding, options, table, mandt):
+    """
+    Read a delimited file, pruning and typing columns when the table is known.
+
+    Args:
+        buffer: Binary file object positioned at the start
+        encoding (str): File encoding
+        options (dict): Dialect options for pd.read_csv
+        table (str): SAP table key in REQUIRED_FIELDS, or None
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        DataFrame: Parsed data
+    """
+    if not table:
+        return pd.read_csv(buffer, encoding=encoding, **options)
+
+    schema = get_table_schema(table)
+    header = pd.read_csv(buffer, encoding=encoding, nrows=0, **options).columns
+    selected = _select_columns(header, schema)
+    buffer.seek(0)
+    if not selected:
+        print(f"None of the {table.upper()} fields were found, keeping all columns untyped")
+        return pd.read_csv(buffer, encoding=encoding, **options)
+
+    # Strings stay strings ('' for empty cells); only key fields are categorical.
+    # Categoricals are only built while parsing when no client filter splits the read.
+    dtypes = {
+        column: ('category' if schema[field] == 'category' and mandt is None else str)
+        for column, field in selected.items()
+    }
+    reader = pd.read_csv(
+        buffer,
+        encoding=encoding,
+        usecols=list(selected),
+        dtype=dtypes,
+        keep_default_na=False,
+        chunksize=CONFIG['read_chunk_rows'],
+        **options
+    )
+
+    chunks = []
+    for chunk in reader:
+        chunk = chunk.rename(columns=selected)
+        chunk = _filter_client(chunk, mandt)
+        chunks.append(_apply_sap_types(chunk, schema))
+
+    if not chunks:
+        empty = pd.DataFrame({field: pd.Series(dtype=object) for field in selected.values()})
+        return _apply_sap_types(empty, schema)
+    return _concat_chunks(chunks, schema)
+
+
+def _concat_chunks(chunks, schema):
+    """
+    Concatenate parsed chunks, merging the categories of categorical columns.
+
+    Args:
+        chunks (list): DataFrames with the same columns
+        schema (dict): Table schema from get_table_schema
+
+    Returns:
+        DataFrame: Concatenated data
+    """
+    columns = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if schema.get(column) == 'category':
+            parts = [part.astype('category') for part in parts]
+            columns[column] = pd.Series(union_categoricals(parts), name=column)
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def _detect_encoding(sample, truncated):
+    """
+    Pick the encoding of a byte sample.
+
+    Args:
+        sample (bytes): First bytes of the file
+        truncated (bool): Whether the sample ends before the file does
+
+    Returns:
+        tuple: (encoding name, decoded text)
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig', sample[len(codecs.BOM_UTF8):].decode('utf-8', errors='replace')
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16', sample.decode('utf-16', errors='replace')
+
+    for encoding in ['utf-8', 'cp1252']:
+        # An incremental decoder tolerates a multi-byte character cut at the end
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            return encoding, decoder.decode(sample, final=not truncated)
+        except UnicodeDecodeError:
+            continue
+
+    return 'latin1', sample.decode('latin1')
+
+
+def _detect_sap_list(lines):
+    """
+    Check whether sample lines look like SAP list output.
+
+    Args:
+        lines (list): Sample lines
+
+    Returns:
+        bool: True if the sample has ruler lines framing pipe-separated rows
+    """
+    has_ruler = False
+    framed_rows = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if SAP_LIST_RULER.match(line):
+            has_ruler = True
+        elif line.startswith('|') and line.endswith('|') and len(line) > 1:
+            framed_rows += 1
+    return has_ruler and framed_rows > 0
+
+
+def _detect_quotechar(text):
+    """
+    Pick the quote character of a text sample.
+
+    Args:
+        text (str): Decoded sample
+
+    Returns:
+        str: Quote character
+    """
+    try:
+        quotechar = csv.Sniffer().sniff(text, delimiters=''.join(CANDIDATE_DELIMITERS)).quotechar
+        if quotechar in CANDIDATE_QUOTECHARS:
+            return quotechar
+    except csv.Error:
+        pass
+    return '"'
+
+
+def _detect_delimiter(lines, quotechar):
+    """
+    Pick the delimiter that splits the sample lines most consistently.
+
+    Args:
+        lines (list): Sample lines
+        quotechar (str): Quote character
+
+    Returns:
+        tuple: (delimiter, most common field count for that delimiter)
+    """
+    lines = [line for line in lines if line.strip()]
+    best = (CANDIDATE_DELIMITERS[0], 1)
+    best_score = (0, 0)
+
+    for delimiter in CANDIDATE_DELIMITERS:
+        counts = Counter(
+            len(row) for row in csv.reader(lines, delimiter=delimiter, quotechar=quotechar)
+        )
+        if not counts:
+            continue
+        field_count, consistent_lines = counts.most_common(1)[0]
+        if field_count < 2:
+            continue
+        # Prefer the delimiter with the most consistent lines, then the most columns
+        score = (consistent_lines, field_count)
+        if score > best_score:
+            best, best_score = (delimiter, field_count), score
+
+    return best
+
+
+def _split_lines(text):
+    """
+    Split text into the physical lines the CSV parser counts.
+
+    str.splitlines also breaks on form feeds, vertical tabs, NEL and the
+    Unicode line separators, which would shift the header row given to
+    skiprows, so only CR LF, CR and LF end a line here.
+
+    Args:
+        text (str): Decoded sample
+
+    Returns:
+        list: Lines without their terminators (no empty last line for a
+            text ending with a terminator)
+    """
+    lines = LINE_BREAK.split(text)
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def _detect_header_row(lines, delimiter, quotechar, field_count):
+    """
+    Find the header line, skipping any title or blank lines before it.
+
+    Args:
+        lines (list): Sample lines
+        delimiter (str): Detected delimiter
+        quotechar (str): Detected quote character
+        field_count (int): Expected number of fields per line
+
+    Returns:
+        int: Number of lines to skip before the header
+    """
+    if field_count < 2:
+        return 0
+
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        row = next(csv.reader([line], delimiter=delimiter, quotechar=quotechar))
+        if len(row) == field_count:
+            return index
+
+    return 0
@@ -4,9 +4,15 @@ Formatting utilities for SAP data
 
 This module provides functions to format SAP-specific data formats
 into more readable formats for output.
+
+Each scalar formatter is a thin wrapper around an element decoder. The
+*_series counterparts format a whole column by decoding each distinct
+value (or pair of values) once and mapping the results back, so they return exactly what the
+scalar functions return for every cell.
 """
 
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from config import CONFIG
 
@@ -20,21 +26,7 @@ def format_sap_date(date_str):
     Returns:
         str: Formatted date string or "Not available" if invalid
     """
-    if pd.isna(date_str) or str(date_str).strip() in ['', 'nan', '00000000']:
-        return "Not available"
-    
-    try:
-        # Remove decimals and convert to string
-        date_str = str(int(float(date_str)))
-        
-        # Format date if it's a valid 8-digit string
-        if len(date_str) == 8:
-            date_obj = datetime.strptime(date_str, CONFIG['sap_date_format'])
-            return date_obj.strftime(CONFIG['output_date_format'])
-        return date_str
-    except (ValueError, TypeError):
-        # If conversion fails, return as is
-        return str(date_str)
+    return _decode_sap_date(date_str)
 
 def format_sap_time(time_str):
     """
@@ -46,21 +38,249 @@ def format_sap_time(time_str):
     Returns:
         str: Formatted time string or "Not available" if invalid
     """
-    if pd.isna(time_str) or str(time_str).strip() in ['', 'nan', '000000']:
-        return "Not available"
+    return _decode_sap_time(time_str)
+
+def format_sap_date_series(dates):
+    """
+    Convert a column of SAP dates to readable dates.
+    
+    Args:
+        dates (Series): Dates in SAP format
+        
+    Returns:
+        Series: Formatted date strings, as format_sap_date returns them
+    """
+    return map_unique_values(dates, _decode_sap_date)
+
+def format_sap_time_series(times):
+    """
+    Convert a column of SAP times to readable times.
+    
+    Args:
+        times (Series): Times in SAP format
+        
+    Returns:
+        Series: Formatted time strings, as format_sap_time returns them
+    """
+    return map_unique_values(times, _decode_sap_time)
+
+def format_sap_datetime_series(dates, times):
+    """
+    Combine and format columns of SAP dates and times.
+    
+    Args:
+        dates (Series): Dates in SAP format
+        times (Series): Times in SAP format, aligned with dates
+        
+    Returns:
+        Series: Formatted strings, as format_sap_datetime returns them
+    """
+    return map_unique_pairs(dates, times, format_sap_datetime)
+
+def format_validity_period_series(from_dates, to_dates):
+    """
+    Format columns of validity periods from from/to dates.
+    
+    Args:
+        from_dates (Series): Start dates in SAP format
+        to_dates (Series): End dates in SAP format, aligned with from_dates
+        
+    Returns:
+        Series: Formatted periods, as format_validity_period returns them
+    """
+    return map_unique_pairs(from_dates, to_dates, format_validity_period)
+
+def format_user_type_series(type_codes):
+    """
+    Convert a column of SAP user type codes to descriptive text.
+    
+    Args:
+        type_codes (Series): SAP user type codes
+        
+    Returns:
+        Series: Descriptive user types, as format_user_type returns them
+    """
+    return map_unique_values(type_codes, format_user_type)
+
+def format_boolean_flag_series(flags):
+    """
+    Format a column of SAP boolean flags (X) to Yes/No.
+    
+    Args:
+        flags (Series): SAP boolean flags
+        
+    Returns:
+        Series: "Yes"/"No" values, as format_boolean_flag returns them
+    """
+    return map_unique_values(flags, format_boolean_flag)
+
+def decode_sap_date_series(dates):
+    """
+    Convert a column of SAP dates to datetime64 values.
+    
+    Args:
+        dates (Series): Dates in SAP format
+        
+    Returns:
+        Series: datetime64 values, NaT where format_sap_date does not
+            return a formatted date
+    """
+    return pd.to_datetime(map_unique_values(dates, _parse_sap_date))
+
+def decode_sap_datetime_series(dates, times):
+    """
+    Convert columns of SAP dates and times to datetime64 values.
+    
+    A missing or invalid time gives the start of the day.
+    
+    Args:
+        dates (Series): Dates in SAP format
+        times (Series): Times in SAP format, aligned with dates
+        
+    Returns:
+        Series: datetime64 values, NaT where the date is not valid
+    """
+    days = decode_sap_date_series(dates)
+    offsets = pd.to_timedelta(map_unique_values(times, _parse_sap_time)).set_axis(days.index)
+    return days + offsets.fillna(pd.Timedelta(0))
+
+def map_unique_values(values, func):
+    """
+    Apply an element function once per distinct value of a column and map
+    the results back to every row.
+    
+    Args:
+        values (Series): Column values (missing values are passed to func too)
+        func (callable): Function of one value
+        
+    Returns:
+        Series: func applied to each value, with the index of values
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    decoded = np.empty(len(uniques), dtype=object)
+    for i, value in enumerate(uniques):
+        decoded[i] = func(value)
+    return pd.Series(decoded.take(codes), index=values.index, dtype=object)
+
+def map_unique_pairs(first, second, func):
+    """
+    Apply a function of two values once per distinct pair of aligned column
+    values and map the results back to every row.
+    
+    Args:
+        first (Series): First column
+        second (Series): Second column, aligned with first
+        func (callable): Function of two values
+        
+    Returns:
+        Series: func applied to each pair, with the index of first
+    """
+    first = first if isinstance(first, pd.Series) else pd.Series(first)
+    first_codes, first_uniques = pd.factorize(first, use_na_sentinel=False)
+    second_codes, second_uniques = pd.factorize(second, use_na_sentinel=False)
+    pair_codes, pairs = pd.factorize(
+        first_codes.astype(np.int64) * len(second_uniques) + second_codes
+    )
+    decoded = np.empty(len(pairs), dtype=object)
+    for i, pair in enumerate(pairs):
+        decoded[i] = func(first_uniques[pair // len(second_uniques)], second_uniques[pair % len(second_uniques)])
+    return pd.Series(decoded.take(pair_codes), index=first.index, dtype=object)
+
+def _decode_sap_date(date_str):
+    """
+    Convert one SAP date (YYYYMMDD) to readable date format.
+    
+    Args:
+        date_str: Date string in SAP format
+        
+    Returns:
+        str: Formatted date string or "Not available" if invalid
+    """
+    date_obj, text = _parse_sap_value(date_str, 8, False, CONFIG['sap_date_format'])
+    if date_obj is None:
+        return text
+    return date_obj.strftime(CONFIG['output_date_format'])
+
+def _decode_sap_time(time_str):
+    """
+    Convert one SAP time (HHMMSS) to readable time format.
+    
+    Args:
+        time_str: Time string in SAP format
+        
+    Returns:
+        str: Formatted time string or "Not available" if invalid
+    """
+    time_obj, text = _parse_sap_value(time_str, 6, True, CONFIG['sap_time_format'])
+    if time_obj is None:
+        return text
+    return time_obj.strftime(CONFIG['output_time_format'])
+
+def _parse_sap_date(date_str):
+    """
+    Convert one SAP date (YYYYMMDD) to a datetime.
+    
+    Args:
+        date_str: Date string in SAP format
+        
+    Returns:
+        datetime: Parsed date, or None where _decode_sap_date does not
+            return a formatted date
+    """
+    return _parse_sap_value(date_str, 8, False, CONFIG['sap_date_format'])[0]
+
+def _parse_sap_time(time_str):
+    """
+    Convert one SAP time (HHMMSS) to an offset from the start of the day.
+    
+    Args:
+        time_str: Time string in SAP format
+        
+    Returns:
+        Timedelta: Time of day, or None where _decode_sap_time does not
+            return a formatted time
+    """
+    time_obj = _parse_sap_value(time_str, 6, True, CONFIG['sap_time_format'])[0]
+    if time_obj is None:
+        return None
+    return pd.Timedelta(hours=time_obj.hour, minutes=time_obj.minute, seconds=time_obj.second)
+
+def _parse_sap_value(value, width, pad, sap_format):
+    """
+    Parse one SAP date or time value.
+    
+    Missing values and the SAP initial value (00000000, 000000) are not
+    available. The loader already types the initial value of its date and
+    time columns as missing; a raw 0 is formatted like any other number.
+    
+    Args:
+        value: Value in SAP format (string, number or missing)
+        width (int): Number of digits of the SAP format
+        pad (bool): Left-pad shorter numbers with zeros (times)
+        sap_format (str): strptime format of the SAP value
+        
+    Returns:
+        tuple: (datetime, None) for a valid value, or (None, text) where text
+            is "Not available" or the unparsed value, as displayed
+    """
+    if pd.isna(value) or str(value).strip() in ['', 'nan', '0' * width]:
+        return None, "Not available"
     
     try:
         # Remove decimals and convert to string
-        time_str = str(int(float(time_str))).zfill(6)
-        
-        # Format time if it's a valid 6-digit string
-        if len(time_str) == 6:
-            time_obj = datetime.strptime(time_str, CONFIG['sap_time_format'])
-            return time_obj.strftime(CONFIG['output_time_format'])
-        return time_str
+        number = int(float(value))
     except (ValueError, TypeError):
         # If conversion fails, return as is
-        return str(time_str)
+        return None, str(value)
+    
+    digits = str(number).zfill(width) if pad else str(number)
+    if len(digits) != width:
+        return None, digits
+    try:
+        return datetime.strptime(digits, sap_format), None
+    except ValueError:
+        return None, digits
 
 def format_sap_datetime(date_str, time_str):
     """
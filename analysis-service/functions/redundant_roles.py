@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Redundant roles module for the SAP User Analysis Tool
+
+This module compares the active user populations of the roles (AGR_USERS)
+with each other:
+- identical roles are assigned to exactly the same users; the user sets of
+  all roles are hashed in one pass (see role_mining.hash_sets), so equal
+  sets are found without comparing roles pairwise;
+- subsumed roles are assigned to a strict subset of the users of another
+  role. A superset of a role holds every user of it, in particular its
+  user with the fewest roles, so the only candidates of a role are the
+  other roles of that user. Candidates are checked by looking the users of
+  the smaller role up in the sorted (role, user) pairs of the larger one.
+"""
+
+import numpy as np
+from functions.role_mining import hash_sets
+from config import CONFIG
+
+
+def analyze_redundant_roles(role_analysis, config=None):
+    """
+    Find roles with the same active users as other roles, or a subset of them.
+
+    Args:
+        role_analysis (dict): Role analysis results, with the encoded
+            assignments
+        config (dict): Configuration settings (defaults to CONFIG)
+
+    Returns:
+        dict: Dictionary with the number of roles with active users
+            ('role_count'), the 'identical_groups' (roles sharing the same
+            users, with their 'user_count'), the number of roles that
+            duplicate another one ('identical_roles'), the 'subsets' (a
+            role, its superset_role and their user counts; identical roles
+            are represented by the first of their group) and their
+            'subset_count'
+    """
+    print("\n======= ANALYZE REDUNDANT ROLES FUNCTION STARTED =======")
+    config = config or CONFIG
+    min_users = config.get('redundant_roles_min_users', 1)
+    max_results = config.get('redundant_roles_max_results')
+    encoding = role_analysis['encoding']
+
+    # Distinct active (role, user) pairs, sorted by role then user
+    user_ids = role_analysis['assignment_user_ids']
+    role_ids = role_analysis['assignment_role_ids']
+    kept = role_analysis['assignment_active'] & (user_ids >= 0) & (role_ids >= 0)
+    user_count = max(encoding.user_count, 1)
+    pair_keys = np.unique(role_ids[kept].astype(np.int64) * user_count + user_ids[kept])
+    pair_roles = pair_keys // user_count
+    pair_users = pair_keys % user_count
+    roles, role_starts = np.unique(pair_roles, return_index=True)
+    role_sizes = np.diff(np.append(role_starts, len(pair_keys)))
+    # Same keys with roles numbered by position, still sorted
+    pair_keys = np.repeat(np.arange(len(roles), dtype=np.int64), role_sizes) * user_count + pair_users
+
+    # Roles with the same users share a code; the first role represents them
+    set_codes = hash_sets(pair_users, role_starts, user_count)
+    set_sizes = np.bincount(set_codes)
+    representatives = np.unique(set_codes, return_index=True)[1]
+
+    identical_groups = []
+    for code in np.flatnonzero(set_sizes >= 2).tolist():
+        size = int(role_sizes[representatives[code]])
+        if size >= min_users:
+            identical_groups.append({
+                'roles': [str(encoding.roles[role]) for role in roles[set_codes == code].tolist()],
+                'user_count': size
+            })
+    identical_groups.sort(key=lambda group: (-len(group['roles']), -group['user_count']))
+    print(f"{len(roles)} roles with active users, {len(identical_groups)} groups of identical roles")
+
+    subsets, supersets = _find_subsets(
+        representatives[role_sizes[representatives] >= min_users], representatives,
+        set_codes, role_starts, role_sizes, pair_keys, pair_users, user_count
+    )
+    order = np.lexsort((supersets, subsets, -role_sizes[subsets]))
+    subsets, supersets = subsets[order], supersets[order]
+    print(f"Found {len(subsets)} subset relationships")
+
+    print("======= ANALYZE REDUNDANT ROLES FUNCTION COMPLETED =======\n")
+
+    return {
+        'role_count': len(roles),
+        'identical_groups': identical_groups[:max_results],
+        'identical_roles': sum(len(group['roles']) - 1 for group in identical_groups),
+        'subset_count': len(subsets),
+        'subsets': [
+            {
+                'role': str(encoding.roles[roles[subset]]),
+                'user_count': int(role_sizes[subset]),
+                'superset_role': str(encoding.roles[roles[superset]]),
+                'superset_user_count': int(role_sizes[superset])
+            }
+            for subset, superset in zip(subsets[:max_results].tolist(), supersets[:max_results].tolist())
+        ]
+    }
+
+
+def _find_subsets(candidates, representatives, set_codes, role_starts, role_sizes,
+                  pair_keys, pair_users, user_count):
+    """
+    Find the roles whose users are a strict subset of another role's users.
+
+    Args:
+        candidates (ndarray): Roles (positions in role_starts) whose
+            supersets are sought
+        representatives (ndarray): Role representing each distinct user set
+        set_codes (ndarray): User set code of each role
+        role_starts (ndarray): Start of each role in the pairs
+        role_sizes (ndarray): Number of users of each role
+        pair_keys (ndarray): Sorted role * user_count + user keys of the
+            active pairs, roles being positions in role_starts
+        pair_users (ndarray): User of each pair
+        user_count (int): Number of user IDs
+
+    Returns:
+        tuple: (subset, superset) arrays of role positions
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if not len(candidates):
+        return empty, empty
+
+    # Pairs by user, to list the roles of a user
+    pair_roles = np.repeat(np.arange(len(role_starts)), role_sizes)
+    by_user = np.argsort(pair_users, kind='stable')
+    user_roles = pair_roles[by_user]
+    user_bounds = np.searchsorted(pair_users[by_user], np.arange(user_count + 1))
+    degrees = np.diff(user_bounds)
+
+    # User of each role holding the fewest roles
+    rarest = np.minimum.reduceat(degrees[pair_users].astype(np.int64) * user_count + pair_users, role_starts) % user_count
+    rarest = rarest[candidates]
+
+    # Candidate supersets: larger distinct user sets holding that user
+    lengths = degrees[rarest]
+    positions = np.repeat(user_bounds[rarest] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    subsets = np.repeat(candidates, lengths)
+    supersets = user_roles[positions]
+    keep = (role_sizes[supersets] > role_sizes[subsets]) & (representatives[set_codes[supersets]] == supersets)
+    subsets, supersets = subsets[keep], supersets[keep]
+    if not len(subsets):
+        return empty, empty
+
+    # Every user of the subset must be a user of the superset
+    sizes = role_sizes[subsets]
+    offsets = np.repeat(role_starts[subsets] - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+    keys = np.repeat(supersets.astype(np.int64), sizes) * user_count + pair_users[offsets]
+    found = np.searchsorted(pair_keys, keys)
+    found[found == len(pair_keys)] = 0
+    present = pair_keys[found] == keys
+    contained = np.bincount(np.repeat(np.arange(len(subsets)), sizes)[present], minlength=len(subsets)) == sizes
+    return subsets[contained], supersets[contained]
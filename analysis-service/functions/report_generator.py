@@ -8,9 +8,16 @@ suitable for API consumption by a frontend application.
 
 import json
 from datetime import datetime
+from functions.auth_analyzer import AuthorizationRecords
+from functions.risk_scorer import get_risk_features, score_users
+from functions.critical_access import analyze_critical_access
+from functions.user_index import UserIndex
 from config import CONFIG
 
-def generate_report(user_analysis, role_analysis, auth_analysis, config):
+# Fields of each entry of the report users array, besides client and username
+USER_REPORT_FIELDS = ['details', 'roles', 'authorizations', 'risk_score']
+
+def generate_report(user_analysis, role_analysis, auth_analysis, config, user_fields=None, critical_access=None):
     """
     Generate a structured data report based on analysis results.
     
@@ -19,12 +26,19 @@ def generate_report(user_analysis, role_analysis, auth_analysis, config):
         role_analysis (dict): Role analysis results
         auth_analysis (dict): Authorization analysis results
         config (dict): Configuration settings
+        user_fields (list): Fields emitted for each user among
+            USER_REPORT_FIELDS, or None for config['user_report_fields']
+        critical_access (dict): Critical access results, as returned by
+            analyze_critical_access (evaluated here when None)
         
     Returns:
         dict: API-ready structured data
     """
     # Create user data in expected format
-    users = _prepare_user_data(user_analysis, role_analysis, auth_analysis, config)
+    users = _prepare_user_data(user_analysis, role_analysis, auth_analysis, config, user_fields)
+    
+    if critical_access is None:
+        critical_access = analyze_critical_access(auth_analysis, config=config)
     
     # Log detailed information about available data
     print(f"\n======= GENERATE REPORT FUNCTION DEBUG INFO =======")
@@ -43,8 +57,9 @@ def generate_report(user_analysis, role_analysis, auth_analysis, config):
             "role_count": role_analysis['stats']['total_roles'],
             "auth_object_count": auth_analysis['stats']['total_auth_objects']
         },
-        "summary": _generate_summary(user_analysis, role_analysis, auth_analysis),
+        "summary": _generate_summary(user_analysis, role_analysis, auth_analysis, critical_access),
         "users": users,  # This is the key change - putting users at the top level
+        "critical_access": critical_access,
         
         # Also include the original user_analysis for backward compatibility
         "user_analysis": user_analysis
@@ -76,7 +91,7 @@ def output_report(report_data, config):
         print(f"API data saved to {config['output_file']}")
         return None
 
-def _generate_summary(user_analysis, role_analysis, auth_analysis):
+def _generate_summary(user_analysis, role_analysis, auth_analysis, critical_access):
     """
     Generate a summary of the analysis results.
     
@@ -84,6 +99,7 @@ def _generate_summary(user_analysis, role_analysis, auth_analysis):
         user_analysis (dict): User analysis results
         role_analysis (dict): Role analysis results
         auth_analysis (dict): Authorization analysis results
+        critical_access (dict): Critical access results
         
     Returns:
         dict: Summary data in API-friendly format
@@ -189,21 +205,29 @@ def _generate_summary(user_analysis, role_analysis, auth_analysis):
         "security_insights": _generate_security_insights(
             user_analysis, 
             role_analysis, 
-            auth_analysis
+            auth_analysis,
+            critical_access
         )
     }
     
     return summary
 
-def _prepare_user_data(user_analysis, role_analysis, auth_analysis, config):
+def _prepare_user_data(user_analysis, role_analysis, auth_analysis, config, fields=None):
     """
     Prepare user data for API consumption.
     
+    Role assignments and authorizations are grouped by (client, username)
+    once, through the user indexes built by the analyzers, and attached to
+    each user with a lookup.
+    
     Args:
         user_analysis (dict): User analysis results
         role_analysis (dict): Role analysis results
         auth_analysis (dict): Authorization analysis results
         config (dict): Configuration settings
+        fields (list): User fields to emit among USER_REPORT_FIELDS (client
+            and username are always emitted). None uses
+            config['user_report_fields'], which defaults to all fields.
         
     Returns:
         list: List of user data objects
@@ -211,17 +235,41 @@ def _prepare_user_data(user_analysis, role_analysis, auth_analysis, config):
     if not config['include_user_details']:
         return []
     
+    if fields is None:
+        fields = config.get('user_report_fields') or USER_REPORT_FIELDS
+    unknown = [field for field in fields if field not in USER_REPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown user report fields: {', '.join(unknown)}")
+    
+    needs_roles = 'roles' in fields
+    needs_auths = 'authorizations' in fields
+    
+    if needs_roles:
+        role_assignments = role_analysis['role_assignments']
+        role_index = role_analysis.get('user_index')
+        if role_index is None:
+            role_index = _index_rows(role_assignments)
+    if needs_auths:
+        auth_columns = _authorization_columns(auth_analysis['authorizations'])
+        auth_index = auth_analysis.get('user_index')
+        if auth_index is None:
+            auth_index = _index_rows(auth_analysis['authorizations'])
+    
+    # Score the whole population at once
+    if 'risk_score' in fields:
+        risk_scores = score_users(get_risk_features(user_analysis, auth_analysis, config), config)['risk_score'].tolist()
+    
     users_data = []
     
-    for user_data in user_analysis['users']:
+    for user_position, user_data in enumerate(user_analysis['users']):
         client = user_data['client']
         username = user_data['username']
         
         # Get user's roles
         user_roles = []
-        for role_assignment in role_analysis['role_assignments']:
-            if (role_assignment['client'] == client and 
-                role_assignment['username'] == username):
+        if needs_roles:
+            for position in role_index.positions(client, username):
+                role_assignment = role_assignments[position]
                 user_roles.append({
                     "name": role_assignment['role_name'],
                     "from_date": role_assignment['from_date'],
@@ -230,34 +278,27 @@ def _prepare_user_data(user_analysis, role_analysis, auth_analysis, config):
                     "is_excluded": role_assignment['excluded'] == 'Yes'
                 })
         
-        # Get user's authorizations
+        # Get user's authorizations, grouped by object
         user_auths = {}
-        for auth in auth_analysis['authorizations']:
-            if auth['client'] == client and auth['username'] == username:
-                object_name = auth['object']
+        if needs_auths:
+            for position in auth_index.positions(client, username).tolist():
+                object_name = auth_columns['object'][position]
                 if object_name not in user_auths:
                     user_auths[object_name] = []
                 user_auths[object_name].append({
-                    "field": auth['field'],
-                    "from_value": auth['from_value'],
-                    "to_value": auth['to_value'],
-                    "is_wildcard": auth['is_wildcard']
+                    "field": auth_columns['field'][position],
+                    "from_value": auth_columns['from_value'][position],
+                    "to_value": auth_columns['to_value'][position],
+                    "is_wildcard": auth_columns['is_wildcard'][position]
                 })
         
-        # Convert auth dict to list for API
-        auth_list = [
-            {
-                "object": obj_name,
-                "authorizations": auth_details
-            }
-            for obj_name, auth_details in user_auths.items()
-        ]
-        
         # Create user object for API
         user_api_data = {
             "client": client,
-            "username": username,
-            "details": {
+            "username": username
+        }
+        if 'details' in fields:
+            user_api_data["details"] = {
                 "user_type": user_data['user_type'],
                 "is_locked": user_data['locked'] == 'Yes',
                 "has_initial_password": user_data['initial_password'] == 'Yes',
@@ -271,17 +312,55 @@ def _prepare_user_data(user_analysis, role_analysis, auth_analysis, config):
                     "first_login": user_data['activity']['first_login'],
                     "last_password_change": user_data['activity']['last_password_change']
                 }
-            },
-            "roles": user_roles,
-            "authorizations": auth_list,
-            "risk_score": _calculate_user_risk_score(user_data, user_roles, user_auths)
-        }
+            }
+        if 'roles' in fields:
+            user_api_data["roles"] = user_roles
+        if 'authorizations' in fields:
+            # Convert auth dict to list for API
+            user_api_data["authorizations"] = [
+                {
+                    "object": obj_name,
+                    "authorizations": auth_details
+                }
+                for obj_name, auth_details in user_auths.items()
+            ]
+        if 'risk_score' in fields:
+            user_api_data["risk_score"] = risk_scores[user_position]
         
         users_data.append(user_api_data)
     
     return users_data
 
-def _generate_security_insights(user_analysis, role_analysis, auth_analysis):
+def _index_rows(rows):
+    """
+    Index result rows (role assignments or authorizations) by user.
+    
+    Args:
+        rows (Sequence): Dictionaries with 'client' and 'username' keys
+        
+    Returns:
+        UserIndex: Positions of each user's rows
+    """
+    if isinstance(rows, AuthorizationRecords):
+        return UserIndex(rows.columns['client'], rows.columns['username'])
+    return UserIndex([row['client'] for row in rows], [row['username'] for row in rows])
+
+def _authorization_columns(authorizations):
+    """
+    Get the authorization fields used in the user report as Python lists.
+    
+    Args:
+        authorizations (Sequence): Authorization records
+        
+    Returns:
+        dict: One list per field, indexed by record position
+    """
+    names = ['object', 'field', 'from_value', 'to_value', 'is_wildcard']
+    if isinstance(authorizations, AuthorizationRecords):
+        return {name: authorizations.columns[name].tolist() for name in names}
+    return {name: [auth[name] for auth in authorizations] for name in names}
+
+def _generate_security_insights(user_analysis, role_analysis, auth_analysis, critical_access):
     """
     Generate security insights based on the analysis results.
     
@@ -289,6 +368,7 @@ def _generate_security_insights(user_analysis, role_analysis, auth_analysis):
         user_analysis (dict): User analysis results
         role_analysis (dict): Role analysis results
         auth_analysis (dict): Authorization analysis results
+        critical_access (dict): Critical access results
         
     Returns:
         list: List of security insights
@@ -325,17 +405,18 @@ def _generate_security_insights(user_analysis, role_analysis, auth_analysis):
             "impact": "medium"
         })
     
-    # Check for users with critical authorizations
-    critical_auth_objects = ["S_ADMI_FCD", "SAP_ALL", "S_DEVELOP"]
-    users_with_critical_auth = _count_users_with_critical_auth(
-        auth_analysis, critical_auth_objects
-    )
+    # Check for users matching critical access rules
+    users_with_critical_auth = critical_access['user_count']
     
     if users_with_critical_auth > 0:
+        matched_rules = sorted(critical_access['rules'], key=lambda rule: rule['user_count'], reverse=True)
+        rule_ids = [rule['rule_id'] for rule in matched_rules[:5]]
+        if len(matched_rules) > 5:
+            rule_ids.append(f"{len(matched_rules) - 5} more")
         insights.append({
             "type": "alert",
             "category": "security",
-            "message": f"There are {users_with_critical_auth} users with critical authorizations (S_ADMI_FCD, SAP_ALL, S_DEVELOP).",
+            "message": f"There are {users_with_critical_auth} users with critical authorizations ({', '.join(rule_ids)}).",
             "impact": "high"
         })
     
@@ -355,26 +436,6 @@ def _generate_security_insights(user_analysis, role_analysis, auth_analysis):
     
     return insights
 
-def _count_users_with_critical_auth(auth_analysis, critical_objects):
-    """
-    Count users with critical authorizations.
-    
-    Args:
-        auth_analysis (dict): Authorization analysis results
-        critical_objects (list): List of critical authorization objects
-        
-    Returns:
-        int: Count of users with critical authorizations
-    """
-    users_with_critical = set()
-    
-    for auth in auth_analysis['authorizations']:
-        if auth['object'] in critical_objects:
-            user_key = f"{auth['client']}:{auth['username']}"
-            users_with_critical.add(user_key)
-    
-    return len(users_with_critical)
-
 def _count_users_with_many_roles(role_analysis, max_roles):
     """
     Count users with more than the maximum recommended roles.
@@ -393,52 +454,3 @@ def _count_users_with_many_roles(role_analysis, max_roles):
             count += 1
     
     return count
-
-def _calculate_user_risk_score(user_data, user_roles, user_auths):
-    """
-    Calculate a security risk score for a user based on various factors.
-    
-    Args:
-        user_data (dict): User master data
-        user_roles (list): User role assignments
-        user_auths (dict): User authorizations
-        
-    Returns:
-        int: Risk score (0-100, higher is more risky)
-    """
-    score = 0
-    
-    # Base score based on user type
-    if user_data['user_type'] == 'Dialog User':
-        score += 10
-    elif user_data['user_type'] == 'System User':
-        score += 20
-    elif user_data['user_type'] == 'Communication User':
-        score += 15
-    
-    # Initial password is a risk
-    if user_data['initial_password'] == 'Yes':
-        score += 25
-    
-    # Account expired but not locked is a risk
-    if user_data['validity']['is_expired'] and user_data['locked'] == 'No':
-        score += 15
-    
-    # Add points for each critical authorization
-    critical_auths = ['S_ADMI_FCD', 'SAP_ALL', 'S_DEVELOP']
-    for obj in critical_auths:
-        if obj in user_auths:
-            score += 20
-    
-    # Add points for wildcards in authorizations
-    wildcard_count = 0
-    for obj_auths in user_auths.values():
-        for auth in obj_auths:
-            if 'is_wildcard' in auth and auth['is_wildcard']:
-                wildcard_count += 1
-    
-    # Cap wildcard penalty at 20
-    score += min(wildcard_count * 2, 20)
-    
-    # Cap at 100
-    return min(score, 100)
\ No newline at end of file
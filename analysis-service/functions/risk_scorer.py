@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Risk scorer module for the SAP User Analysis Tool
+
+This module computes the security risk score of every user at once. The
+risk features of the population are gathered in one DataFrame (one row per
+user), then each factor is weighted with array arithmetic using the
+weights of CONFIG['risk_weights'].
+
+When AGR_1251 was loaded, the authorizations users hold through their
+roles (see functions.effective_auth) count like their USR12 ones.
+"""
+
+import numpy as np
+import pandas as pd
+from functions.auth_analyzer import AuthorizationRecords
+from functions.user_analyzer import UserRecords
+from functions.user_index import factorize_users
+from functions.effective_auth import EFFECTIVE_AUTH_KEY
+from config import CONFIG
+
+# Factor contributions returned by score_users, in order
+RISK_FACTORS = ['user_type', 'initial_password', 'expired_unlocked', 'critical_objects', 'wildcards']
+
+
+def get_risk_features(user_analysis, auth_analysis, config=None):
+    """
+    Gather the risk features of every user.
+
+    The features are computed from the user columns kept by analyze_users
+    and the encoded user and object IDs of the authorization records, with
+    one pass over the records for all the critical objects.
+
+    Args:
+        user_analysis (dict): User analysis results
+        auth_analysis (dict): Authorization analysis results
+        config (dict): Configuration settings (defaults to CONFIG)
+
+    Returns:
+        DataFrame: One row per user of user_analysis['users'], in order, with
+            client, username, user_type, initial_password, expired_unlocked,
+            critical_objects (number of distinct critical objects held) and
+            wildcard_count columns
+    """
+    config = config or CONFIG
+    columns = _user_columns(user_analysis['users'])
+
+    features = pd.DataFrame({
+        'client': columns['client'],
+        'username': columns['username'],
+        'user_type': columns['user_type'],
+        'initial_password': columns['initial_password'].to_numpy(dtype=bool),
+        'expired_unlocked': (
+            columns['is_expired'].to_numpy(dtype=bool) & ~columns['locked'].to_numpy(dtype=bool)
+        )
+    })
+
+    # Critical objects are numbered in the order of the configuration; an
+    # object listed twice counts twice
+    listed = pd.Series(config['critical_auth_objects'], dtype=object).value_counts(sort=False)
+    critical_objects = listed.index
+    record_users, record_objects, objects, feature_users, user_count = _authorization_ids(
+        auth_analysis, features['client'], features['username']
+    )
+    known = feature_users >= 0
+    # Critical object number of each object ID; the extra -1 maps records without an object
+    critical_codes = np.append(critical_objects.get_indexer(pd.Index(objects, dtype=object)), -1)
+    record_critical = critical_codes[record_objects]
+
+    wildcards = _is_wildcard(auth_analysis['authorizations'])
+    wildcard_counts = np.bincount(record_users[wildcards], minlength=user_count)
+    wildcard_count = np.zeros(len(features), dtype=np.int64)
+    wildcard_count[known] = wildcard_counts[feature_users[known]]
+
+    holds = np.zeros((user_count, len(critical_objects)), dtype=bool)
+    critical = record_critical >= 0
+    holds[record_users[critical], record_critical[critical]] = True
+    held = np.zeros((len(features), len(critical_objects)), dtype=bool)
+    held[known] = holds[feature_users[known]]
+
+    # Encoding IDs of the users, to add the authorizations of their roles
+    effective = auth_analysis.get(EFFECTIVE_AUTH_KEY)
+    if effective is not None:
+        effective_ids = effective.user_ids_of(features['client'], features['username'])
+        has_id = effective_ids >= 0
+        role_wildcards = effective.user_totals(
+            effective.role_row_counts(effective.records.columns['is_wildcard'].to_numpy(dtype=bool))
+        )
+        wildcard_count[has_id] += role_wildcards[effective_ids[has_id]].astype(np.int64)
+
+        row_critical = critical_objects.get_indexer(effective.records.columns['object'].astype(object))
+        granted = row_critical >= 0
+        role_holds = np.zeros((effective.role_count, len(critical_objects)), dtype=bool)
+        role_holds[effective.row_roles[granted], row_critical[granted]] = True
+        held[has_id] |= effective.user_any(role_holds)[effective_ids[has_id]]
+
+    features['wildcard_count'] = wildcard_count
+    features['critical_objects'] = held.astype(np.int64) @ listed.to_numpy(dtype=np.int64)
+
+    return features
+
+
+def score_users(features, config=None):
+    """
+    Compute the risk score of every user from its risk features.
+
+    Args:
+        features (DataFrame): Risk features, as returned by get_risk_features
+        config (dict): Configuration settings (defaults to CONFIG)
+
+    Returns:
+        DataFrame: One row per feature row with the contribution of each
+            factor of RISK_FACTORS and the capped risk_score (0-100, higher
+            is more risky)
+    """
+    config = config or CONFIG
+    weights = config['risk_weights']
+
+    contributions = pd.DataFrame({
+        'user_type': features['user_type'].map(weights['user_type']).fillna(0).to_numpy(dtype=np.int64),
+        'initial_password': features['initial_password'].to_numpy(dtype=np.int64) * weights['initial_password'],
+        'expired_unlocked': features['expired_unlocked'].to_numpy(dtype=np.int64) * weights['expired_unlocked'],
+        'critical_objects': features['critical_objects'].to_numpy(dtype=np.int64) * weights['critical_object'],
+        'wildcards': np.minimum(
+            features['wildcard_count'].to_numpy(dtype=np.int64) * weights['wildcard'],
+            weights['wildcard_cap']
+        )
+    }, index=features.index)
+
+    contributions['risk_score'] = np.minimum(
+        contributions[RISK_FACTORS].to_numpy().sum(axis=1),
+        weights['max_score']
+    )
+
+    return contributions
+
+
+def _user_columns(users):
+    """
+    Get the user fields used for scoring as Series.
+
+    Args:
+        users (list): User dictionaries, a UserRecords from analyze_users
+            or a plain list
+
+    Returns:
+        dict: client, username, user_type, initial_password, locked and
+            is_expired Series
+    """
+    if isinstance(users, UserRecords):
+        return users.columns
+    return {
+        'client': pd.Series([user['client'] for user in users], dtype=object),
+        'username': pd.Series([user['username'] for user in users], dtype=object),
+        'user_type': pd.Series([user['user_type'] for user in users], dtype=object),
+        'initial_password': pd.Series([user['initial_password'] == 'Yes' for user in users], dtype=bool),
+        'locked': pd.Series([user['locked'] != 'No' for user in users], dtype=bool),
+        'is_expired': pd.Series([bool(user['validity']['is_expired']) for user in users], dtype=bool)
+    }
+
+
+def _authorization_ids(auth_analysis, clients, usernames):
+    """
+    Get integer user and object IDs of the authorization records and of users.
+
+    Encoded records (see functions.encoding) use the IDs of the analysis
+    encoding; other records are factorized together with the users.
+
+    Args:
+        auth_analysis (dict): Authorization analysis results
+        clients (Series): Client of each user
+        usernames (Series): Username of each user
+
+    Returns:
+        tuple: (user ID of each record, object ID of each record (-1 for no
+            object), object name of each object ID, user ID of each user
+            (-1 for users without records), number of user IDs)
+    """
+    authorizations = auth_analysis['authorizations']
+    encoding = auth_analysis.get('encoding')
+    if (
+        isinstance(authorizations, AuthorizationRecords)
+        and authorizations.user_ids is not None
+        and encoding is not None
+    ):
+        return (
+            authorizations.user_ids.astype(np.int64),
+            authorizations.object_ids.astype(np.int64),
+            encoding.objects,
+            encoding.user_ids_of(clients, usernames),
+            encoding.user_count
+        )
+
+    records = _authorization_columns(authorizations)
+    codes, uniques = factorize_users(
+        pd.concat([records['client'].astype(object), clients.astype(object)], ignore_index=True),
+        pd.concat([records['username'].astype(object), usernames.astype(object)], ignore_index=True)
+    )
+    object_codes, objects = pd.factorize(records['object'].astype(object))
+    return (
+        codes[:len(records['client'])].astype(np.int64),
+        object_codes.astype(np.int64),
+        list(objects),
+        codes[len(records['client']):].astype(np.int64),
+        len(uniques)
+    )
+
+
+def _is_wildcard(authorizations):
+    """
+    Get the is_wildcard flag of each authorization record.
+
+    Args:
+        authorizations (Sequence): Authorization records
+
+    Returns:
+        ndarray: Boolean flag of each record
+    """
+    return _authorization_columns(authorizations)['is_wildcard'].fillna(False).to_numpy(dtype=bool)
+
+
+def _authorization_columns(authorizations):
+    """
+    Get the authorization fields used for scoring as Series.
+
+    Args:
+        authorizations (Sequence): Authorization records
+
+    Returns:
+        dict: client, username, object and is_wildcard Series
+    """
+    names = ['client', 'username', 'object', 'is_wildcard']
+    if isinstance(authorizations, AuthorizationRecords):
+        return {name: authorizations.columns[name].reset_index(drop=True) for name in names}
+    return {name: pd.Series([auth[name] for auth in authorizations], dtype=object) for name in names}
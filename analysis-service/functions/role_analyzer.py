@@ -6,8 +6,16 @@ This module analyzes role assignment data from the AGR_USERS table.
 """
 
 from datetime import datetime
+import numpy as np
 import pandas as pd
-from functions.formatters import format_sap_date, format_validity_period
+from functions.formatters import (
+    format_sap_date_series,
+    format_validity_period_series,
+    map_unique_values
+)
+from functions.user_index import UserIndex
+from functions.encoding import get_encoding
+from functions.role_hierarchy import COMPOSITE_FIELD
 from config import CONFIG, SAP_MANDT_FIELD, SAP_ROLE_USER_FIELD
 import re
 
@@ -71,98 +79,131 @@ def analyze_roles(data):
     # Get current date for comparison
     today = datetime.now().strftime(CONFIG['sap_date_format'])
     
-    # Get unique roles
-    unique_roles = data['agr_users_df']['AGR_NAME'].unique()
+    agr_users_df = data['agr_users_df']
+    encoding = get_encoding(data)
+    role_analysis['encoding'] = encoding
+    
+    # Get unique roles, in order of first appearance
+    role_codes, unique_roles = encoding.role_ids, encoding.roles
     role_analysis['stats']['total_roles'] = len(unique_roles)
     
     print(f"Found {len(unique_roles)} unique roles")
     
-    # Process each role assignment
-    assignment_count = 0
-    for index, assignment in data['agr_users_df'].iterrows():
-        try:
-            # Get key fields with error handling
-            if SAP_MANDT_FIELD not in assignment:
-                print(f"Warning: MANDT field ({SAP_MANDT_FIELD}) not found for assignment at index {index}")
-                client = "000"  # Default client as fallback
-            else:
-                client = assignment[SAP_MANDT_FIELD]
-            
-            if SAP_ROLE_USER_FIELD not in assignment:
-                print(f"Error: Username field ({SAP_ROLE_USER_FIELD}) not found for assignment at index {index}")
-                continue  # Skip this assignment
-            
-            username = assignment[SAP_ROLE_USER_FIELD]
-            
-            if pd.isna(username) or str(username).strip() == '':
-                print(f"Warning: Empty username at index {index}, skipping")
-                continue
-            
-            if 'AGR_NAME' not in assignment:
-                print(f"Error: Role name field not found for assignment at index {index}")
-                continue
-                
-            role_name = assignment['AGR_NAME']
-            from_date = assignment.get('FROM_DAT', '')
-            to_date = assignment.get('TO_DAT', '')
-            excluded = assignment.get('EXCLUDE', '') == 'X'
-            
-            print(f"Processing role assignment: User {username}, Role {role_name}")
-            
-            # Create role assignment data structure
-            role_assignment = {
-                'client': client,
-                'username': username,
-                'role_name': role_name,
-                'validity': format_validity_period(from_date, to_date),
-                'from_date': format_sap_date(from_date),
-                'to_date': format_sap_date(to_date),
-                'excluded': 'Yes' if excluded else 'No',
-                'is_expired': _is_date_expired(to_date, today),
-                'org_flag': assignment.get('ORG_FLAG', '')
-            }
-            
-            # Update statistics
-            role_analysis['stats']['total_assignments'] += 1
-            assignment_count += 1
-            
-            if role_assignment['is_expired']:
-                role_analysis['stats']['expired_assignments'] += 1
-                
-            if excluded:
-                role_analysis['stats']['excluded_assignments'] += 1
-                
-            # Track roles per user
-            user_key = f"{client}:{username}"
-            if user_key in role_analysis['stats']['roles_per_user']:
-                role_analysis['stats']['roles_per_user'][user_key] += 1
-            else:
-                role_analysis['stats']['roles_per_user'][user_key] = 1
-            
-            # Add role assignment to results
-            role_analysis['role_assignments'].append(role_assignment)
-            
-        except Exception as e:
-            print(f"Error processing role assignment at index {index}: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+    if SAP_ROLE_USER_FIELD not in agr_users_df.columns:
+        print(f"Error: Username field ({SAP_ROLE_USER_FIELD}) not found, no assignment can be processed")
+        return role_analysis
+    
+    if SAP_MANDT_FIELD in agr_users_df.columns:
+        clients = agr_users_df[SAP_MANDT_FIELD]
+    else:
+        print(f"Warning: MANDT field ({SAP_MANDT_FIELD}) not found, using default client 000")
+        clients = pd.Series('000', index=agr_users_df.index, dtype=object)
+    
+    def column(field):
+        if field in agr_users_df.columns:
+            return agr_users_df[field]
+        return pd.Series('', index=agr_users_df.index, dtype=object)
+    
+    # Expiry and exclusion masks, computed once for every assignment
+    usernames = agr_users_df[SAP_ROLE_USER_FIELD]
+    user_ids = encoding.user_ids['agr_users']
+    has_username = user_ids >= 0
+    excluded = (column('EXCLUDE') == 'X').to_numpy(dtype=bool)
+    expired = get_assignment_expired_series(column('TO_DAT'), today).to_numpy(dtype=bool)
+    from_dates = format_sap_date_series(column('FROM_DAT'))
+    to_dates = format_sap_date_series(column('TO_DAT'))
+    validity = format_validity_period_series(column('FROM_DAT'), column('TO_DAT'))
+    
+    client_values = clients.astype(object).to_numpy()
+    username_values = usernames.astype(object).to_numpy()
+    role_values = agr_users_df['AGR_NAME'].astype(object).to_numpy()
+    from_date_values = from_dates.to_numpy()
+    
+    skipped = int((~has_username).sum())
+    if skipped:
+        print(f"Warning: {skipped} assignments with an empty username skipped")
+    
+    # Process the role assignments with a username
+    kept = np.flatnonzero(has_username)
+    role_analysis['role_assignments'] = [
+        {
+            'client': client,
+            'username': username,
+            'role_name': role_name,
+            'validity': period,
+            'from_date': from_date,
+            'to_date': to_date,
+            'excluded': 'Yes' if is_excluded else 'No',
+            'is_expired': is_expired,
+            'org_flag': org_flag
+        }
+        for client, username, role_name, period, from_date, to_date, is_excluded, is_expired, org_flag in zip(
+            client_values[kept].tolist(),
+            username_values[kept].tolist(),
+            role_values[kept].tolist(),
+            validity.to_numpy()[kept].tolist(),
+            from_date_values[kept].tolist(),
+            to_dates.to_numpy()[kept].tolist(),
+            excluded[kept].tolist(),
+            expired[kept].tolist(),
+            column('ORG_FLAG').astype(object).to_numpy()[kept].tolist()
+        )
+    ]
+    assignment_count = len(kept)
+    
+    # Assignments granted by a composite role (see functions.role_hierarchy) name it
+    if COMPOSITE_FIELD in agr_users_df.columns:
+        composite_values = agr_users_df[COMPOSITE_FIELD].astype(object).to_numpy()[kept].tolist()
+        for assignment, composite in zip(role_analysis['role_assignments'], composite_values):
+            assignment['composite_role'] = composite or None
+    
+    # Index the assignments of each user for drill-downs
+    role_analysis['user_index'] = UserIndex.from_ids(user_ids[kept], encoding.user_keys)
+    
+    # Encoded assignments, for the analyzers joining on integer IDs
+    role_analysis['assignment_user_ids'] = user_ids[kept]
+    role_analysis['assignment_role_ids'] = role_codes[kept]
+    role_analysis['assignment_active'] = ~excluded[kept] & ~expired[kept]
+    
+    # Update statistics
+    role_analysis['stats']['total_assignments'] = assignment_count
+    role_analysis['stats']['expired_assignments'] = int(expired[kept].sum())
+    role_analysis['stats']['excluded_assignments'] = int(excluded[kept].sum())
+    
+    # Track roles per user, in order of first appearance
+    user_codes, assigned_ids = pd.factorize(user_ids[kept])
+    user_counts = np.bincount(user_codes, minlength=len(assigned_ids))
+    role_analysis['stats']['roles_per_user'] = {
+        user_key: int(count) for user_key, count in zip(encoding.user_labels(assigned_ids), user_counts)
+    }
     
     print(f"Processed {assignment_count} role assignments")
     
     # Calculate role frequency
-    role_counts = data['agr_users_df']['AGR_NAME'].value_counts().to_dict()
+    assignment_counts = np.bincount(role_codes[role_codes >= 0], minlength=len(unique_roles))
+    
+    # Active users per role, in assignment order, in a single pass
+    active = np.flatnonzero(~excluded & ~expired & (role_codes >= 0))
+    active = active[np.argsort(role_codes[active], kind='stable')]
+    bounds = np.searchsorted(role_codes[active], np.arange(len(unique_roles) + 1))
+    active_users = [
+        {'client': client, 'username': username, 'from_date': from_date}
+        for client, username, from_date in zip(
+            client_values[active].tolist(),
+            username_values[active].tolist(),
+            from_date_values[active].tolist()
+        )
+    ]
     
     # Add role data
-    for role_name in unique_roles:
-        try:
-            role_data = {
-                'role_name': role_name,
-                'assignment_count': role_counts.get(role_name, 0),
-                'users': _get_users_with_role(data['agr_users_df'], role_name)
-            }
-            role_analysis['roles'].append(role_data)
-        except Exception as e:
-            print(f"Error processing role data for {role_name}: {str(e)}")
+    role_analysis['roles'] = [
+        {
+            'role_name': role_name,
+            'assignment_count': int(assignment_counts[code]),
+            'users': active_users[bounds[code]:bounds[code + 1]]
+        }
+        for code, role_name in enumerate(unique_roles)
+    ]
     
     # Sort roles by assignment count
     role_analysis['roles'] = sorted(
@@ -195,9 +236,14 @@ def get_user_roles(role_data, client, username):
     Returns:
         list: List of role assignments for the user
     """
+    role_assignments = role_data.get('role_assignments', [])
+    if 'user_index' in role_data:
+        return [role_assignments[i] for i in role_data['user_index'].positions(client, username)]
+    
     return [
-        assignment for assignment in role_data.get('role_assignments', [])
-        if assignment['client'] == client and assignment['username'] == username        ]
+        assignment for assignment in role_assignments
+        if assignment['client'] == client and assignment['username'] == username
+    ]
 
 def get_users_with_role(role_data, role_name):
     """
@@ -219,6 +265,21 @@ def get_users_with_role(role_data, role_name):
     
     return users
 
+def get_assignment_expired_series(to_dates, today=None):
+    """
+    Flag the role assignments whose end date (TO_DAT) has passed.
+    
+    Args:
+        to_dates (Series): TO_DAT values
+        today (str): Date to compare against in SAP format (defaults to today)
+        
+    Returns:
+        Series: True where the assignment has expired, with the index of to_dates
+    """
+    if today is None:
+        today = datetime.now().strftime(CONFIG['sap_date_format'])
+    return map_unique_values(to_dates, lambda value: _is_date_expired(value, today))
+
 def _is_date_expired(date_str, compare_date):
     """
     Check if a date is expired compared to another date.
@@ -231,19 +292,16 @@ def _is_date_expired(date_str, compare_date):
         bool: True if date is expired, False otherwise
     """
     if pd.isna(date_str) or str(date_str).strip() == '':
-        print(f"DEBUG: Empty date_str, returning not expired")
         return False
     
     date_str_clean = str(date_str).strip()    
     try:
         # Handle permanent dates (99991231 or similar)
         if date_str_clean.startswith('9999') or date_str_clean.startswith('2999'):
-            print(f"DEBUG: Permanent date detected: {date_str_clean}, returning not expired")
             return False
         
         # Handle malformed dates
         if len(date_str_clean) != 8:
-            print(f"DEBUG: Malformed date: {date_str_clean} (length not 8), returning not expired")
             return False
             
         # Convert to integers for comparison
@@ -259,49 +317,8 @@ def _is_date_expired(date_str, compare_date):
             # Use today's date as fallback if compare_date is invalid
             compare_int = int(datetime.now().strftime('%Y%m%d'))
         
-        is_expired = date_int < compare_int
-        print(f"DEBUG: Date comparison: {date_int} < {compare_int} = {is_expired}")
-        return is_expired
+        return date_int < compare_int
         
-    except (ValueError, TypeError) as e:
-        print(f"DEBUG: Error in date comparison for {date_str_clean}: {str(e)}")
+    except (ValueError, TypeError):
         # Default to not expired in case of error
         return False
-
-def _get_users_with_role(agr_users_df, role_name):
-    """
-    Get list of unique users assigned to a specific role.
-    
-    Args:
-        agr_users_df (DataFrame): AGR_USERS DataFrame
-        role_name (str): Role name
-        
-    Returns:
-        list: List of user dictionary objects
-    """
-    user_list = []
-    today = datetime.now().strftime(CONFIG['sap_date_format'])
-    
-    # Filter DataFrame for the role
-    role_assignments = agr_users_df[agr_users_df['AGR_NAME'] == role_name]
-    
-    # Process each assignment
-    for index, assignment in role_assignments.iterrows():
-        client = assignment[SAP_MANDT_FIELD]
-        username = assignment[SAP_ROLE_USER_FIELD]
-        from_date = assignment.get('FROM_DAT', '')
-        to_date = assignment.get('TO_DAT', '')
-        excluded = assignment.get('EXCLUDE', '') == 'X'
-        
-        # Skip excluded assignments and expired assignments
-        if excluded or _is_date_expired(to_date, today):
-            continue
-            
-        # Add user to list
-        user_list.append({
-            'client': client,
-            'username': username,
-            'from_date': format_sap_date(from_date)
-        })
-    
-    return user_list
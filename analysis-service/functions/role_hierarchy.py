@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Role hierarchy module for the SAP User Analysis Tool
+
+This module expands composite roles (AGR_AGRS: composite AGR_NAME and
+member CHILD_AGR) into the single roles they grant. Roles are client
+dependent, so a role is a (MANDT, AGR_NAME) key.
+
+The transitive closure of the hierarchy (every single role reachable from
+each composite, through nested composites and ignoring cycles) is computed
+once and stored compactly, as the sorted single roles of each composite
+and the bounds of each composite's slice. Closures are cached by the
+content hash of the AGR_AGRS rows, so an extract uploaded again is not
+walked again.
+
+AGR_USERS assignments of a composite are then expanded into one
+assignment per single role, with the validity and exclusion of the
+composite assignment, in a single vectorized pass. Extracts usually list
+the single roles of a composite as assignments of their own already: a
+(client, user, single role) assignment is only added when no assignment
+with the same validity and exclusion (VALIDITY_FIELDS) exists yet, and
+the existing row then names the composite instead. Assignments of the
+same role with another validity are all kept, so an expired or excluded
+assignment never hides an active one granted by another composite.
+
+Composite roles stay roles of their own: their assignments are kept, so
+they count in total_roles and the per-role statistics list the users they
+are assigned to, and SoD rules or high privilege patterns naming them
+still apply.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from functions.user_index import factorize_users
+from config import CONFIG, SAP_MANDT_FIELD, SAP_ROLE_USER_FIELD
+
+# Column of expanded AGR_USERS rows naming the composite role they come from
+COMPOSITE_FIELD = 'COMPOSITE_AGR'
+
+# Fields that must match for two assignments of a role to be duplicates
+VALIDITY_FIELDS = ['FROM_DAT', 'TO_DAT', 'EXCLUDE']
+
+# Closures by content hash of the AGR_AGRS rows, least recently used first
+_closure_cache = OrderedDict()
+_closure_cache_lock = threading.Lock()
+
+
+class RoleHierarchy:
+    """
+    Transitive closure of composite roles into single roles.
+
+    Attributes:
+        role_keys (list): (client, role name) of each role code
+        content_hash (str): Hash of the AGR_AGRS rows the closure comes from
+    """
+
+    def __init__(self, agr_agrs_df, content_hash=None):
+        """
+        Compute the closure.
+
+        Args:
+            agr_agrs_df (DataFrame): AGR_AGRS table
+            content_hash (str): Hash of its rows, if already computed
+        """
+        self.content_hash = content_hash or hash_hierarchy(agr_agrs_df)
+        self._codes = None
+        df = agr_agrs_df[agr_agrs_df['AGR_NAME'].notna() & agr_agrs_df['CHILD_AGR'].notna()]
+        if SAP_MANDT_FIELD in df.columns:
+            clients = df[SAP_MANDT_FIELD].astype(object)
+        else:
+            clients = pd.Series('000', index=df.index, dtype=object)
+
+        codes, self.role_keys = factorize_users(
+            pd.concat([clients, clients], ignore_index=True),
+            pd.concat([df['AGR_NAME'].astype(object), df['CHILD_AGR'].astype(object)], ignore_index=True)
+        )
+        role_count = max(len(self.role_keys), 1)
+        edges = np.unique(codes[:len(df)].astype(np.int64) * role_count + codes[len(df):])
+        parents, children = edges // role_count, edges % role_count
+        keep = parents != children
+        parents, children = parents[keep], children[keep]
+
+        # Direct members of each composite
+        is_composite = np.zeros(role_count, dtype=bool)
+        is_composite[parents] = True
+        child_bounds = np.searchsorted(parents, np.arange(role_count + 1))
+
+        # Replace nested composites by their members until only single roles
+        # are left; pairs already reached are dropped, which breaks cycles
+        closure = []
+        seen = np.unique(parents * role_count + children)
+        pending = seen
+        while len(pending):
+            members = pending % role_count
+            nested = is_composite[members]
+            closure.append(pending[~nested])
+            pending = pending[nested]
+            lengths = np.diff(child_bounds)[pending % role_count]
+            starts = child_bounds[pending % role_count]
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            pending = np.unique(np.repeat(pending // role_count, lengths) * role_count + children[positions])
+            pending = pending[~np.isin(pending, seen, assume_unique=True)]
+            seen = np.union1d(seen, pending)
+
+        pairs = np.unique(np.concatenate(closure + [np.zeros(0, dtype=np.int64)]))
+        self._composites, self._starts = np.unique(pairs // role_count, return_index=True)
+        self._singles = pairs % role_count
+        self._stops = np.append(self._starts[1:], len(pairs))
+
+    @property
+    def composite_count(self):
+        return len(self._composites)
+
+    @property
+    def pair_count(self):
+        return len(self._singles)
+
+    def single_roles(self, client, role_name):
+        """
+        Get the single roles granted by a role.
+
+        Args:
+            client (str): Client ID
+            role_name (str): Role name
+
+        Returns:
+            list: Names of the single roles of a composite, sorted by code
+                (empty for a single or unknown role)
+        """
+        position = self._position(str(client), str(role_name))
+        if position < 0:
+            return []
+        return [self.role_keys[role][1] for role in self._singles[self._starts[position]:self._stops[position]].tolist()]
+
+    def _position(self, client, role_name):
+        # Role codes by key, built on the first lookup
+        if self._codes is None:
+            self._codes = {key: code for code, key in enumerate(self.role_keys)}
+        code = self._codes.get((client, role_name))
+        if code is None:
+            return -1
+        position = np.searchsorted(self._composites, code)
+        if position < len(self._composites) and self._composites[position] == code:
+            return int(position)
+        return -1
+
+    def expand(self, agr_users_df):
+        """
+        Add the single role assignments granted by the composite role assignments.
+
+        A single role already assigned to the user with the same validity
+        and exclusion (directly, or through a composite met earlier) is not
+        added again: the existing row names the first composite granting it.
+
+        Args:
+            agr_users_df (DataFrame): AGR_USERS table
+
+        Returns:
+            DataFrame: AGR_USERS rows followed by the rows derived from
+                composite assignments (AGR_NAME replaced by the single role),
+                with a new RangeIndex. COMPOSITE_FIELD names the composite
+                granting the single role of a row, empty for the others.
+        """
+        df = agr_users_df
+        if SAP_MANDT_FIELD in df.columns:
+            clients = df[SAP_MANDT_FIELD].astype(object).reset_index(drop=True)
+        else:
+            clients = pd.Series('000', index=range(len(df)), dtype=object)
+        composite_keys = [self.role_keys[code] for code in self._composites.tolist()]
+        codes, keys = factorize_users(
+            pd.concat([clients, pd.Series([client for client, _ in composite_keys], dtype=object)], ignore_index=True),
+            pd.concat([
+                df['AGR_NAME'].astype(object).reset_index(drop=True),
+                pd.Series([role_name for _, role_name in composite_keys], dtype=object)
+            ], ignore_index=True)
+        )
+
+        # Composite (position in the closure) of each assignment, -1 for others
+        composite_of = np.full(len(keys), -1, dtype=np.int64)
+        composite_of[codes[len(df):]] = np.arange(len(composite_keys))
+        row_composites = composite_of[codes[:len(df)]]
+        if df['AGR_NAME'].isna().any():
+            row_composites[df['AGR_NAME'].isna().to_numpy()] = -1
+
+        rows = np.flatnonzero(row_composites >= 0)
+        composites = row_composites[rows]
+        lengths = (self._stops - self._starts)[composites]
+        starts = self._starts[composites]
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        derived_rows = np.repeat(rows, lengths)
+        singles = self._singles[positions]
+
+        # (client, user, role name) keys of the assignments, -1 without a role
+        role_names = np.array([role_name for _, role_name in self.role_keys], dtype=object)
+        original_names = df['AGR_NAME'].astype(object).to_numpy()
+        name_codes, names = pd.factorize(np.concatenate([original_names, role_names]))
+        if SAP_ROLE_USER_FIELD in df.columns:
+            usernames = df[SAP_ROLE_USER_FIELD].astype(object).reset_index(drop=True)
+        else:
+            usernames = pd.Series(np.nan, index=range(len(df)), dtype=object)
+        user_codes = factorize_users(clients, usernames)[0].astype(np.int64)
+        width = max(len(names), 1)
+        role_keys, _ = pd.factorize(np.concatenate([
+            user_codes * width + name_codes[:len(df)],
+            user_codes[derived_rows] * width + name_codes[len(df):][singles]
+        ]))
+
+        # Keys extended with the validity of the assignment; derived rows
+        # have the validity of their composite assignment
+        validity, validity_count = _validity_codes(df)
+        original_keys = np.where(
+            name_codes[:len(df)] >= 0, role_keys[:len(df)] * validity_count + validity, -1
+        )
+        derived_keys = role_keys[len(df):] * validity_count + validity[derived_rows]
+
+        # First derived row of each key, unless the assignment already exists
+        unique_keys, first = np.unique(derived_keys, return_index=True)
+        kept = np.zeros(len(derived_keys), dtype=bool)
+        kept[first] = True
+        kept &= ~np.isin(derived_keys, original_keys)
+
+        # Existing rows name the first composite granting their role
+        composite_names = original_names[derived_rows]
+        original_composites = np.full(len(df), '', dtype=object)
+        if len(unique_keys):
+            found = np.minimum(np.searchsorted(unique_keys, original_keys), len(unique_keys) - 1)
+            granted = np.flatnonzero((original_keys >= 0) & (unique_keys[found] == original_keys))
+            original_composites[granted] = composite_names[first[found[granted]]]
+
+        derived = df.take(derived_rows[kept])
+        original = df.reset_index(drop=True)
+        names = pd.Series(np.concatenate([original_names, role_names[singles[kept]]]))
+        expanded = pd.concat(
+            [original.drop(columns='AGR_NAME'), derived.drop(columns='AGR_NAME')], ignore_index=True
+        )
+        if isinstance(df['AGR_NAME'].dtype, pd.CategoricalDtype):
+            names = names.astype('category')
+        expanded.insert(list(df.columns).index('AGR_NAME'), 'AGR_NAME', names)
+        expanded[COMPOSITE_FIELD] = np.concatenate([original_composites, composite_names[kept]])
+        return expanded
+
+
+def _validity_codes(agr_users_df):
+    """
+    Number the distinct validity and exclusion values of assignments.
+
+    Args:
+        agr_users_df (DataFrame): AGR_USERS table
+
+    Returns:
+        tuple: (int64 code of each row, number of codes); rows share a
+            code when all their VALIDITY_FIELDS are equal, missing values
+            included
+    """
+    codes = np.zeros(len(agr_users_df), dtype=np.int64)
+    count = 1
+    for field in VALIDITY_FIELDS:
+        if field not in agr_users_df.columns:
+            continue
+        field_codes, uniques = pd.factorize(agr_users_df[field], use_na_sentinel=False)
+        codes, combined = pd.factorize(codes * max(len(uniques), 1) + field_codes)
+        count = max(len(combined), 1)
+    return codes.astype(np.int64), count
+
+
+def hash_hierarchy(agr_agrs_df):
+    """
+    Hash the (MANDT, AGR_NAME, CHILD_AGR) content of AGR_AGRS rows.
+
+    Args:
+        agr_agrs_df (DataFrame): AGR_AGRS table
+
+    Returns:
+        str: Hex digest, the same for the same rows in the same order
+    """
+    fields = [field for field in (SAP_MANDT_FIELD, 'AGR_NAME', 'CHILD_AGR') if field in agr_agrs_df.columns]
+    values = pd.util.hash_pandas_object(agr_agrs_df[fields].astype(str), index=False).to_numpy()
+    return hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest()
+
+
+def get_role_hierarchy(agr_agrs_df, config=None):
+    """
+    Get the closure of an AGR_AGRS table, computing it on first use.
+
+    Args:
+        agr_agrs_df (DataFrame): AGR_AGRS table
+        config (dict): Configuration settings (defaults to CONFIG)
+
+    Returns:
+        RoleHierarchy: Closure of the hierarchy
+    """
+    config = config or CONFIG
+    content_hash = hash_hierarchy(agr_agrs_df)
+    with _closure_cache_lock:
+        hierarchy = _closure_cache.get(content_hash)
+        if hierarchy is not None:
+            _closure_cache.move_to_end(content_hash)
+            print(f"Role hierarchy {content_hash} loaded from the closure cache")
+            return hierarchy
+
+    hierarchy = RoleHierarchy(agr_agrs_df, content_hash)
+    with _closure_cache_lock:
+        _closure_cache[content_hash] = hierarchy
+        while len(_closure_cache) > max(config.get('role_hierarchy_cache_size', 0), 0):
+            _closure_cache.popitem(last=False)
+    return hierarchy
+
+
+def expand_composite_roles(data, config=None):
+    """
+    Expand the composite role assignments of AGR_USERS when AGR_AGRS was loaded.
+
+    data['agr_users_df'] is replaced by the expanded table, so every
+    analyzer sees the single roles granted by composite roles, once per
+    user (see RoleHierarchy.expand).
+
+    Args:
+        data (dict): Dictionary containing DataFrames for each loaded table
+        config (dict): Configuration settings (defaults to CONFIG)
+
+    Returns:
+        dict: Expansion statistics (composite_roles, closure_pairs,
+            expanded_assignments added, existing_assignments granted by a
+            composite too with the same validity), or None without a
+            usable AGR_AGRS
+    """
+    agr_agrs_df = data.get('agr_agrs_df')
+    agr_users_df = data.get('agr_users_df')
+    if agr_agrs_df is None or agr_users_df is None or 'AGR_NAME' not in agr_users_df.columns:
+        return None
+    missing = [field for field in ('AGR_NAME', 'CHILD_AGR') if field not in agr_agrs_df.columns]
+    if missing:
+        print(f"AGR_AGRS is missing {', '.join(missing)}, composite roles are not expanded")
+        return None
+
+    print("\n======= EXPAND COMPOSITE ROLES FUNCTION STARTED =======")
+    hierarchy = get_role_hierarchy(agr_agrs_df, config)
+    data['agr_users_df'] = hierarchy.expand(agr_users_df)
+    expanded = data['agr_users_df']
+    stats = {
+        'composite_roles': hierarchy.composite_count,
+        'closure_pairs': hierarchy.pair_count,
+        'expanded_assignments': len(expanded) - len(agr_users_df),
+        'existing_assignments': int((expanded[COMPOSITE_FIELD].iloc[:len(agr_users_df)] != '').sum())
+    }
+    print(f"{stats['composite_roles']} composite roles grant {stats['closure_pairs']} single roles, "
+          f"{stats['expanded_assignments']} assignments added, {stats['existing_assignments']} already assigned")
+    print("======= EXPAND COMPOSITE ROLES FUNCTION COMPLETED =======\n")
+    return stats
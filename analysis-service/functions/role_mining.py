@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Role mining module for the SAP User Analysis Tool
+
+This module groups users with near-identical access: users whose active
+AGR_USERS role sets have a Jaccard similarity of at least a threshold end
+up in the same cluster, which is a candidate template role; users left
+alone are outliers.
+
+Comparing every pair of users is out of reach for hundreds of thousands of
+users, so the clustering works in near-linear time:
+- users with the same role set share a profile, found by hashing the sets;
+- each profile gets a MinHash signature (the minimum of several hash
+  functions over its roles), cut into bands; profiles whose signatures
+  agree on a whole band fall in the same bucket (locality-sensitive
+  hashing), so similar profiles meet in some bucket with high probability;
+- within a bucket, profiles are only compared with their neighbours, the
+  exact Jaccard similarity of those candidates is checked, and the pairs
+  above the threshold are joined into connected components.
+"""
+
+import numpy as np
+import pandas as pd
+from config import CONFIG
+
+# Prime modulus of the MinHash hash functions (a * role + b) mod p
+MINHASH_PRIME = (1 << 31) - 1
+
+# Seed of the MinHash and set hash coefficients, so results are reproducible
+MINHASH_SEED = 1251
+
+# Multiplier folding the rows of a band into one bucket key
+BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def analyze_role_mining(role_analysis, threshold=None, config=None):
+    """
+    Cluster the users by the similarity of their active role sets.
+
+    Args:
+        role_analysis (dict): Role analysis results, with the encoded
+            assignments
+        threshold (float): Minimum Jaccard similarity of two role sets in a
+            cluster (defaults to config['role_mining_threshold'])
+        config (dict): Configuration settings (defaults to CONFIG)
+
+    Returns:
+        dict: Dictionary with the 'threshold', the number of users with an
+            active role ('user_count'), of distinct role sets
+            ('profile_count'), of clusters of at least two users
+            ('cluster_count'), of 'clustered_users' and 'outlier_users',
+            the largest 'clusters' (user_count, profile_count, core_roles
+            held by every member, template_roles held by at least half of
+            them, and the first users) and the first 'outliers'
+    """
+    print("\n======= ANALYZE ROLE MINING FUNCTION STARTED =======")
+    config = config or CONFIG
+    threshold = config['role_mining_threshold'] if threshold is None else float(threshold)
+    max_clusters = config.get('role_mining_max_clusters')
+    max_users = config.get('role_mining_max_users')
+    encoding = role_analysis['encoding']
+
+    # Distinct active (user, role) pairs, sorted by user then role
+    user_ids = role_analysis['assignment_user_ids']
+    role_ids = role_analysis['assignment_role_ids']
+    kept = role_analysis['assignment_active'] & (user_ids >= 0) & (role_ids >= 0)
+    role_count = max(len(encoding.roles), 1)
+    pairs = np.unique(user_ids[kept].astype(np.int64) * role_count + role_ids[kept])
+    users, user_starts = np.unique(pairs // role_count, return_index=True)
+    pair_roles = pairs % role_count
+
+    # Users with the same role set share a profile
+    user_profiles = hash_sets(pair_roles, user_starts, role_count)
+    profile_first = np.unique(user_profiles, return_index=True)[1]
+    profile_sizes = np.bincount(user_profiles)
+    profile_starts, profile_roles = _take_sets(user_starts, len(pair_roles), profile_first, pair_roles)
+    print(f"{len(users)} users with active roles share {len(profile_first)} distinct role sets")
+
+    # Similar profiles, joined into clusters
+    bands, rows = _banding(config['role_mining_hashes'], threshold)
+    first, second = _candidate_pairs(profile_starts, profile_roles, role_count, bands, rows)
+    similar = _jaccard(profile_starts, profile_roles, first, second, role_count) >= threshold
+    profile_clusters = _components(len(profile_first), first[similar], second[similar])
+    print(f"Checked {len(first)} candidate profile pairs, {int(similar.sum())} above {threshold}")
+
+    # Clusters by decreasing number of users
+    cluster_codes, cluster_labels = pd.factorize(profile_clusters)
+    cluster_sizes = np.bincount(cluster_codes, weights=profile_sizes, minlength=len(cluster_labels)).astype(np.int64)
+    clusters = np.flatnonzero(cluster_sizes >= 2)
+    clusters = clusters[np.argsort(-cluster_sizes[clusters], kind='stable')]
+    user_clusters = cluster_codes[user_profiles]
+    outliers = users[cluster_sizes[user_clusters] < 2]
+
+    result = {
+        'threshold': threshold,
+        'user_count': len(users),
+        'profile_count': len(profile_first),
+        'cluster_count': len(clusters),
+        'clustered_users': int(cluster_sizes[clusters].sum()),
+        'outlier_users': len(outliers),
+        'clusters': _describe_clusters(
+            clusters[:max_clusters], cluster_codes, cluster_sizes, profile_sizes,
+            profile_starts, profile_roles, users, user_clusters, encoding, max_users
+        ),
+        'outliers': encoding.user_labels(outliers[:max_users])
+    }
+
+    print(f"Found {result['cluster_count']} clusters of {result['clustered_users']} users, "
+          f"{result['outlier_users']} outliers")
+    print("======= ANALYZE ROLE MINING FUNCTION COMPLETED =======\n")
+
+    return result
+
+
+def hash_sets(members, starts, member_count):
+    """
+    Number sets by content: equal sets get the same code.
+
+    Each set is hashed as two 64-bit sums of random weights of its members
+    plus its size, so sets are compared in one pass whatever their size.
+
+    Args:
+        members (ndarray): Members of the sets, concatenated, each set
+            without duplicates
+        starts (ndarray): Start of each set in members (sets not empty)
+        member_count (int): Number of possible members
+
+    Returns:
+        ndarray: Code of each set, numbered in order of first appearance
+    """
+    if not len(starts):
+        return np.zeros(0, dtype=np.int64)
+    rng = np.random.default_rng(MINHASH_SEED)
+    sizes = np.diff(np.append(starts, len(members)))
+    hashes = [
+        np.add.reduceat(
+            rng.integers(0, np.iinfo(np.int64).max, member_count, dtype=np.int64).astype(np.uint64)[members],
+            starts
+        )
+        for _ in range(2)
+    ]
+    return pd.DataFrame({'first': hashes[0], 'second': hashes[1], 'size': sizes}).groupby(
+        ['first', 'second', 'size'], sort=False
+    ).ngroup().to_numpy()
+
+
+def _take_sets(starts, stop, selected, members):
+    """
+    Extract some sets of concatenated sets.
+
+    Args:
+        starts (ndarray): Start of each set in members
+        stop (int): End of the last set
+        selected (ndarray): Sets to extract
+        members (ndarray): Members of the sets, concatenated
+
+    Returns:
+        tuple: (start of each extracted set, concatenated members)
+    """
+    lengths = np.diff(np.append(starts, stop))[selected]
+    new_starts = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts[selected] - new_starts, lengths) + np.arange(lengths.sum())
+    return new_starts, members[positions]
+
+
+def _banding(hash_count, threshold):
+    """
+    Split the MinHash values of a signature into bands.
+
+    Two sets of similarity s share a band with probability
+    1 - (1 - s ** rows) ** bands, which rises steeply around
+    (1 / bands) ** (1 / rows); the longest bands keeping that point at or
+    below threshold ** 2 are chosen, so pairs above the threshold are
+    almost always candidates while dissimilar pairs rarely are.
+
+    Args:
+        hash_count (int): MinHash values per set
+        threshold (float): Minimum Jaccard similarity sought
+
+    Returns:
+        tuple: (bands, rows per band)
+    """
+    rows = 2
+    while (
+        rows < hash_count // 2
+        and (1 / (hash_count // (rows + 1))) ** (1 / (rows + 1)) <= threshold ** 2
+    ):
+        rows += 1
+    return max(hash_count // rows, 1), rows
+
+
+def _candidate_pairs(starts, members, member_count, bands, rows):
+    """
+    Find pairs of sets likely to be similar with MinHash banding.
+
+    Within each bucket of a band, every set is paired with the first set of
+    the bucket and with the set before it, so the number of candidates is
+    linear in the number of sets.
+
+    Args:
+        starts (ndarray): Start of each set in members (sets not empty)
+        members (ndarray): Members of the sets, concatenated
+        member_count (int): Number of possible members
+        bands (int): Number of bands
+        rows (int): MinHash values per band
+
+    Returns:
+        tuple: (first, second) arrays of distinct candidate pairs, first < second
+    """
+    set_count = len(starts)
+    if set_count < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    rng = np.random.default_rng(MINHASH_SEED)
+    roles = np.arange(member_count, dtype=np.int64)
+
+    candidates = []
+    for _ in range(bands):
+        # MinHash of every set for the rows of this band, folded into a key
+        key = np.zeros(set_count, dtype=np.uint64)
+        for _ in range(rows):
+            a, b = rng.integers(1, MINHASH_PRIME, 2)
+            member_hashes = (a * roles + b) % MINHASH_PRIME
+            key = key * BAND_MULTIPLIER + np.minimum.reduceat(member_hashes[members], starts).astype(np.uint64)
+
+        # Sets of a bucket are consecutive once sorted by key
+        order = np.argsort(key, kind='stable')
+        sorted_keys = key[order]
+        same = np.flatnonzero(sorted_keys[1:] == sorted_keys[:-1]) + 1
+        bucket_starts = np.flatnonzero(np.diff(sorted_keys, prepend=sorted_keys[0] + np.uint64(1)) != 0)
+        leaders = order[bucket_starts[np.searchsorted(bucket_starts, same, 'right') - 1]]
+        candidates.append(np.stack([order[same], order[same - 1]]))
+        candidates.append(np.stack([order[same], leaders]))
+
+    candidates = np.concatenate(candidates, axis=1)
+    candidates = candidates[:, candidates[0] != candidates[1]]
+    keys = np.unique(np.minimum(candidates[0], candidates[1]) * set_count + np.maximum(candidates[0], candidates[1]))
+    return keys // set_count, keys % set_count
+
+
+def _jaccard(starts, members, first, second, member_count):
+    """
+    Compute the exact Jaccard similarity of pairs of sets.
+
+    Args:
+        starts (ndarray): Start of each set in members
+        members (ndarray): Members of the sets, concatenated, each set sorted
+        first (ndarray): First set of each pair
+        second (ndarray): Second set of each pair
+        member_count (int): Number of possible members
+
+    Returns:
+        ndarray: Similarity of each pair
+    """
+    if not len(first):
+        return np.zeros(0, dtype=np.float64)
+    stop = len(members)
+    pair_ids = np.arange(len(first), dtype=np.int64)
+    sizes = np.diff(np.append(starts, stop))
+
+    # Members of both sets, keyed by pair: shared keys are the intersection
+    first_starts, first_members = _take_sets(starts, stop, first, members)
+    second_starts, second_members = _take_sets(starts, stop, second, members)
+    first_keys = np.repeat(pair_ids, sizes[first]) * member_count + first_members
+    second_keys = np.repeat(pair_ids, sizes[second]) * member_count + second_members
+    shared = first_keys[np.isin(first_keys, second_keys, assume_unique=True)] // member_count
+    intersection = np.bincount(shared, minlength=len(first))
+    return intersection / (sizes[first] + sizes[second] - intersection)
+
+
+def _components(node_count, first, second):
+    """
+    Label the connected components of a graph.
+
+    Args:
+        node_count (int): Number of nodes
+        first (ndarray): First node of each edge
+        second (ndarray): Second node of each edge
+
+    Returns:
+        ndarray: Component of each node, the smallest node of the component
+    """
+    labels = np.arange(node_count)
+    while len(first):
+        # Hook both ends of every edge on the smaller label, then flatten
+        first_labels, second_labels = labels[first], labels[second]
+        if np.array_equal(first_labels, second_labels):
+            break
+        low = np.minimum(first_labels, second_labels)
+        np.minimum.at(labels, first_labels, low)
+        np.minimum.at(labels, second_labels, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return labels
+
+
+def _describe_clusters(clusters, cluster_codes, cluster_sizes, profile_sizes, profile_starts,
+                       profile_roles, users, user_clusters, encoding, max_users):
+    """
+    Summarize clusters with their shared roles and first users.
+
+    Args:
+        clusters (ndarray): Cluster codes to describe, in order
+        cluster_codes (ndarray): Cluster code of each profile
+        cluster_sizes (ndarray): Number of users of each cluster code
+        profile_sizes (ndarray): Number of users of each profile
+        profile_starts (ndarray): Start of each profile in profile_roles
+        profile_roles (ndarray): Roles of the profiles, concatenated
+        users (ndarray): User ID of each user with roles
+        user_clusters (ndarray): Cluster code of each user with roles
+        encoding (DataEncoding): Encoding of the analysed tables
+        max_users (int): Users listed per cluster (None lists them all)
+
+    Returns:
+        list: One dictionary per cluster
+    """
+    if not len(clusters):
+        return []
+    position = np.full(len(cluster_sizes), -1, dtype=np.int64)
+    position[clusters] = np.arange(len(clusters))
+
+    # Users holding each role of each described cluster
+    profile_lengths = np.diff(np.append(profile_starts, len(profile_roles)))
+    role_clusters = position[np.repeat(cluster_codes, profile_lengths)]
+    described = role_clusters >= 0
+    holders = pd.Series(np.repeat(profile_sizes, profile_lengths)[described]).groupby(
+        [role_clusters[described], profile_roles[described]]
+    ).sum()
+    profile_counts = np.bincount(position[cluster_codes][position[cluster_codes] >= 0], minlength=len(clusters))
+
+    member_position = position[user_clusters]
+    members = pd.Series(users[member_position >= 0]).groupby(member_position[member_position >= 0])
+    first_members = members.apply(lambda ids: ids.to_numpy()[:max_users])
+
+    summaries = []
+    for rank, cluster in enumerate(clusters.tolist()):
+        size = int(cluster_sizes[cluster])
+        role_holders = holders.loc[rank].sort_values(ascending=False, kind='stable')
+        summaries.append({
+            'cluster_id': rank + 1,
+            'user_count': size,
+            'profile_count': int(profile_counts[rank]),
+            'core_roles': [str(encoding.roles[role]) for role in role_holders.index[role_holders == size].tolist()],
+            'template_roles': [
+                str(encoding.roles[role]) for role in role_holders.index[role_holders * 2 >= size].tolist()
+            ],
+            'users': encoding.user_labels(first_members.loc[rank])
+        })
+    return summaries
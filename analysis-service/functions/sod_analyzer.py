@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Segregation of duties analyzer module for the SAP User Analysis Tool
+
+This module detects segregation of duties (SoD) conflicts: users holding,
+through their active roles (AGR_USERS) or their authorization objects
+(USR12), every side of a conflict rule of CONFIG['sod_rules'].
+
+A rule has a conflict type and two or more sets; each set lists role name
+patterns ('roles') and/or authorization object patterns ('objects'), with
+* and ? wildcards, compared case-insensitively. A user matches a set when
+one of their roles or objects matches one of its patterns, and conflicts
+with a rule when they match all of its sets.
+
+Roles, objects and users are taken as the integer IDs of the data encoding
+(see functions.encoding). Each role and object name is matched against the
+patterns once and encoded as a bitset of the sets it belongs to. Each user's bitset is the
+OR of the bitsets of their roles and objects, and every rule is evaluated
+for all users with a bitwise AND against the mask of its sets. Compiled
+rulesets, and the bitsets of the names they already matched, are cached
+between analyses, up to MAX_MEMOIZED_NAMES names per kind.
+"""
+
+import fnmatch
+import hashlib
+import json
+import re
+import threading
+import numpy as np
+import pandas as pd
+from functions.user_index import factorize_users
+from models.models import SoDConflict
+from config import CONFIG
+
+# Compiled rulesets kept between analyses, by content hash
+MAX_CACHED_RULESETS = 8
+
+# Role or object names whose matched sets a ruleset keeps between analyses
+MAX_MEMOIZED_NAMES = 200000
+
+# Bits per word of the user bitsets
+WORD_BITS = 64
+
+_rulesets = {}
+_rulesets_lock = threading.Lock()
+
+
+class CompiledRuleset:
+    """
+    SoD ruleset compiled for bitset evaluation.
+
+    The sets of all rules are numbered; each rule keeps the word masks of
+    its sets. Pattern matches are memoized per role or object name; the
+    memo is cleared when it would exceed MAX_MEMOIZED_NAMES names.
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules (list): Conflict rules, as in CONFIG['sod_rules']
+        """
+        self.conflict_types = []
+        self.rule_sets = []
+        # (kind, pattern) of every set
+        self.set_patterns = []
+
+        for number, rule in enumerate(rules):
+            sets = rule.get('sets', [])
+            if not rule.get('conflict_type') or len(sets) < 2:
+                raise ValueError(f"SoD rule {number} needs a conflict_type and at least two sets")
+
+            set_ids = []
+            for rule_set in sets:
+                patterns = [('role', str(pattern).upper()) for pattern in rule_set.get('roles', [])]
+                patterns += [('object', str(pattern).upper()) for pattern in rule_set.get('objects', [])]
+                if not patterns:
+                    raise ValueError(f"SoD rule {number} has a set without roles or objects")
+                set_ids.append(len(self.set_patterns))
+                self.set_patterns.append(patterns)
+
+            self.conflict_types.append(rule['conflict_type'])
+            self.rule_sets.append(set_ids)
+
+        self.set_count = len(self.set_patterns)
+        self.word_count = max((self.set_count + WORD_BITS - 1) // WORD_BITS, 1)
+        self.rule_masks = [_word_masks(set_ids) for set_ids in self.rule_sets]
+
+        # Set ids of each rule, padded with -1
+        width = max((len(set_ids) for set_ids in self.rule_sets), default=2)
+        self.set_matrix = np.full((len(self.rule_sets), width), -1, dtype=np.int64)
+        for rule, set_ids in enumerate(self.rule_sets):
+            self.set_matrix[rule, :len(set_ids)] = set_ids
+
+        # Set ids of each pattern, by kind of name matched
+        self._patterns = {'role': {}, 'object': {}}
+        for set_id, patterns in enumerate(self.set_patterns):
+            for kind, pattern in patterns:
+                self._patterns[kind].setdefault(pattern, []).append(set_id)
+
+        self._memberships = {'role': {}, 'object': {}}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rule_sets)
+
+    def memberships(self, kind, names):
+        """
+        Get the sets matched by each name.
+
+        Args:
+            kind (str): 'role' or 'object'
+            names (list): Distinct names, upper-cased
+
+        Returns:
+            list: Array of the set ids matched by each name
+        """
+        with self._lock:
+            cache = self._memberships[kind]
+            missing = [name for name in names if name not in cache]
+            if len(cache) + len(missing) > MAX_MEMOIZED_NAMES:
+                # Start over rather than keep the names of every past analysis
+                cache.clear()
+                missing = list(names)
+            if missing:
+                cache.update(_match_patterns(self._patterns[kind], missing))
+            return [cache[name] for name in names]
+
+
+def get_compiled_ruleset(rules=None):
+    """
+    Get a compiled SoD ruleset, compiling it on first use.
+
+    Args:
+        rules (list): Conflict rules (defaults to CONFIG['sod_rules'])
+
+    Returns:
+        CompiledRuleset: Compiled ruleset, shared by the analyses using the
+            same rules
+    """
+    if rules is None:
+        rules = CONFIG['sod_rules']
+
+    key = hashlib.sha256(json.dumps(rules, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    with _rulesets_lock:
+        ruleset = _rulesets.get(key)
+    if ruleset is None:
+        ruleset = CompiledRuleset(rules)
+        with _rulesets_lock:
+            _rulesets[key] = ruleset
+            while len(_rulesets) > MAX_CACHED_RULESETS:
+                # Dictionaries keep insertion order, so this is the oldest
+                del _rulesets[next(iter(_rulesets))]
+    return ruleset
+
+
+def analyze_sod(role_analysis, auth_analysis, rules=None):
+    """
+    Detect segregation of duties conflicts.
+
+    Args:
+        role_analysis (dict): Role analysis results
+        auth_analysis (dict): Authorization analysis results
+        rules (list): Conflict rules (defaults to CONFIG['sod_rules'])
+
+    Returns:
+        dict: Dictionary with the conflict 'count', the 'conflicts' (one
+            SoDConflict per user and rule: client, username, conflictType,
+            roleSet1, roleSet2) and the 'rule_count'
+    """
+    print("\n======= ANALYZE SOD FUNCTION STARTED =======")
+    ruleset = get_compiled_ruleset(rules)
+
+    # Active role assignments and authorization objects of every user
+    role_users, role_codes, role_vocabulary = _role_tokens(role_analysis)
+    auth_users, object_codes, object_vocabulary = _object_tokens(auth_analysis)
+
+    user_codes, user_keys = _join_users(
+        role_users, role_analysis.get('encoding'), auth_users, auth_analysis.get('encoding')
+    )
+
+    # Tokens: role IDs, then object IDs
+    token_codes = np.concatenate([role_codes, object_codes + len(role_vocabulary)]).astype(np.int64)
+    token_names = [str(name) for name in role_vocabulary] + [str(name) for name in object_vocabulary]
+
+    memberships = (
+        ruleset.memberships('role', [name.upper() for name in token_names[:len(role_vocabulary)]])
+        + ruleset.memberships('object', [name.upper() for name in token_names[len(role_vocabulary):]])
+    )
+    token_words = np.zeros((len(token_names), ruleset.word_count), dtype=np.uint64)
+    for token, set_ids in enumerate(memberships):
+        for word, mask in _word_masks(set_ids).items():
+            token_words[token, word] |= np.uint64(mask)
+
+    # Distinct (user, token) pairs by user, in order, for tokens in some set
+    set_counts = np.array([len(set_ids) for set_ids in memberships], dtype=np.int64)
+    in_sets = np.flatnonzero(set_counts[token_codes] > 0)
+    in_sets = in_sets[np.argsort(user_codes[in_sets], kind='stable')]
+    pair_users = user_codes[in_sets]
+    pair_tokens = token_codes[in_sets]
+    distinct = ~pd.Series(pair_users.astype(np.int64) * max(len(token_names), 1) + pair_tokens).duplicated().to_numpy()
+    pair_users = pair_users[distinct]
+    pair_tokens = pair_tokens[distinct]
+
+    # Bitset of each user, stored word by word: OR of the bitsets of their tokens
+    set_ids = np.concatenate(memberships + [np.zeros(0, dtype=np.int64)])
+    set_offsets = np.concatenate([[0], np.cumsum(set_counts)])
+    counts = set_counts[pair_tokens]
+    member_users = np.repeat(pair_users, counts)
+    member_sets = set_ids[_expand_ranges(set_offsets[pair_tokens], counts)]
+    user_count = len(user_keys)
+    keys = (member_sets // WORD_BITS) * user_count + member_users
+    bits = np.left_shift(np.uint64(1), (member_sets % WORD_BITS).astype(np.uint64))
+    user_words = np.zeros(ruleset.word_count * user_count, dtype=np.uint64)
+    np.bitwise_or.at(user_words, keys, bits)
+    user_words = user_words.reshape(ruleset.word_count, user_count)
+    print(f"Encoded {user_count} users over {len(token_names)} roles and objects")
+
+    # Evaluate every rule for all users at once
+    hit_users = []
+    hit_rules = []
+    for rule, masks in enumerate(ruleset.rule_masks):
+        hit = np.ones(user_count, dtype=bool)
+        for word, mask in masks.items():
+            mask = np.uint64(mask)
+            hit &= (user_words[word] & mask) == mask
+        users = np.flatnonzero(hit)
+        hit_users.append(users)
+        hit_rules.append(np.full(len(users), rule))
+    hit_users = np.concatenate(hit_users) if hit_users else np.zeros(0, dtype=np.int64)
+    hit_rules = np.concatenate(hit_rules) if hit_rules else np.zeros(0, dtype=np.int64)
+
+    # Conflicts by user, in order of first appearance, then by rule
+    hit_order = np.lexsort((hit_rules, hit_users))
+    hit_users = hit_users[hit_order]
+    hit_rules = hit_rules[hit_order]
+
+    # Tokens of each user, repeated for each of their conflicts
+    user_bounds = np.searchsorted(pair_users, np.arange(user_count + 1))
+    counts = user_bounds[hit_users + 1] - user_bounds[hit_users]
+    entry_conflicts = np.repeat(np.arange(len(hit_users)), counts)
+    entry_tokens = pair_tokens[_expand_ranges(user_bounds[hit_users], counts)]
+
+    # Tokens on the first side of each rule, and on the other sides
+    entry_sets = ruleset.set_matrix[hit_rules[entry_conflicts]]
+    first_side = _in_set(token_words, entry_tokens, entry_sets[:, 0])
+    other_sides = np.zeros(len(entry_tokens), dtype=bool)
+    for column in range(1, entry_sets.shape[1]):
+        other_sides |= _in_set(token_words, entry_tokens, entry_sets[:, column])
+
+    token_names = np.array(token_names, dtype=object)
+    role_sets_1 = _group_names(token_names, entry_tokens, entry_conflicts, first_side, len(hit_users))
+    role_sets_2 = _group_names(token_names, entry_tokens, entry_conflicts, other_sides, len(hit_users))
+
+    conflicts = [
+        SoDConflict(
+            client=user_keys[user][0],
+            username=user_keys[user][1],
+            conflictType=ruleset.conflict_types[rule],
+            roleSet1=role_set_1,
+            roleSet2=role_set_2
+        )
+        for user, rule, role_set_1, role_set_2 in zip(
+            hit_users.tolist(), hit_rules.tolist(), role_sets_1, role_sets_2
+        )
+    ]
+
+    print(f"Evaluated {len(ruleset)} SoD rules, found {len(conflicts)} conflicts")
+    print("======= ANALYZE SOD FUNCTION COMPLETED =======\n")
+
+    return {
+        'count': len(conflicts),
+        'conflicts': conflicts,
+        'rule_count': len(ruleset)
+    }
+
+
+def _role_tokens(role_analysis):
+    """
+    Get the active role assignments of an encoded role analysis.
+
+    Args:
+        role_analysis (dict): Role analysis results
+
+    Returns:
+        tuple: (user IDs, role IDs, role names indexed by ID); empty when
+            the analysis has no encoding (failed or limited analysis)
+    """
+    if 'encoding' not in role_analysis or 'assignment_user_ids' not in role_analysis:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), []
+    role_ids = role_analysis['assignment_role_ids']
+    active = role_analysis['assignment_active'] & (role_ids >= 0)
+    return role_analysis['assignment_user_ids'][active], role_ids[active], role_analysis['encoding'].roles
+
+
+def _object_tokens(auth_analysis):
+    """
+    Get the authorization objects of an encoded authorization analysis.
+
+    Args:
+        auth_analysis (dict): Authorization analysis results
+
+    Returns:
+        tuple: (user IDs, object IDs, object names indexed by ID); empty
+            when the analysis has no encoding (failed or limited analysis)
+    """
+    records = auth_analysis.get('authorizations')
+    if 'encoding' not in auth_analysis or getattr(records, 'user_ids', None) is None:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), []
+    has_object = records.object_ids >= 0
+    return records.user_ids[has_object], records.object_ids[has_object], auth_analysis['encoding'].objects
+
+
+def _join_users(role_users, role_encoding, auth_users, auth_encoding):
+    """
+    Number the users of the role and authorization tokens together.
+
+    The two analyses normally share one encoding; their users are still
+    joined on their keys, so an encoding rebuilt in between (e.g. after a
+    column was filled) keeps the same users.
+
+    Args:
+        role_users (ndarray): User ID of each role token
+        role_encoding (DataEncoding): Encoding of the role user IDs
+        auth_users (ndarray): User ID of each object token
+        auth_encoding (DataEncoding): Encoding of the object user IDs
+
+    Returns:
+        tuple: (user code of each token, roles first; list of (client,
+            username) keys indexed by code, in order of first appearance)
+    """
+    role_codes, role_ids = pd.factorize(role_users)
+    auth_codes, auth_ids = pd.factorize(auth_users)
+    keys = (
+        [role_encoding.user_keys[user_id] for user_id in role_ids.tolist()]
+        + [auth_encoding.user_keys[user_id] for user_id in auth_ids.tolist()]
+    )
+    codes, user_keys = factorize_users([key[0] for key in keys], [key[1] for key in keys])
+    return np.concatenate([codes[:len(role_ids)][role_codes], codes[len(role_ids):][auth_codes]]), user_keys
+
+
+def _match_patterns(patterns, names):
+    """
+    Match names against patterns.
+
+    Exact names are looked up, trailing-wildcard prefixes are located by
+    binary search in the sorted names, other patterns are matched with a
+    regular expression.
+
+    Args:
+        patterns (dict): Set ids by upper-cased pattern
+        names (list): Distinct upper-cased names
+
+    Returns:
+        dict: Array of matched set ids by name
+    """
+    matched = {name: [] for name in names}
+    sorted_names = np.array(sorted(names), dtype=object)
+
+    for pattern, set_ids in patterns.items():
+        wildcards = [position for position, char in enumerate(pattern) if char in '*?[']
+        if not wildcards:
+            if pattern in matched:
+                matched[pattern].extend(set_ids)
+        elif wildcards == [len(pattern) - 1] and pattern.endswith('*'):
+            prefix = pattern[:-1]
+            start = np.searchsorted(sorted_names, prefix, side='left')
+            stop = np.searchsorted(sorted_names, prefix + '\U0010ffff', side='left')
+            for name in sorted_names[start:stop]:
+                matched[name].extend(set_ids)
+        else:
+            regex = re.compile(fnmatch.translate(pattern))
+            for name in names:
+                if regex.match(name):
+                    matched[name].extend(set_ids)
+
+    return {name: np.unique(np.array(set_ids, dtype=np.int64)) for name, set_ids in matched.items()}
+
+
+def _word_masks(set_ids):
+    """
+    Encode set ids as bitset words.
+
+    Args:
+        set_ids (iterable): Set ids
+
+    Returns:
+        dict: Mask of each word holding at least one of the sets
+    """
+    masks = {}
+    for set_id in set_ids:
+        word, bit = divmod(int(set_id), WORD_BITS)
+        masks[word] = masks.get(word, 0) | (1 << bit)
+    return masks
+
+
+def _expand_ranges(starts, counts):
+    """
+    Concatenate the ranges start, start + 1, ..., start + count - 1.
+
+    Args:
+        starts (ndarray): First value of each range
+        counts (ndarray): Length of each range
+
+    Returns:
+        ndarray: Values of all ranges, in order
+    """
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+
+def _in_set(token_words, tokens, set_ids):
+    """
+    Check whether tokens belong to sets.
+
+    Args:
+        token_words (ndarray): Set bitset of each token code
+        tokens (ndarray): Token codes
+        set_ids (ndarray): Set id checked for each token (-1 for none)
+
+    Returns:
+        ndarray: Boolean mask of the tokens in their set
+    """
+    valid = set_ids >= 0
+    set_ids = np.where(valid, set_ids, 0)
+    words = token_words[tokens, set_ids // WORD_BITS]
+    bits = (words >> (set_ids % WORD_BITS).astype(np.uint64)) & np.uint64(1)
+    return valid & (bits == 1)
+
+
+def _group_names(token_names, tokens, groups, mask, group_count):
+    """
+    Get the names of the selected tokens of each group.
+
+    Args:
+        token_names (ndarray): Name of each token code
+        tokens (ndarray): Token codes, sorted by group
+        groups (ndarray): Group of each token
+        mask (ndarray): Selected tokens
+        group_count (int): Number of groups
+
+    Returns:
+        list: List of names of each group
+    """
+    names = token_names[tokens[mask]].tolist()
+    bounds = np.searchsorted(groups[mask], np.arange(group_count + 1)).tolist()
+    return [names[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
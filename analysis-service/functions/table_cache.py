@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Parsed table cache for the SAP User Analysis Tool
+
+Auditors upload the same USR02/AGR_USERS/USR12 exports many times. This
+module caches each parsed table on disk, keyed by the content hash of the
+upload and the parse options, so a repeated upload skips parsing.
+
+Entries are stored column by column as .npy files plus a meta.json
+describing the columns. Entries are loaded with memory mapping, so several
+uvicorn workers can share the same entry read-only through the page cache.
+Entries are written to a temporary directory and renamed into place, so a
+worker never sees a half-written entry. When the cache grows beyond its
+size limit, the least recently used entries are evicted.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import numpy as np
+import pandas as pd
+from config import CONFIG, REQUIRED_FIELDS
+from functions.file_parser import COMPRESSED_EXTENSIONS, parse_file_to_dataframe, parse_workbook
+
+# Bump when the on-disk layout or the parser output changes
+CACHE_FORMAT_VERSION = 5
+
+# Size of the chunks read when hashing an upload
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class TableCache:
+    """
+    Content-addressed on-disk cache of parsed DataFrames.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Args:
+            cache_dir (str): Directory holding the cache entries
+            max_bytes (int): Total size above which old entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for(self, buffer, **options):
+        """
+        Compute the cache key of a file and its parse options.
+
+        Args:
+            buffer: Seekable binary file object, rewound after hashing
+            **options: Parse options that change the parsed table
+
+        Returns:
+            str: Hex digest identifying the parsed table
+        """
+        return self.key_from_digest(self.content_digest(buffer), **options)
+
+    def content_digest(self, buffer):
+        """
+        Hash the content of a file.
+
+        Args:
+            buffer: Seekable binary file object, rewound after hashing
+
+        Returns:
+            str: SHA-256 hex digest of the content
+        """
+        digest = hashlib.sha256()
+        buffer.seek(0)
+        for chunk in iter(lambda: buffer.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        buffer.seek(0)
+        return digest.hexdigest()
+
+    def key_from_digest(self, content_digest, **options):
+        """
+        Compute the cache key of an already hashed file and its parse options.
+
+        Args:
+            content_digest (str): Digest from content_digest
+            **options: Parse options that change the parsed table
+
+        Returns:
+            str: Hex digest identifying the parsed table
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            {'version': CACHE_FORMAT_VERSION, **options}, sort_keys=True, default=str
+        ).encode('utf-8'))
+        digest.update(content_digest.encode('ascii'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Load a cached table.
+
+        Args:
+            key (str): Cache key from key_for
+
+        Returns:
+            tuple: (DataFrame, dict) with the table and its parse info,
+                or None on a cache miss
+        """
+        try:
+            df, info = self._load(key)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return df, info
+
+    def reload(self, key, df, info):
+        """
+        Swap a freshly stored table for its memory-mapped entry.
+
+        A miss then returns the same columns as the hits that follow, and
+        the parsed copy can be freed.
+
+        Args:
+            key (str): Cache key the table was stored under
+            df (DataFrame): Parsed table
+            info (dict): Parse information returned with the table
+
+        Returns:
+            tuple: (DataFrame, dict), the stored entry or the parsed table
+                if the entry cannot be read back
+        """
+        try:
+            return self._load(key)
+        except (OSError, ValueError, KeyError):
+            return df, info
+
+    def _load(self, key):
+        """
+        Read a cache entry and mark it as recently used.
+
+        Args:
+            key (str): Cache key from key_for
+
+        Returns:
+            tuple: (DataFrame, dict) with the table and its parse info
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        with open(os.path.join(entry_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        df = _read_columns(entry_dir, meta)
+        # The modification time of meta.json orders entries for eviction
+        os.utime(os.path.join(entry_dir, 'meta.json'))
+        return df, meta['info']
+
+    def put(self, key, df, info):
+        """
+        Store a parsed table.
+
+        Args:
+            key (str): Cache key from key_for
+            df (DataFrame): Parsed table
+            info (dict): Parse information returned with the table
+
+        Returns:
+            bool: True if the table was stored, False if its columns
+                cannot be cached
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        if os.path.exists(entry_dir):
+            return True
+
+        tmp_dir = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            columns = _write_columns(tmp_dir, df)
+            if columns is None:
+                return False
+            meta = {
+                'rows': len(df),
+                'columns': columns,
+                'info': info,
+                'size': _directory_size(tmp_dir)
+            }
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            try:
+                os.rename(tmp_dir, entry_dir)
+            except OSError:
+                # Another worker stored the same table first
+                pass
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self._evict()
+        return True
+
+    def stats(self):
+        """
+        Get cache counters and usage.
+
+        Returns:
+            dict: Hits, misses, evictions, entry count and size in bytes
+        """
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'size_bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes
+        }
+
+    def _entries(self):
+        """
+        List cache entries with their size and last use time.
+
+        Returns:
+            list: (path, size in bytes, last use timestamp) tuples
+        """
+        entries = []
+        for item in os.scandir(self.cache_dir):
+            if item.name.startswith('.') or not item.is_dir():
+                continue
+            meta_path = os.path.join(item.path, 'meta.json')
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    size = json.load(f)['size']
+                entries.append((item.path, size, os.stat(meta_path).st_mtime))
+            except (OSError, ValueError, KeyError):
+                continue
+        return entries
+
+    def _evict(self):
+        """
+        Remove least recently used entries until the cache fits its size limit.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            # Workers that memory-mapped the entry keep their mapping
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def upload_digest(filename, buffer):
+    """
+    Hash a compressed upload as uploaded, before anything is decompressed.
+
+    Args:
+        filename (str): The name of the uploaded file
+        buffer: Seekable binary file object with the upload, rewound
+            after hashing
+
+    Returns:
+        str: SHA-256 hex digest of the upload, or None when the upload is
+            not compressed or caching is disabled
+    """
+    cache = get_table_cache()
+    if cache is None or not filename.lower().endswith(COMPRESSED_EXTENSIONS):
+        return None
+    return cache.content_digest(buffer)
+
+
+def parse_file_cached(filename, buffer, table=None, mandt=None, source_digest=None):
+    """
+    Parse a file buffer, reusing the cached table of an identical upload.
+
+    Args:
+        filename (str): The name of the file
+        buffer: Binary file object with the file content, seekable unless
+            source_digest is given
+        table (str): SAP table key in REQUIRED_FIELDS
+        mandt (str): Only keep rows for this client
+        source_digest (str): Digest of the compressed upload the file was
+            extracted from, from upload_digest. The decompressed stream is
+            then not read just to hash it.
+
+    Returns:
+        tuple: (DataFrame, dict) as returned by parse_file_to_dataframe,
+            with a 'cache' entry set to 'hit', 'miss' or 'disabled'
+    """
+    cache = get_table_cache()
+    if cache is None:
+        df, info = parse_file_to_dataframe(filename, buffer, table=table, mandt=mandt)
+        return df, {**info, 'cache': 'disabled'}
+
+    extension = os.path.splitext(filename.lower())[1]
+    if source_digest is None:
+        key = cache.key_for(buffer, extension=extension, table=table, mandt=mandt)
+    else:
+        key = cache.key_from_digest(
+            source_digest, member=filename, extension=extension, table=table, mandt=mandt
+        )
+    cached = cache.get(key)
+    if cached is not None:
+        df, info = cached
+        print(f"Loaded {filename} from the table cache ({len(df)} rows)")
+        return df, {**info, 'cache': 'hit'}
+
+    df, info = parse_file_to_dataframe(filename, buffer, table=table, mandt=mandt)
+    try:
+        if cache.put(key, df, info):
+            df, info = cache.reload(key, df, info)
+    except OSError as e:
+        print(f"Could not store {filename} in the table cache: {str(e)}")
+    return df, {**info, 'cache': 'miss'}
+
+
+def parse_workbook_cached(filename, buffer, mandt=None):
+    """
+    Parse the SAP table sheets of a workbook, reusing cached tables.
+
+    The workbook is only parsed when at least one of its tables is missing
+    from the cache, and then in a single pass over the file.
+
+    Args:
+        filename (str): The name of the file
+        buffer: Seekable binary file object with the workbook
+        mandt (str): Only keep rows for this client
+
+    Returns:
+        dict: Mapping of table key to a (DataFrame, dict) tuple as returned
+            by parse_workbook, each with a 'cache' entry
+    """
+    cache = get_table_cache()
+    if cache is None:
+        tables = parse_workbook(filename, buffer, mandt=mandt)
+        return {table: (df, {**info, 'cache': 'disabled'}) for table, (df, info) in tables.items()}
+
+    content_digest = cache.content_digest(buffer)
+    keys = {
+        table: cache.key_from_digest(content_digest, workbook=True, table=table, mandt=mandt)
+        for table in REQUIRED_FIELDS
+    }
+    # Tables absent from the workbook are recorded as an empty entry list
+    index_key = cache.key_from_digest(content_digest, workbook=True, mandt=mandt)
+    cached = cache.get(index_key)
+    if cached is not None:
+        tables = {}
+        for table in cached[1]['tables']:
+            entry = cache.get(keys[table])
+            if entry is None:
+                break
+            tables[table] = (entry[0], {**entry[1], 'cache': 'hit'})
+        else:
+            print(f"Loaded workbook {filename} from the table cache")
+            return tables
+
+    tables = parse_workbook(filename, buffer, mandt=mandt)
+    try:
+        for table, (df, info) in tables.items():
+            if cache.put(keys[table], df, info):
+                tables[table] = cache.reload(keys[table], df, info)
+        cache.put(index_key, pd.DataFrame(), {'tables': list(tables)})
+    except OSError as e:
+        print(f"Could not store {filename} in the table cache: {str(e)}")
+    return {table: (df, {**info, 'cache': 'miss'}) for table, (df, info) in tables.items()}
+
+
+def get_table_cache():
+    """
+    Get the process-wide table cache configured in CONFIG.
+
+    Returns:
+        TableCache: Shared cache instance, or None when caching is disabled
+    """
+    global _default_cache
+    if not CONFIG['table_cache_enabled']:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            cache_dir = CONFIG['table_cache_dir'] or os.path.join(
+                tempfile.gettempdir(), 'sap-audit-table-cache'
+            )
+            _default_cache = TableCache(cache_dir, CONFIG['table_cache_max_bytes'])
+    return _default_cache
+
+
+def _write_columns(entry_dir, df):
+    """
+    Write each column of a DataFrame as .npy files.
+
+    Args:
+        entry_dir (str): Entry directory
+        df (DataFrame): Table to store
+
+    Returns:
+        list: Column descriptions for meta.json, or None if a column
+            has an unsupported dtype
+    """
+    if df.columns.has_duplicates:
+        return None
+
+    columns = []
+    for position, name in enumerate(df.columns):
+        series = df.iloc[:, position]
+        base = os.path.join(entry_dir, f"c{position}")
+        dtype = series.dtype
+
+        if isinstance(dtype, pd.CategoricalDtype):
+            np.save(f"{base}.codes.npy", series.cat.codes.to_numpy())
+            column = {'kind': 'category', 'labels': series.cat.categories.tolist()}
+        elif isinstance(dtype, pd.Int32Dtype):
+            np.save(f"{base}.values.npy", series.to_numpy(dtype=np.int32, na_value=0))
+            np.save(f"{base}.mask.npy", series.isna().to_numpy())
+            column = {'kind': 'Int32'}
+        elif dtype == object:
+            codes, uniques = pd.factorize(series, use_na_sentinel=False)
+            labels = uniques.tolist()
+            if not all(isinstance(label, str) for label in labels):
+                return None
+            # Strings are stored as codes, loaded back as a categorical
+            codes = pd.Categorical.from_codes(codes, categories=uniques, validate=False).codes
+            np.save(f"{base}.codes.npy", codes)
+            column = {'kind': 'str', 'labels': labels}
+        elif dtype.kind in 'biuf':
+            np.save(f"{base}.values.npy", series.to_numpy())
+            column = {'kind': 'numpy'}
+        else:
+            return None
+
+        column['name'] = name
+        columns.append(column)
+    return columns
+
+
+def _read_columns(entry_dir, meta):
+    """
+    Rebuild a DataFrame from its memory-mapped .npy columns.
+
+    The columns are not copied: numbers, nullable integers and category
+    codes stay backed by the read-only memory maps. String columns come
+    back as categoricals over their memory-mapped codes, as an object
+    column would hold one private pointer per row.
+
+    Args:
+        entry_dir (str): Entry directory
+        meta (dict): Content of meta.json
+
+    Returns:
+        DataFrame: Cached table
+    """
+    data = {}
+    for position, column in enumerate(meta['columns']):
+        base = os.path.join(entry_dir, f"c{position}")
+        kind = column['kind']
+
+        if kind in ('category', 'str'):
+            codes = np.load(f"{base}.codes.npy", mmap_mode='r')
+            values = pd.Categorical.from_codes(codes, categories=column['labels'], validate=False)
+        elif kind == 'Int32':
+            values = pd.arrays.IntegerArray(
+                np.load(f"{base}.values.npy", mmap_mode='r'),
+                np.load(f"{base}.mask.npy", mmap_mode='r')
+            )
+        else:
+            values = np.load(f"{base}.values.npy", mmap_mode='r')
+
+        data[column['name']] = pd.Series(values, name=column['name'])
+
+    df = pd.DataFrame(data, copy=False)
+    if len(df.columns) == 0:
+        df = pd.DataFrame(index=range(meta['rows']))
+    return df
+
+
+def _directory_size(path):
+    """
+    Compute the total size of the files in a directory.
+
+    Args:
+        path (str): Directory path
+
+    Returns:
+        int: Size in bytes
+    """
+    return sum(item.stat().st_size for item in os.scandir(path) if item.is_file())
@@ -7,20 +7,49 @@ and correlates it with role and authorization data.
 """
 
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from functions.formatters import (
-    format_sap_date, 
-    format_sap_time, 
-    format_user_type,
-    format_boolean_flag,
-    format_sap_datetime
+    format_sap_date_series,
+    format_user_type_series,
+    format_boolean_flag_series,
+    format_sap_datetime_series,
+    map_unique_values
 )
+from functions.role_analyzer import get_user_roles
+from functions.auth_analyzer import get_user_authorization_list
+from functions.user_index import UserIndex
 from config import CONFIG, SAP_MANDT_FIELD, SAP_USER_FIELD
 
+
+class UserRecords(list):
+    """
+    List of user dictionaries that also keeps the columns they were built from.
+    
+    It is returned and serialized as a plain list. The columns hold, aligned
+    with the list, the fields scoring reads for the whole population
+    (client, username, user_type as Series, and initial_password, locked
+    and is_expired as boolean Series), so they are not read back from the
+    dictionaries.
+    """
+    
+    def __init__(self, records, columns):
+        """
+        Args:
+            records (list): User dictionaries
+            columns (dict): One Series per field, with a RangeIndex
+        """
+        super().__init__(records)
+        self.columns = columns
+
+
 def analyze_users(data):
     """
     Analyze user data from the USR02 table.
     
+    Every flag and formatted value is computed for the whole column at once;
+    only the final list of user dictionaries is built row by row.
+    
     Args:
         data (dict): Dictionary containing DataFrames for each loaded table
         
@@ -31,18 +60,6 @@ def analyze_users(data):
     print(f"USR02 DataFrame shape: {data['usr02_df'].shape}")
     print(f"USR02 columns: {data['usr02_df'].columns.tolist()}")
     
-    if 'BNAME' not in data['usr02_df'].columns:
-        print("CRITICAL ERROR: BNAME column not found in USR02 DataFrame!")
-        # Try to find similar columns
-        potential_bname_cols = [col for col in data['usr02_df'].columns if 'NAME' in col or 'USER' in col]
-        if potential_bname_cols:
-            print(f"Potential username columns found: {potential_bname_cols}")
-        
-        # Fall back to the first column for testing
-        if not data['usr02_df'].empty and len(data['usr02_df'].columns) > 0:
-            print(f"First few rows of USR02:")
-            print(data['usr02_df'].head(3).to_string())
-    
     user_analysis = {
         'users': [],
         'stats': {
@@ -55,88 +72,110 @@ def analyze_users(data):
         }
     }
     
+    usr02_df = data['usr02_df']
+    if SAP_USER_FIELD not in usr02_df.columns:
+        print(f"CRITICAL ERROR: {SAP_USER_FIELD} column not found in USR02 DataFrame!")
+        # Try to find similar columns
+        potential_bname_cols = [col for col in usr02_df.columns if 'NAME' in col or 'USER' in col]
+        if potential_bname_cols:
+            print(f"Potential username columns found: {potential_bname_cols}")
+        if not usr02_df.empty and len(usr02_df.columns) > 0:
+            print(f"First few rows of USR02:")
+            print(usr02_df.head(3).to_string())
+        return user_analysis
+    
+    if SAP_MANDT_FIELD not in usr02_df.columns:
+        print(f"Warning: MANDT field ({SAP_MANDT_FIELD}) not found, using default client 000")
+    
     # Get current date for comparison
     today = datetime.now().strftime(CONFIG['sap_date_format'])
     
-    print(f"Processing {len(data['usr02_df'])} users from USR02 table")
-    
-    # Process each user
-    for index, user in data['usr02_df'].iterrows():
-        try:
-            # Get key fields with extensive error handling
-            if SAP_MANDT_FIELD not in user:
-                print(f"Warning: MANDT field ({SAP_MANDT_FIELD}) not found for user at index {index}")
-                client = "000"  # Default client as fallback
-            else:
-                client = user[SAP_MANDT_FIELD]
-            
-            if SAP_USER_FIELD not in user:
-                print(f"Error: Username field ({SAP_USER_FIELD}) not found for user at index {index}")
-                print(f"Available fields: {user.index.tolist()}")
-                continue  # Skip this user
-            
-            username = user[SAP_USER_FIELD]
-            
-            if pd.isna(username) or str(username).strip() == '':
-                print(f"Warning: Empty username at index {index}, skipping")
-                continue
-                
-            print(f"Processing user: {username} (Client: {client})")
-            
-            # Create user data structure
-            user_data = {
-                'client': client,
-                'username': username,
-                'user_type': format_user_type(user.get('USTYP', '')),
-                'locked': format_boolean_flag(user.get('UFLAG', '')),
-                'initial_password': format_boolean_flag(user.get('PWDINITIAL', '')),
-                'validity': {
-                    'from_date': format_sap_date(user.get('GLTGV', '')),
-                    'to_date': format_sap_date(user.get('GLTGB', '')),
-                    'is_expired': _is_date_expired(user.get('GLTGB', ''), today)
-                },
-                'activity': {
-                    'last_login': format_sap_datetime(
-                        user.get('TRDAT', ''), 
-                        user.get('LTIME', '')
-                    ),
-                    'last_password_change': format_sap_datetime(
-                        user.get('PWDLGNDATE', ''), 
-                        user.get('PWDLGNTIME', '')
-                    ),
-                    'first_login': _get_first_login(user)
-                }
+    print(f"Processing {len(usr02_df)} users from USR02 table")
+    
+    # Skip users without a username
+    usernames = usr02_df[SAP_USER_FIELD]
+    has_username = ~(usernames.isna() | (usernames.astype(str).str.strip() == ''))
+    skipped = int((~has_username).sum())
+    if skipped:
+        print(f"Warning: {skipped} rows with an empty username skipped")
+    users = usr02_df[has_username.to_numpy()]
+    
+    def column(field):
+        if field in users.columns:
+            return users[field]
+        return pd.Series('', index=users.index, dtype=object)
+    
+    if SAP_MANDT_FIELD in users.columns:
+        clients = users[SAP_MANDT_FIELD]
+    else:
+        clients = pd.Series('000', index=users.index, dtype=object)
+    user_types = format_user_type_series(column('USTYP'))
+    locked = format_boolean_flag_series(column('UFLAG'))
+    initial_password = format_boolean_flag_series(column('PWDINITIAL'))
+    from_dates = format_sap_date_series(column('GLTGV'))
+    to_dates = format_sap_date_series(column('GLTGB'))
+    expired = get_validity_expired_series(column('GLTGB'), today)
+    last_login = format_sap_datetime_series(column('TRDAT'), column('LTIME'))
+    last_password_change = format_sap_datetime_series(column('PWDLGNDATE'), column('PWDLGNTIME'))
+    first_login = _get_first_login_series(column('PWDLGNDATE'), last_password_change)
+    never_logged_in = map_unique_values(column('TRDAT'), lambda value: bool(pd.isna(value) or value == ''))
+    
+    records = [
+        {
+            'client': client,
+            'username': username,
+            'user_type': user_type,
+            'locked': is_locked,
+            'initial_password': has_initial_password,
+            'validity': {
+                'from_date': from_date,
+                'to_date': to_date,
+                'is_expired': is_expired
+            },
+            'activity': {
+                'last_login': login,
+                'last_password_change': password_change,
+                'first_login': first
             }
-            
-            # Update statistics
-            user_analysis['stats']['total_users'] += 1
-            
-            if user_data['locked'] == 'Yes':
-                user_analysis['stats']['locked_users'] += 1
-                
-            if user_data['validity']['is_expired']:
-                user_analysis['stats']['expired_users'] += 1
-                
-            if user_data['initial_password'] == 'Yes':
-                user_analysis['stats']['initial_password'] += 1
-                
-            if user.get('TRDAT', '') == '' or pd.isna(user.get('TRDAT', '')):
-                user_analysis['stats']['never_logged_in'] += 1
-                
-            # Track user types
-            user_type = user_data['user_type']
-            if user_type in user_analysis['stats']['user_types']:
-                user_analysis['stats']['user_types'][user_type] += 1
-            else:
-                user_analysis['stats']['user_types'][user_type] = 1
-            
-            # Add user data to results
-            user_analysis['users'].append(user_data)
-            
-        except Exception as e:
-            print(f"Error processing user at index {index}: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+        }
+        for (client, username, user_type, is_locked, has_initial_password, from_date,
+             to_date, is_expired, login, password_change, first) in zip(
+            clients.astype(object).tolist(),
+            users[SAP_USER_FIELD].astype(object).tolist(),
+            user_types.tolist(),
+            locked.tolist(),
+            initial_password.tolist(),
+            from_dates.tolist(),
+            to_dates.tolist(),
+            expired.tolist(),
+            last_login.tolist(),
+            last_password_change.tolist(),
+            first_login.tolist()
+        )
+    ]
+    user_analysis['users'] = UserRecords(records, {
+        'client': clients.astype(object).reset_index(drop=True),
+        'username': users[SAP_USER_FIELD].astype(object).reset_index(drop=True),
+        'user_type': user_types.reset_index(drop=True),
+        'initial_password': (initial_password == 'Yes').reset_index(drop=True),
+        'locked': (locked == 'Yes').reset_index(drop=True),
+        'is_expired': expired.astype(bool).reset_index(drop=True)
+    })
+    
+    # Update statistics
+    stats = user_analysis['stats']
+    stats['total_users'] = len(users)
+    stats['locked_users'] = int((locked == 'Yes').sum())
+    stats['expired_users'] = int(expired.astype(bool).sum())
+    stats['initial_password'] = int((initial_password == 'Yes').sum())
+    stats['never_logged_in'] = int(never_logged_in.astype(bool).sum())
+    
+    # Track user types, in order of first appearance
+    type_codes, type_names = pd.factorize(user_types)
+    type_counts = np.bincount(type_codes, minlength=len(type_names))
+    stats['user_types'] = {
+        name: int(count) for name, count in zip(type_names, type_counts)
+    }
     
     print(f"Analysis complete. Found {len(user_analysis['users'])} users")
     print("User types found:", user_analysis['stats']['user_types'])
@@ -156,19 +195,12 @@ def get_user_details(user_data, role_data, auth_data):
     Returns:
         dict: Combined user details
     """
-    # Find user's roles and authorizations
+    # Find user's role assignments and authorizations
     client = user_data['client']
     username = user_data['username']
     
-    user_roles = [
-        role for role in role_data.get('roles', [])
-        if role['client'] == client and role['username'] == username
-    ]
-    
-    user_auths = [
-        auth for auth in auth_data.get('authorizations', [])
-        if auth['client'] == client and auth['username'] == username
-    ]
+    user_roles = get_user_roles(role_data, client, username)
+    user_auths = list(get_user_authorization_list(auth_data, client, username))
     
     # Combine all data
     user_details = {
@@ -179,6 +211,34 @@ def get_user_details(user_data, role_data, auth_data):
     
     return user_details
 
+def index_users(user_analysis):
+    """
+    Index the users of a user analysis by client and username.
+    
+    Args:
+        user_analysis (dict): User analysis results
+        
+    Returns:
+        UserIndex: Positions of each user in user_analysis['users']
+    """
+    users = user_analysis.get('users', [])
+    return UserIndex([user['client'] for user in users], [user['username'] for user in users])
+
+def get_validity_expired_series(to_dates, today=None):
+    """
+    Flag the users whose validity (GLTGB) has ended.
+    
+    Args:
+        to_dates (Series): GLTGB values
+        today (str): Date to compare against in SAP format (defaults to today)
+        
+    Returns:
+        Series: True where the validity has ended, with the index of to_dates
+    """
+    if today is None:
+        today = datetime.now().strftime(CONFIG['sap_date_format'])
+    return map_unique_values(to_dates, lambda value: _is_date_expired(value, today))
+
 def _is_date_expired(date_str, compare_date):
     """
     Check if a date is expired compared to another date.
@@ -206,23 +266,31 @@ def _is_date_expired(date_str, compare_date):
     except (ValueError, TypeError):
         return False
 
-def _get_first_login(user):
+def _get_first_login_series(password_dates, password_changes):
     """
-    Estimate first login date based on available data.
-    This is a best effort since SAP doesn't directly store first login.
+    Estimate first login dates for a column of users.
     
     Args:
-        user (Series): User data row from USR02
+        password_dates (Series): PWDLGNDATE values
+        password_changes (Series): Formatted last password change, as
+            returned by format_sap_datetime_series
         
     Returns:
-        str: Estimated first login or "Not available"
+        Series: Estimated first logins, as _get_first_login returns them
     """
-    # This is a heuristic - SAP doesn't directly store first login
-    # We can use password change date as a proxy in some cases
-    pw_date = user.get('PWDLGNDATE', '')
-    pw_time = user.get('PWDLGNTIME', '')
-    
-    if not pd.isna(pw_date) and str(pw_date).strip() != '':
-        return format_sap_datetime(pw_date, pw_time) + " (estimated from password change)"
+    has_password_date = ~map_unique_values(password_dates, _is_blank).astype(bool)
+    return (password_changes + " (estimated from password change)").where(
+        has_password_date, "Not available"
+    )
+
+def _is_blank(value):
+    """
+    Check whether a field value is missing or empty.
     
-    return "Not available"
\ No newline at end of file
+    Args:
+        value: Field value
+        
+    Returns:
+        bool: True if the value is missing or blank
+    """
+    return bool(pd.isna(value) or str(value).strip() == '')
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+User index module for the SAP User Analysis Tool
+
+This module maps each (client, username) key to the rows it owns in a
+row-oriented result (user list, role assignments, authorization records),
+so the rows of one user are found without scanning the whole result.
+
+Rows are stably sorted by key once; each key stores the range it
+occupies in that order, so a lookup is one hash probe plus a slice.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class UserIndex:
+    """
+    Index of row positions by (client, username).
+
+    Keys are compared as strings, so a client read as 100 and one read as
+    '100' are the same client.
+    """
+
+    def __init__(self, clients, usernames):
+        """
+        Build the index.
+
+        Args:
+            clients (array-like): Client of each row
+            usernames (array-like): Username of each row, aligned with clients
+        """
+        self._build(*factorize_users(clients, usernames))
+
+    @classmethod
+    def from_ids(cls, user_ids, user_keys):
+        """
+        Build the index from user IDs already encoded.
+
+        Args:
+            user_ids (array-like): User ID of each row
+            user_keys (list): (client, username) string key of each user ID
+
+        Returns:
+            UserIndex: Index of the rows
+        """
+        index = cls.__new__(cls)
+        index._build(np.asarray(user_ids), user_keys)
+        return index
+
+    def _build(self, codes, keys):
+        # Stable, so the rows of each key keep their original order
+        self._order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[self._order]
+
+        starts = np.flatnonzero(np.diff(sorted_codes, prepend=-1) != 0)
+        stops = np.append(starts[1:], len(sorted_codes))
+
+        self._ranges = {
+            keys[code]: (start, stop)
+            for code, start, stop in zip(sorted_codes[starts].tolist(), starts.tolist(), stops.tolist())
+        }
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def __contains__(self, key):
+        client, username = key
+        return (str(client), str(username)) in self._ranges
+
+    def keys(self):
+        """
+        Returns:
+            list: (client, username) keys, as strings
+        """
+        return list(self._ranges)
+
+    def positions(self, client, username):
+        """
+        Get the rows of a user.
+
+        Args:
+            client (str): Client ID
+            username (str): Username
+
+        Returns:
+            ndarray: Row positions of the user, in their original order
+                (empty if the user has no row)
+        """
+        start, stop = self._ranges.get((str(client), str(username)), (0, 0))
+        return self._order[start:stop]
+
+
+def factorize_users(clients, usernames):
+    """
+    Encode (client, username) pairs as integer codes.
+
+    Keys are compared as strings, like in UserIndex.
+
+    Args:
+        clients (array-like): Client of each row
+        usernames (array-like): Username of each row, aligned with clients
+
+    Returns:
+        tuple: (codes array, list of (client, username) string keys indexed
+            by code, in order of first appearance)
+    """
+    client_codes, client_keys = _string_codes(clients)
+    user_codes, user_keys = _string_codes(usernames)
+
+    width = max(len(user_keys), 1)
+    codes, pair_codes = pd.factorize(client_codes.astype(np.int64) * width + user_codes)
+    keys = [(client_keys[code // width], user_keys[code % width]) for code in pair_codes.tolist()]
+    return codes, keys
+
+
+def _string_codes(values):
+    """
+    Encode values as integer codes of their string form.
+
+    Args:
+        values (array-like): Values to encode
+
+    Returns:
+        tuple: (codes array, list of distinct strings indexed by code)
+    """
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    # Values with the same string form share a code
+    string_codes, strings = pd.factorize(pd.Series([str(value) for value in uniques], dtype=object))
+    return string_codes[codes], list(strings)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Authorization value index module for the SAP User Analysis Tool
+
+This module answers "which users can access value X of field F of object O"
+(e.g. who can run transaction SU01 through S_TCODE/TCD, who holds company
+code 1000 under F_BKPF_BUK/BUKRS) over the USR12 authorization records.
+
+Each record grants its field either one value (VON), a range of values
+(VON to BIS), or every value starting with a prefix (VON ending with *; a
+bare * or % grants every value). Values are replaced by their rank in the
+sorted vocabulary of all values, and the records of each kind are sorted
+once by (object, field, value rank), so a query is a few binary searches:
+- exact values: the equal range of X;
+- prefixes: one probe per prefix of X (at most len(X) + 1);
+- ranges: the ranges starting at or before X, filtered on their end.
+
+Values are compared as strings, like SAP compares CHAR fields. Only a
+trailing * is a wildcard, as in SAP profiles.
+"""
+
+import numpy as np
+import pandas as pd
+from functions.auth_analyzer import AuthorizationRecords
+
+# Analysis results key holding the index
+VALUE_INDEX_KEY = 'value_index'
+
+# Values granting every value of a field
+FULL_WILDCARDS = ['*', '%']
+
+
+class AuthorizationValueIndex:
+    """
+    Interval-searchable index of the values granted by authorization records.
+
+    Attributes:
+        records (AuthorizationRecords): Indexed records
+        record_count (int): Number of indexed records (records with a value)
+    """
+
+    def __init__(self, records):
+        """
+        Build the index.
+
+        Args:
+            records (AuthorizationRecords): Authorization records
+        """
+        self.records = records
+        columns = records.columns
+
+        # (object, field) groups, by name
+        object_codes, objects = _string_codes(columns['object'])
+        field_codes, fields = _string_codes(columns['field'])
+        self._objects = {name: code for code, name in enumerate(objects)}
+        self._fields = {name: code for code, name in enumerate(fields)}
+        self._field_count = max(len(fields), 1)
+        groups = object_codes.astype(np.int64) * self._field_count + field_codes
+
+        # Records of each object, for conditions on the object alone
+        self._object_order = np.argsort(object_codes, kind='stable')
+        self._object_bounds = np.searchsorted(object_codes[self._object_order], np.arange(len(objects) + 1))
+
+        # Distinct VON and BIS values, normalized once
+        from_codes, from_values = _string_codes(columns['from_value'], _normalize_value)
+        to_codes, to_values = _string_codes(columns['to_value'], _normalize_value)
+        prefixes = [_prefix(value) for value in from_values]
+
+        # Ranks in the sorted vocabulary compare like the values themselves
+        self._vocabulary, ranks = np.unique(
+            np.array(from_values + to_values + prefixes, dtype=object), return_inverse=True
+        )
+        from_ranks = ranks[:len(from_values)][from_codes]
+        to_ranks = ranks[len(from_values):len(from_values) + len(to_values)][to_codes]
+        prefix_ranks = ranks[len(from_values) + len(to_values):][from_codes]
+
+        # Kind of each distinct (VON, BIS) pair
+        pair_codes, pairs = pd.factorize(from_codes.astype(np.int64) * max(len(to_values), 1) + to_codes)
+        pair_kinds = np.array([
+            _value_kind(from_values[pair // max(len(to_values), 1)], to_values[pair % max(len(to_values), 1)])
+            for pair in pairs.tolist()
+        ] + ['none'], dtype=object)
+        kinds = pair_kinds[pair_codes]
+
+        self._exact = _SortedValues(groups, from_ranks, kinds == 'exact')
+        self._prefix = _SortedValues(groups, prefix_ranks, kinds == 'prefix')
+        self._range = _SortedValues(groups, from_ranks, kinds == 'range', to_ranks)
+        self.record_count = int((kinds != 'none').sum())
+
+    def positions(self, object_name, field, value):
+        """
+        Get the records granting a value.
+
+        Args:
+            object_name (str): Authorization object (e.g. S_TCODE)
+            field (str): Authorization field (e.g. TCD)
+            value (str): Value checked (e.g. SU01)
+
+        Returns:
+            ndarray: Positions of the records granting the value, in order
+        """
+        object_code = self._objects.get(str(object_name))
+        field_code = self._fields.get(str(field))
+        if object_code is None or field_code is None:
+            return np.zeros(0, dtype=np.int64)
+        group = object_code * self._field_count + field_code
+        value = str(value).strip()
+
+        matches = [self._exact.equal(group, self._rank(value))]
+        matches += [self._prefix.equal(group, self._rank(value[:length])) for length in range(len(value) + 1)]
+        # Ranges starting at or before the value, ending at or after it
+        matches.append(self._range.containing(
+            group,
+            np.searchsorted(self._vocabulary, value, 'right'),
+            np.searchsorted(self._vocabulary, value, 'left')
+        ))
+        return np.unique(np.concatenate(matches))
+
+    def object_positions(self, object_name):
+        """
+        Get the records of an authorization object, whatever their values.
+
+        Args:
+            object_name (str): Authorization object (e.g. S_ADMI_FCD)
+
+        Returns:
+            ndarray: Positions of the records of the object, in order
+        """
+        object_code = self._objects.get(str(object_name))
+        if object_code is None:
+            return np.zeros(0, dtype=np.int64)
+        return self._object_order[self._object_bounds[object_code]:self._object_bounds[object_code + 1]]
+
+    def _rank(self, value):
+        """
+        Get the rank of a value in the vocabulary, -1 if it is not in it.
+        """
+        rank = np.searchsorted(self._vocabulary, value, 'left')
+        if rank < len(self._vocabulary) and self._vocabulary[rank] == value:
+            return rank
+        return -1
+
+
+class _SortedValues:
+    """
+    Records of one kind sorted by (group, value rank).
+    """
+
+    def __init__(self, groups, ranks, mask, ends=None):
+        """
+        Args:
+            groups (ndarray): (object, field) group of each record
+            ranks (ndarray): Rank of the value (or range start, or prefix)
+                of each record
+            mask (ndarray): Records of this kind
+            ends (ndarray): Rank of the range end of each record, for ranges
+        """
+        positions = np.flatnonzero(mask)
+        # Stable, so the records of each value keep their original order
+        order = np.lexsort((ranks[positions], groups[positions]))
+        self.positions = positions[order]
+        self.groups = groups[self.positions]
+        self.ranks = ranks[self.positions]
+        self.ends = None if ends is None else ends[self.positions]
+
+    def _group_bounds(self, group):
+        return np.searchsorted(self.groups, group, 'left'), np.searchsorted(self.groups, group, 'right')
+
+    def equal(self, group, rank):
+        """
+        Returns:
+            ndarray: Positions of the records of a group with a value rank
+        """
+        start, stop = self._group_bounds(group)
+        ranks = self.ranks[start:stop]
+        return self.positions[start + np.searchsorted(ranks, rank, 'left'):start + np.searchsorted(ranks, rank, 'right')]
+
+    def containing(self, group, start_bound, end_bound):
+        """
+        Returns:
+            ndarray: Positions of the ranges of a group starting below the
+                start_bound rank and ending at or after the end_bound rank
+        """
+        start, stop = self._group_bounds(group)
+        stop = start + np.searchsorted(self.ranks[start:stop], start_bound, 'left')
+        return self.positions[start:stop][self.ends[start:stop] >= end_bound]
+
+
+def get_value_index(auth_analysis):
+    """
+    Get the value index of an authorization analysis, building it on first use.
+
+    Args:
+        auth_analysis (dict): Authorization analysis results
+
+    Returns:
+        AuthorizationValueIndex: Index of the analysis authorizations
+    """
+    index = auth_analysis.get(VALUE_INDEX_KEY)
+    if index is None:
+        records = auth_analysis.get('authorizations', [])
+        if not isinstance(records, AuthorizationRecords):
+            records = AuthorizationRecords({
+                field: pd.Series([auth[field] for auth in records], dtype=object)
+                for field in AuthorizationRecords.FIELDS
+            })
+        index = AuthorizationValueIndex(records)
+        auth_analysis[VALUE_INDEX_KEY] = index
+    return index
+
+
+def get_users_with_access(auth_analysis, object_name, field, value):
+    """
+    Find the users whose authorizations grant a value.
+
+    Args:
+        auth_analysis (dict): Authorization analysis results
+        object_name (str): Authorization object (e.g. S_TCODE)
+        field (str): Authorization field (e.g. TCD)
+        value (str): Value checked (e.g. SU01)
+
+    Returns:
+        dict: The query, the user 'count' and the 'users' (client,
+            username and the granting from_value/to_value of each user),
+            in order of first granting record
+    """
+    index = get_value_index(auth_analysis)
+    granting = index.records.take(index.positions(object_name, field, value))
+
+    users = {}
+    for client, username, from_value, to_value in zip(
+        granting.columns['client'].tolist(),
+        granting.columns['username'].tolist(),
+        granting.columns['from_value'].tolist(),
+        granting.columns['to_value'].tolist()
+    ):
+        user = users.setdefault((str(client), str(username)), {
+            'client': client,
+            'username': username,
+            'grants': []
+        })
+        user['grants'].append({
+            'from_value': None if pd.isna(from_value) else from_value,
+            'to_value': None if pd.isna(to_value) else to_value
+        })
+
+    return {
+        'object': object_name,
+        'field': field,
+        'value': value,
+        'count': len(users),
+        'users': list(users.values())
+    }
+
+
+def _string_codes(values, normalize=str):
+    """
+    Encode values as integer codes of their (normalized) string form.
+
+    Args:
+        values (Series): Values to encode
+        normalize (callable): Function turning a value into a string
+
+    Returns:
+        tuple: (codes array, list of distinct strings indexed by code)
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    # Values with the same string form share a code
+    string_codes, strings = pd.factorize(pd.Series([normalize(value) for value in uniques], dtype=object))
+    return string_codes[codes], list(strings)
+
+
+def _normalize_value(value):
+    """
+    Normalize an authorization value to a stripped string, '' when missing.
+    """
+    if pd.isna(value):
+        return ''
+    return str(value).strip()
+
+
+def _value_kind(from_value, to_value):
+    """
+    Classify the values granted by a record.
+
+    Args:
+        from_value (str): Normalized VON value
+        to_value (str): Normalized BIS value
+
+    Returns:
+        str: 'prefix' for a trailing * (or a bare * or %), 'range' for a
+            BIS different from VON, 'exact' for a single value and 'none'
+            for a record without a value
+    """
+    if not from_value:
+        return 'none'
+    if from_value in FULL_WILDCARDS or from_value.endswith('*'):
+        return 'prefix'
+    if to_value and to_value != from_value:
+        return 'range'
+    return 'exact'
+
+
+def _prefix(from_value):
+    """
+    Get the prefix granted by a VON pattern ('' for every value).
+    """
+    if from_value in FULL_WILDCARDS:
+        return ''
+    return from_value[:-1]
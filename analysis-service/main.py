@@ -1,10 +1,14 @@
+import asyncio
 import io
 import json
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from fastapi import APIRouter, FastAPI, File, Form, UploadFile, HTTPException
+from fastapi import APIRouter, FastAPI, File, Form, Query, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import pandas as pd
@@ -25,10 +29,23 @@ from models.models import DateRangeFilter
 
 # Import functions from the new structure
 from functions.data_loader import load_data, validate_data
-from functions.user_analyzer import analyze_users, get_user_details
+from functions.user_analyzer import analyze_users, get_user_details, index_users
 from functions.auth_analyzer import analyze_authorizations, get_user_authorizations
 from functions.role_analyzer import analyze_roles, get_user_roles
-from functions.report_generator import generate_report, output_report
+from functions.sod_analyzer import analyze_sod
+from functions.cross_analyzer import analyze_cross
+from functions.value_index import get_users_with_access
+from functions.critical_access import analyze_critical_access
+from functions.role_hierarchy import expand_composite_roles
+from functions.role_mining import analyze_role_mining
+from functions.redundant_roles import analyze_redundant_roles
+from functions.effective_auth import (
+    EFFECTIVE_AUTH_KEY, EffectiveAuthorizations, build_effective_authorizations, get_role_users_with_access
+)
+from functions.report_generator import generate_report, output_report, USER_REPORT_FIELDS
+from functions.file_parser import open_upload, open_table_upload, open_archive_tables, is_supported_upload
+from functions.table_cache import get_table_cache, parse_file_cached, parse_workbook_cached, upload_digest
+from config import CONFIG
 
 # Keep any legacy imports that might still be needed
 # Since role_analyzer.py is empty (0 bytes) according to the listing, we can't import from it yet
@@ -82,6 +99,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bounded pool for file parsing; pandas parsing releases the GIL in C code
+parse_executor = ThreadPoolExecutor(max_workers=CONFIG['parse_workers'], thread_name_prefix="parse")
+
 # Storage for analyses
 analyses = {
     "agr_users": {},
@@ -96,37 +116,12 @@ async def analyze_agr_users_file(file: UploadFile = File(...), date_range: Optio
     Analyse un fichier d'extraction de la table AGR_USERS
     """
     # Vérifier le type de fichier
-    if not file.filename.endswith(('.csv', '.txt', '.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Le fichier doit être au format CSV, TXT ou Excel")
-    
-    # Lire le fichier
-    contents = await file.read()
-    buffer = BytesIO(contents)
+    if not is_supported_upload(file.filename):
+        raise HTTPException(status_code=400, detail="Le fichier doit être au format CSV, TXT ou Excel (éventuellement compressé en GZ, BZ2 ou ZIP)")
     
     try:
-        # Essayer différents formats d'importation
-        try:
-            if file.filename.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(buffer)
-            else:
-                # Essayer avec différents délimiteurs
-                for delimiter in [',', ';', '\t', '|']:
-                    buffer.seek(0)
-                    try:
-                        df = pd.read_csv(buffer, delimiter=delimiter, encoding='utf-8')
-                        if len(df.columns) > 1:
-                            break
-                    except:
-                        continue
-        except Exception as e:
-            # Dernière tentative avec des options plus flexibles
-            buffer.seek(0)
-            df = pd.read_csv(
-                buffer, 
-                sep=None, 
-                engine='python',
-                encoding_errors='replace'
-            )
+        # Lire le fichier sans le charger entièrement en mémoire
+        df, _ = await parse_upload(file, 'agr_users')
         
         # Standardiser les noms de colonnes
         df.columns = [col.upper() for col in df.columns]
@@ -199,20 +194,52 @@ async def integrate_data(
     agr_users_file: UploadFile = File(None), 
     usr02_file: UploadFile = File(None),
     ust12_file: UploadFile = File(None),
-    date_range: Optional[str] = Form(None)
+    workbook_file: UploadFile = File(None),
+    archive_file: UploadFile = File(None),
+    agr_1251_file: UploadFile = File(None),
+    agr_agrs_file: UploadFile = File(None),
+    date_range: Optional[str] = Form(None),
+    mandt: Optional[str] = Form(None),
+    user_fields: Optional[str] = Form(None)
 ):
     """
     Intègre et analyse les données de plusieurs tables SAP
+    
+    Les trois tables peuvent être envoyées séparément, ensemble dans un
+    classeur Excel (workbook_file) avec une feuille par table, ou ensemble
+    dans une archive ZIP (archive_file) avec un fichier par table. Les
+    fichiers séparés peuvent être compressés en GZ, BZ2 ou ZIP.
+    
+    La table AGR_1251 (valeurs d'autorisation des rôles) est optionnelle :
+    envoyée seule (agr_1251_file) ou dans le classeur / l'archive, elle
+    ajoute les autorisations reçues via les rôles actifs aux analyses de
+    risque et d'accès critiques. La table AGR_AGRS (rôles composites) est
+    également optionnelle : les affectations de rôles composites y sont
+    développées en rôles simples avant les analyses.
+    
+    user_fields limite les champs renvoyés pour chaque utilisateur (liste
+    séparée par des virgules parmi details, roles, authorizations et
+    risk_score) ; le détail complet d'un utilisateur reste disponible via
+    /api/integrated-analysis/{id}/users/{client}/{username}.
     """
-    print(f"Received integration request with files: {agr_users_file}, {usr02_file}, {ust12_file}")
+    print(f"Received integration request with files: {agr_users_file}, {usr02_file}, {ust12_file}, {workbook_file}, {archive_file}, {agr_1251_file}, {agr_agrs_file}")
     
-    if not agr_users_file or not usr02_file or not ust12_file:
+    if workbook_file:
+        if not workbook_file.filename.lower().endswith('.xlsx'):
+            raise HTTPException(status_code=400, detail=f"Le classeur {workbook_file.filename} doit être au format XLSX")
+    elif archive_file:
+        if not archive_file.filename.lower().endswith('.zip'):
+            raise HTTPException(status_code=400, detail=f"L'archive {archive_file.filename} doit être au format ZIP")
+    elif not agr_users_file or not usr02_file or not ust12_file:
         raise HTTPException(status_code=400, detail="Veuillez fournir les trois fichiers : agr_user, usr02, et ust12")
-    
-    # Vérifier le type des fichiers
-    for file in [agr_users_file, usr02_file, ust12_file]:
-        if not file.filename.endswith(('.csv', '.txt', '.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail=f"Le fichier {file.filename} doit être au format CSV, TXT ou Excel")
+    else:
+        # Vérifier le type des fichiers
+        for file in [agr_users_file, usr02_file, ust12_file]:
+            if not is_supported_upload(file.filename):
+                raise HTTPException(status_code=400, detail=f"Le fichier {file.filename} doit être au format CSV, TXT ou Excel (éventuellement compressé en GZ, BZ2 ou ZIP)")
+    for file in [agr_1251_file, agr_agrs_file]:
+        if file and not is_supported_upload(file.filename):
+            raise HTTPException(status_code=400, detail=f"Le fichier {file.filename} doit être au format CSV, TXT ou Excel (éventuellement compressé en GZ, BZ2 ou ZIP)")
     
     # Parse date range if provided
     date_range_filter = None
@@ -223,17 +250,50 @@ async def integrate_data(
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="Format de plage de dates invalide")
     
+    # Parse the requested user fields if provided
+    requested_user_fields = None
+    if user_fields:
+        requested_user_fields = [field.strip() for field in user_fields.split(',') if field.strip()]
+        unknown = [field for field in requested_user_fields if field not in USER_REPORT_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Champs utilisateur inconnus: {', '.join(unknown)}")
+    
     try:
-        # Read all files
-        agr_users_content = await agr_users_file.read()
-        usr02_content = await usr02_file.read()
-        ust12_content = await ust12_file.read()
-        
-        # Parse the files into DataFrames
+        # Parse the files into DataFrames straight from the spooled uploads
         try:
-            agr_users_df = parse_file_to_dataframe(agr_users_file.filename, BytesIO(agr_users_content))
-            usr02_df = parse_file_to_dataframe(usr02_file.filename, BytesIO(usr02_content))
-            ust12_df = parse_file_to_dataframe(ust12_file.filename, BytesIO(ust12_content))
+            parse_started = time.perf_counter()
+            if workbook_file or archive_file:
+                if workbook_file:
+                    tables = await parse_workbook_upload(workbook_file, mandt)
+                else:
+                    tables = await parse_archive_upload(archive_file, mandt)
+                missing = [table.upper() for table in ('agr_users', 'usr02', 'usr12') if table not in tables]
+                if missing:
+                    source = (workbook_file or archive_file).filename
+                    raise Exception(f"{source} has no sheet or file for: {', '.join(missing)}")
+                agr_users_df, agr_users_dialect = tables['agr_users']
+                usr02_df, usr02_dialect = tables['usr02']
+                ust12_df, ust12_dialect = tables['usr12']
+                agr_1251_df, agr_1251_dialect = tables.get('agr_1251', (None, None))
+                agr_agrs_df, agr_agrs_dialect = tables.get('agr_agrs', (None, None))
+            else:
+                uploads = [
+                    parse_upload(agr_users_file, 'agr_users', mandt),
+                    parse_upload(usr02_file, 'usr02', mandt),
+                    parse_upload(ust12_file, 'usr12', mandt)
+                ]
+                optional = [(table, file) for table, file in [('agr_1251', agr_1251_file), ('agr_agrs', agr_agrs_file)] if file]
+                uploads += [parse_upload(file, table, mandt) for table, file in optional]
+                parsed = await asyncio.gather(*uploads)
+                (
+                    (agr_users_df, agr_users_dialect),
+                    (usr02_df, usr02_dialect),
+                    (ust12_df, ust12_dialect)
+                ) = parsed[:3]
+                optional_tables = dict(zip([table for table, _ in optional], parsed[3:]))
+                agr_1251_df, agr_1251_dialect = optional_tables.get('agr_1251', (None, None))
+                agr_agrs_df, agr_agrs_dialect = optional_tables.get('agr_agrs', (None, None))
+            parse_seconds = time.perf_counter() - parse_started
         except Exception as e:
             # Return a structured error response
             analysis_id = str(uuid.uuid4())
@@ -274,14 +334,30 @@ async def integrate_data(
             'usr02_df': usr02_df,
             'usr12_df': ust12_df  # Map UST12 to USR12 as expected by the analysis functions
         }
+        if agr_1251_df is not None:
+            print("AGR_1251 columns:", agr_1251_df.columns.tolist())
+            agr_1251_df.columns = [col.upper() for col in agr_1251_df.columns]
+            data['agr_1251_df'] = agr_1251_df
+        if agr_agrs_df is not None:
+            print("AGR_AGRS columns:", agr_agrs_df.columns.tolist())
+            agr_agrs_df.columns = [col.upper() for col in agr_agrs_df.columns]
+            data['agr_agrs_df'] = agr_agrs_df
         
         # Validate the data with error handling
         validation_errors = {}
-        try:
-            validate_data(data)
-        except ValueError as e:
-            validation_errors["validation_error"] = str(e)
-            print(f"Validation error: {e}")
+        validation_report = validate_data(data)
+        if validation_report['errors']:
+            validation_errors["validation_error"] = ", ".join(validation_report['errors'])
+            print(f"Validation error: {validation_errors['validation_error']}")
+        
+        # Composite role assignments become assignments of their single roles
+        composite_roles = None
+        if agr_agrs_df is not None:
+            try:
+                composite_roles = expand_composite_roles(data)
+            except Exception as e:
+                validation_errors["composite_role_error"] = str(e)
+                print(f"Composite role expansion error: {e}")
         
         # Import the config
         from config import CONFIG
@@ -308,12 +384,60 @@ async def integrate_data(
             validation_errors["auth_analysis_error"] = str(e)
             print(f"Authorization analysis error: {e}")
         
+        # Authorizations received through the roles, when AGR_1251 was sent
+        if agr_1251_df is not None and "error" not in role_analysis and "error" not in auth_analysis:
+            try:
+                effective = build_effective_authorizations(data, role_analysis)
+                if effective is not None:
+                    auth_analysis[EFFECTIVE_AUTH_KEY] = effective
+            except Exception as e:
+                validation_errors["effective_authorization_error"] = str(e)
+                print(f"Effective authorization error: {e}")
+        
+        try:
+            sod_analysis = analyze_sod(role_analysis, auth_analysis)
+        except Exception as e:
+            sod_analysis = {"error": str(e)}
+            validation_errors["sod_analysis_error"] = str(e)
+            print(f"SoD analysis error: {e}")
+        
+        try:
+            critical_access = analyze_critical_access(auth_analysis)
+        except Exception as e:
+            critical_access = {"error": str(e), "rule_count": 0, "matched_rules": 0, "user_count": 0, "rules": []}
+            validation_errors["critical_access_error"] = str(e)
+            print(f"Critical access analysis error: {e}")
+        
         # Generate the integrated report
-        report = generate_report(user_analysis, role_analysis, auth_analysis, CONFIG)
+        report = generate_report(
+            user_analysis, role_analysis, auth_analysis, CONFIG, requested_user_fields, critical_access
+        )
+        
+        try:
+            report["crossAnalysis"] = jsonable_encoder(analyze_cross(data, sod_analysis))
+        except Exception as e:
+            report["crossAnalysis"] = {"segregationOfDutiesIssues": jsonable_encoder(sod_analysis)}
+            validation_errors["cross_analysis_error"] = str(e)
+            print(f"Cross analysis error: {e}")
+        
+        try:
+            report["roleMining"] = jsonable_encoder(analyze_role_mining(role_analysis))
+        except Exception as e:
+            report["roleMining"] = {"error": str(e)}
+            validation_errors["role_mining_error"] = str(e)
+            print(f"Role mining error: {e}")
+        
+        try:
+            report["redundantRoles"] = jsonable_encoder(analyze_redundant_roles(role_analysis))
+        except Exception as e:
+            report["redundantRoles"] = {"error": str(e)}
+            validation_errors["redundant_roles_error"] = str(e)
+            print(f"Redundant roles error: {e}")
         
         # Add validation errors to the report if any
         if validation_errors:
             report["validation_errors"] = validation_errors
+        report["validation_report"] = validation_report
         
         # Add column information to help with debugging, including both original and standardized columns
         report["file_info"] = {
@@ -323,6 +447,17 @@ async def integrate_data(
             "agr_users_standardized": agr_users_df.columns.tolist(),
             "usr02_standardized": usr02_df.columns.tolist(),
             "ust12_standardized": ust12_df.columns.tolist(),
+            "dialects": {
+                "agr_users": agr_users_dialect,
+                "usr02": usr02_dialect,
+                "ust12": ust12_dialect
+            },
+            "timings": {
+                "agr_users_parse_seconds": agr_users_dialect['parse_seconds'],
+                "usr02_parse_seconds": usr02_dialect['parse_seconds'],
+                "ust12_parse_seconds": ust12_dialect['parse_seconds'],
+                "total_parse_seconds": round(parse_seconds, 3)
+            },
             "data_summary": {
                 "agr_users_rows": len(agr_users_df),
                 "usr02_rows": len(usr02_df),
@@ -331,11 +466,31 @@ async def integrate_data(
                 "role_count": len(role_analysis.get('roles', [])),
             }
         }
-        
-        # Generate a unique analysis ID and store the results
+        if agr_1251_df is not None:
+            report["file_info"]["agr_1251_standardized"] = agr_1251_df.columns.tolist()
+            report["file_info"]["dialects"]["agr_1251"] = agr_1251_dialect
+            report["file_info"]["timings"]["agr_1251_parse_seconds"] = agr_1251_dialect['parse_seconds']
+            report["file_info"]["data_summary"]["agr_1251_rows"] = len(agr_1251_df)
+        if agr_agrs_df is not None:
+            report["file_info"]["agr_agrs_standardized"] = agr_agrs_df.columns.tolist()
+            report["file_info"]["dialects"]["agr_agrs"] = agr_agrs_dialect
+            report["file_info"]["timings"]["agr_agrs_parse_seconds"] = agr_agrs_dialect['parse_seconds']
+            report["file_info"]["data_summary"]["agr_agrs_rows"] = len(agr_agrs_df)
+            if composite_roles is not None:
+                report["file_info"]["data_summary"]["composite_roles"] = composite_roles
+        
+        # Generate a unique analysis ID and store the results, with the
+        # analyses and their user indexes for per-user drill-downs
         analysis_id = str(uuid.uuid4())
         analyses["integrated"][analysis_id] = {
             "report": report,
+            "user_analysis": user_analysis,
+            "user_index": index_users(user_analysis),
+            "role_analysis": role_analysis,
+            "auth_analysis": auth_analysis,
+            "sod_analysis": sod_analysis,
+            "critical_access": critical_access,
+            "user_fields": requested_user_fields,
             "timestamp": datetime.now().isoformat()
         }
         
@@ -378,86 +533,101 @@ async def integrate_data(
             "report": error_report
         }
 
-def parse_file_to_dataframe(filename, buffer):
+async def parse_upload(file, table, mandt=None):
     """
-    Parse a file buffer into a pandas DataFrame.
+    Parse an uploaded file on the parse worker pool.
+    
+    Compressed uploads are decompressed while they are parsed; a zip
+    archive holding several tables contributes the file named after the
+    requested table.
     
     Args:
-        filename (str): The name of the file
-        buffer (BytesIO): File content buffer
+        file (UploadFile): Uploaded file
+        table (str): SAP table key in REQUIRED_FIELDS
+        mandt (str): Only keep rows for this client
         
     Returns:
-        DataFrame: Parsed data
+        tuple: (DataFrame, dict) with the parsed data and the parse info,
+            including the time spent parsing in 'parse_seconds'
     """
-    print(f"Attempting to parse file: {filename}")
+    def parse():
+        upload = open_upload(file)
+        source_digest = upload_digest(file.filename, upload)
+        filename, buffer = open_table_upload(file.filename, upload, table)
+        return parse_timed(filename, buffer, table, mandt, source_digest)
     
-    try:
-        if filename.endswith(('.xlsx', '.xls')):
-            print(f"Parsing Excel file: {filename}")
-            try:
-                # Try with default options first
-                df = pd.read_excel(buffer)
-                print(f"Successfully parsed Excel file with {len(df)} rows and {len(df.columns)} columns")
-                return df
-            except Exception as e:
-                print(f"Error with default Excel parsing: {str(e)}")
-                # Try with explicit engine
-                buffer.seek(0)
-                df = pd.read_excel(buffer, engine='openpyxl')
-                print(f"Successfully parsed Excel file with openpyxl engine: {len(df)} rows")
-                return df
-        
-        # For CSV files, try multiple approaches with different encodings and separators
-        print(f"Parsing CSV-like file: {filename}")
-        
-        # Try common encodings
-        encodings = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
-        
-        # Try different delimiters for CSV files
-        for encoding in encodings:
-            for delimiter in [',', ';', '\t', '|']:
-                buffer.seek(0)
-                try:
-                    print(f"Trying with encoding {encoding} and delimiter '{delimiter}'")
-                    df = pd.read_csv(buffer, delimiter=delimiter, encoding=encoding)
-                    if len(df.columns) > 1:
-                            print(f"Successfully parsed with encoding {encoding} and delimiter '{delimiter}': {len(df)} rows")
-                    return df
-                except Exception as e:
-                        print(f"Failed with encoding {encoding} and delimiter '{delimiter}': {str(e)}")
-                        continue
-        
-        # Last attempt with more flexible options
-        print("Trying with python engine and automatic delimiter detection")
-        buffer.seek(0)
-        df = pd.read_csv(
-            buffer, 
-            sep=None, 
-            engine='python',
-            encoding_errors='replace'
-        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(parse_executor, parse)
+
+async def parse_archive_upload(file, mandt=None):
+    """
+    Parse the SAP tables of an uploaded zip archive on the parse worker pool.
+    
+    Members are routed to tables by file name (USR02, AGR_USERS,
+    USR12/UST12, AGR_1251, AGR_AGRS) and parsed concurrently, each decompressed as it is read.
+    
+    Args:
+        file (UploadFile): Uploaded .zip archive
+        mandt (str): Only keep rows for this client
         
-        if len(df) > 0:
-            print(f"Successfully parsed with flexible options: {len(df)} rows and {len(df.columns)} columns")
-            return df
-        else:
-            raise Exception(f"Parsed file contains no data rows")
-    except Exception as e:
-        print(f"All parsing attempts failed for {filename}: {str(e)}")
-        # Make one final attempt with read_fwf for fixed-width files
-        try:
-            buffer.seek(0)
-            df = pd.read_fwf(buffer, encoding_errors='replace')
-            if len(df) > 0:
-                print(f"Successfully parsed as fixed-width file: {len(df)} rows")
-                return df
-        except Exception as fw_error:
-            print(f"Fixed-width parsing also failed: {str(fw_error)}")
+    Returns:
+        dict: Mapping of table key to a (DataFrame, dict) tuple as returned
+            by parse_upload
+    """
+    def open_members():
+        upload = open_upload(file)
+        return upload_digest(file.filename, upload), open_archive_tables(file.filename, upload)
+    
+    loop = asyncio.get_running_loop()
+    source_digest, members = await loop.run_in_executor(parse_executor, open_members)
+    parsed = await asyncio.gather(*(
+        loop.run_in_executor(parse_executor, parse_timed, filename, buffer, table, mandt, source_digest)
+        for table, (filename, buffer) in members.items()
+    ))
+    return dict(zip(members, parsed))
+
+def parse_timed(filename, buffer, table, mandt=None, source_digest=None):
+    """
+    Parse a file through the table cache and record the time it took.
+    
+    Args:
+        filename (str): The name of the file
+        buffer: Binary file object with the file content
+        table (str): SAP table key in REQUIRED_FIELDS
+        mandt (str): Only keep rows for this client
+        source_digest (str): Digest of the compressed upload holding the file
+        
+    Returns:
+        tuple: (DataFrame, dict) with the parse info and 'parse_seconds'
+    """
+    started = time.perf_counter()
+    df, info = parse_file_cached(filename, buffer, table=table, mandt=mandt, source_digest=source_digest)
+    return df, {**info, 'parse_seconds': round(time.perf_counter() - started, 3)}
+
+async def parse_workbook_upload(file, mandt=None):
+    """
+    Parse the SAP table sheets of an uploaded workbook on the parse worker pool.
+    
+    Args:
+        file (UploadFile): Uploaded .xlsx workbook
+        mandt (str): Only keep rows for this client
         
-        raise Exception(f"Could not parse file {filename}: {str(e)}")
+    Returns:
+        dict: Mapping of table key to a (DataFrame, dict) tuple. The sheets
+            are read in one pass, so each table reports the time of the
+            whole pass in 'parse_seconds'.
+    """
+    def parse():
+        started = time.perf_counter()
+        tables = parse_workbook_cached(file.filename, open_upload(file), mandt=mandt)
+        elapsed = round(time.perf_counter() - started, 3)
+        return {
+            table: (df, {**info, 'parse_seconds': elapsed})
+            for table, (df, info) in tables.items()
+        }
     
-    # If we get here without returning a DataFrame, something went wrong
-    raise Exception(f"Could not parse file {filename} with any available method")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(parse_executor, parse)
 
 @app.get("/api/integrated-analysis/{analysis_id}")
 async def get_integrated_analysis(analysis_id: str):
@@ -473,16 +643,184 @@ async def get_integrated_analysis(analysis_id: str):
         "report": analyses["integrated"][analysis_id].get("report", {})
     }
 
+@app.get("/api/integrated-analysis/{analysis_id}/users/{client}/{username}")
+async def get_integrated_analysis_user(analysis_id: str, client: str, username: str):
+    """
+    Retrieve the details, roles and authorizations of one user of a
+    completed integrated analysis
+    """
+    if analysis_id not in analyses["integrated"]:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    
+    stored = analyses["integrated"][analysis_id]
+    if "user_index" not in stored:
+        raise HTTPException(status_code=404, detail="Détails utilisateur non disponibles pour cette analyse")
+    
+    users = stored["user_analysis"].get("users", [])
+    positions = stored["user_index"].positions(client, username)
+    user_data = users[positions[0]] if len(positions) else {"client": client, "username": username}
+    
+    user_details = get_user_details(user_data, stored["role_analysis"], stored["auth_analysis"])
+    if not len(positions) and not user_details["roles"] and not user_details["authorizations"]:
+        raise HTTPException(status_code=404, detail=f"Utilisateur {client}/{username} non trouvé")
+    
+    response = {
+        "analysis_id": analysis_id,
+        "timestamp": stored.get("timestamp", ""),
+        "in_usr02": bool(len(positions)),
+        "user": user_details
+    }
+    effective = stored["auth_analysis"].get(EFFECTIVE_AUTH_KEY)
+    if effective is not None:
+        response["role_authorizations"] = jsonable_encoder(effective.user_authorizations(client, username))
+    return response
+
+@app.get("/api/integrated-analysis/{analysis_id}/access")
+async def get_integrated_analysis_access(
+    analysis_id: str,
+    auth_object: str = Query(..., alias="object"),
+    field: str = Query(...),
+    value: str = Query(...)
+):
+    """
+    Retrieve the users of a completed integrated analysis whose
+    authorizations grant a value (e.g. object=S_TCODE, field=TCD, value=SU01)
+    """
+    if analysis_id not in analyses["integrated"]:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    if not value.strip():
+        raise HTTPException(status_code=400, detail="La valeur recherchée ne peut pas être vide")
+    
+    stored = analyses["integrated"][analysis_id]
+    auth_analysis = stored.get("auth_analysis", {})
+    if "error" in auth_analysis:
+        raise HTTPException(status_code=404, detail="Autorisations non disponibles pour cette analyse")
+    
+    # The value index is built on the first query, off the event loop
+    loop = asyncio.get_running_loop()
+    access = await loop.run_in_executor(
+        parse_executor, get_users_with_access, auth_analysis, auth_object, field, value
+    )
+    
+    response = {
+        "analysis_id": analysis_id,
+        "timestamp": stored.get("timestamp", ""),
+        "access": jsonable_encoder(access)
+    }
+    effective = auth_analysis.get(EFFECTIVE_AUTH_KEY)
+    if effective is not None:
+        response["role_access"] = jsonable_encoder(
+            get_role_users_with_access(effective, auth_object, field, value)
+        )
+    return response
+
+@app.get("/api/integrated-analysis/{analysis_id}/role-mining")
+async def get_integrated_analysis_role_mining(
+    analysis_id: str,
+    threshold: Optional[float] = Query(None, gt=0, le=1)
+):
+    """
+    Cluster the users of a completed integrated analysis by the similarity
+    of their active role sets, with a Jaccard threshold other than the
+    configured one (role_mining_threshold)
+    """
+    if analysis_id not in analyses["integrated"]:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    
+    stored = analyses["integrated"][analysis_id]
+    role_analysis = stored.get("role_analysis", {})
+    if "assignment_user_ids" not in role_analysis:
+        raise HTTPException(status_code=404, detail="Rôles non disponibles pour cette analyse")
+    
+    loop = asyncio.get_running_loop()
+    role_mining = await loop.run_in_executor(parse_executor, analyze_role_mining, role_analysis, threshold)
+    
+    return {
+        "analysis_id": analysis_id,
+        "timestamp": stored.get("timestamp", ""),
+        "role_mining": jsonable_encoder(role_mining)
+    }
+
+@app.post("/api/integrated-analysis/{analysis_id}/role-authorizations")
+async def update_integrated_analysis_role_authorizations(
+    analysis_id: str,
+    agr_1251_file: UploadFile = File(...),
+    mandt: Optional[str] = Form(None)
+):
+    """
+    Replace the authorization values (AGR_1251) of the roles present in the
+    uploaded extract for a completed integrated analysis; the values of the
+    other roles and the role assignments are kept. The report sections that
+    read role authorizations (critical_access, summary and the users' risk
+    scores) are recomputed and listed in updated_sections
+    """
+    if analysis_id not in analyses["integrated"]:
+        raise HTTPException(status_code=404, detail="Analyse non trouvée")
+    if not is_supported_upload(agr_1251_file.filename):
+        raise HTTPException(status_code=400, detail=f"Le fichier {agr_1251_file.filename} doit être au format CSV, TXT ou Excel (éventuellement compressé en GZ, BZ2 ou ZIP)")
+    
+    stored = analyses["integrated"][analysis_id]
+    role_analysis = stored.get("role_analysis", {})
+    auth_analysis = stored.get("auth_analysis", {})
+    if (
+        "assignment_user_ids" not in role_analysis
+        or "error" in auth_analysis
+        or "error" in stored.get("user_analysis", {"error": None})
+    ):
+        raise HTTPException(status_code=404, detail="Rôles non disponibles pour cette analyse")
+    
+    agr_1251_df, _ = await parse_upload(agr_1251_file, 'agr_1251', mandt)
+    agr_1251_df.columns = [col.upper() for col in agr_1251_df.columns]
+    missing = [field for field in ('AGR_NAME', 'OBJECT', 'FIELD', 'LOW') if field not in agr_1251_df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Champs manquants dans AGR_1251: {', '.join(missing)}")
+    
+    def update():
+        effective = auth_analysis.get(EFFECTIVE_AUTH_KEY)
+        if effective is None:
+            effective = EffectiveAuthorizations(role_analysis, agr_1251_df)
+        else:
+            effective = effective.with_updated_roles(agr_1251_df)
+        
+        # Requests running meanwhile keep reading the stored analysis: the
+        # dependent sections are recomputed on copies, then the stored entry
+        # is replaced in a single assignment
+        updated_auth = {**auth_analysis, EFFECTIVE_AUTH_KEY: effective}
+        critical_access = analyze_critical_access(updated_auth)
+        report = generate_report(
+            stored["user_analysis"], role_analysis, updated_auth, CONFIG, stored.get("user_fields"), critical_access
+        )
+        # The sections added after the report do not read role authorizations
+        analyses["integrated"][analysis_id] = {
+            **stored,
+            "report": {**stored["report"], **report},
+            "auth_analysis": updated_auth,
+            "critical_access": critical_access
+        }
+        return effective
+    
+    loop = asyncio.get_running_loop()
+    effective = await loop.run_in_executor(parse_executor, update)
+    
+    return {
+        "analysis_id": analysis_id,
+        "timestamp": stored.get("timestamp", ""),
+        "role_count": effective.role_count,
+        "authorization_count": len(effective.records),
+        "updated_sections": ["critical_access", "summary", "users"]
+    }
+
 @app.post("/api/analyze/usr02")
 async def analyze_usr02_endpoint(
     file: UploadFile = File(...),
-    date_range: Optional[str] = Form(None)
+    date_range: Optional[str] = Form(None),
+    mandt: Optional[str] = Form(None)
 ):
     """
     Analyze SAP USR02 file (user master data)
     """
-    if not file.filename.endswith(('.csv', '.txt', '.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Le fichier doit être au format CSV, TXT ou Excel")
+    if not is_supported_upload(file.filename):
+        raise HTTPException(status_code=400, detail="Le fichier doit être au format CSV, TXT ou Excel (éventuellement compressé en GZ, BZ2 ou ZIP)")
     
     # Parse date range if provided
     date_range_filter = None
@@ -494,11 +832,8 @@ async def analyze_usr02_endpoint(
             raise HTTPException(status_code=400, detail="Format de plage de dates invalide")
     
     try:
-        # Read the file
-        contents = await file.read()
-        
-        # Parse the file into a DataFrame
-        df = parse_file_to_dataframe(file.filename, BytesIO(contents))
+        # Parse the file into a DataFrame straight from the spooled upload
+        df, _ = await parse_upload(file, 'usr02', mandt)
         
         # Standardize column names
         df.columns = [col.upper() for col in df.columns]
@@ -616,6 +951,16 @@ async def health_check():
     """
     return {"status": "ok"}
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """
+    Retourne les compteurs du cache des tables analysées
+    """
+    cache = get_table_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
 @app.get("/api/audit-types")
 async def get_audit_types():
     """
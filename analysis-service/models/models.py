@@ -78,6 +78,7 @@ class USR02Results(BaseModel):
 
 class SoDConflict(BaseModel):
     username: str
+    client: Optional[str] = None
     conflictType: str
     roleSet1: List[str]
     roleSet2: List[str]
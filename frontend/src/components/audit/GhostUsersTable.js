@@ -29,15 +29,21 @@ const GhostUsersTable = ({ ghostUsers, onExport }) => {
   }
 
   // Create a modified data array with additional info for display
-  const dataSource = ghostUsers.users.map((username, index) => ({
+  const dataSource = ghostUsers.users.map((user, index) => ({
     key: index,
-    username,
+    client: user.client,
+    username: user.username,
     risk: "Moyen",
     recommendation: "Supprimer les assignations de rôles"
   }));
 
   // Define columns for ghost users
   const columns = [
+    {
+      title: 'Mandant',
+      dataIndex: 'client',
+      key: 'client',
+    },
     {
       title: 'Utilisateur',
       dataIndex: 'username',
@@ -29,9 +29,10 @@ const UsersWithoutRolesTable = ({ usersWithoutRoles, onExport }) => {
   }
 
   // Create a modified data array with additional info for display
-  const dataSource = usersWithoutRoles.users.map((username, index) => ({
+  const dataSource = usersWithoutRoles.users.map((user, index) => ({
     key: index,
-    username,
+    client: user.client,
+    username: user.username,
     status: "Inactif",
     risk: "Faible",
     recommendation: "Vérifier et supprimer si non nécessaire"
@@ -39,6 +40,11 @@ const UsersWithoutRolesTable = ({ usersWithoutRoles, onExport }) => {
 
   // Define columns for users without roles
   const columns = [
+    {
+      title: 'Mandant',
+      dataIndex: 'client',
+      key: 'client',
+    },
     {
       title: 'Utilisateur',
       dataIndex: 'username',
@@ -56,7 +56,7 @@ const FileUploadForm = ({ setError }) => {
           </label>
           <input
             type="file"
-            accept=".csv,.txt,.xlsx,.xls"
+            accept=".csv,.txt,.xlsx,.xls,.gz,.bz2,.zip"
             onChange={(e) => onFileChange(e, 'agrUsers')}
             className="block w-full text-sm text-gray-500
                     file:mr-4 file:py-2 file:px-4
@@ -77,7 +77,7 @@ const FileUploadForm = ({ setError }) => {
           </label>
           <input
             type="file"
-            accept=".csv,.txt,.xlsx,.xls"
+            accept=".csv,.txt,.xlsx,.xls,.gz,.bz2,.zip"
             onChange={(e) => onFileChange(e, 'usr02')}
             className="block w-full text-sm text-gray-500
                     file:mr-4 file:py-2 file:px-4
@@ -98,7 +98,7 @@ const FileUploadForm = ({ setError }) => {
           </label>
           <input
             type="file"
-            accept=".csv,.txt,.xlsx,.xls"
+            accept=".csv,.txt,.xlsx,.xls,.gz,.bz2,.zip"
             onChange={(e) => onFileChange(e, 'ust12')}
             className="block w-full text-sm text-gray-500
                     file:mr-4 file:py-2 file:px-4
@@ -1343,7 +1343,7 @@ const IntegratedAnalysisPage = () => {
     }
 
     // Validate file types
-    const validExtensions = ['.xlsx', '.xls', '.csv'];
+    const validExtensions = ['.xlsx', '.xls', '.csv', '.txt', '.gz', '.bz2', '.zip'];
     const filesToCheck = [files.agrUserFile, files.usr02File, files.ust12File];
     
     for (const file of filesToCheck) {
@@ -1913,7 +1913,7 @@ t au format attendu pour les tables SAP:\n
           <input
             type="file"
             onChange={(e) => handleFileChange('agrUserFile', e)}
-            accept=".xlsx,.xls,.csv"
+            accept=".xlsx,.xls,.csv,.txt,.gz,.bz2,.zip"
             className="block w-full text-sm text-gray-500
               file:mr-4 file:py-2 file:px-4
               file:rounded-md file:border-0
@@ -1935,7 +1935,7 @@ t au format attendu pour les tables SAP:\n
           <input
             type="file"
             onChange={(e) => handleFileChange('usr02File', e)}
-            accept=".xlsx,.xls,.csv"
+            accept=".xlsx,.xls,.csv,.txt,.gz,.bz2,.zip"
             className="block w-full text-sm text-gray-500
               file:mr-4 file:py-2 file:px-4
               file:rounded-md file:border-0
@@ -1957,7 +1957,7 @@ t au format attendu pour les tables SAP:\n
           <input
             type="file"
             onChange={(e) => handleFileChange('ust12File', e)}
-            accept=".xlsx,.xls,.csv"
+            accept=".xlsx,.xls,.csv,.txt,.gz,.bz2,.zip"
             className="block w-full text-sm text-gray-500
               file:mr-4 file:py-2 file:px-4
               file:rounded-md file:border-0
@@ -1988,7 +1988,7 @@ t au format attendu pour les tables SAP:\n
       <div className="mt-6 flex justify-between items-center">
         <div className="text-sm text-gray-500">
           <p>* Champs obligatoires</p>
-          <p>Formats acceptés: .xlsx, .xls, .csv</p>
+          <p>Formats acceptés: .xlsx, .xls, .csv, .txt (ou compressés en .gz, .bz2, .zip)</p>
         </div>
         <Button
           type="primary"
@@ -83,6 +83,7 @@ export const integrateAdditionalData = async (analysisId, usr02File = null, ust1
  * @param {File} files.agrUserFile - Fichier d'extraction AGR_USER
  * @param {File} files.usr02File - Fichier d'extraction USR02
  * @param {File} files.ust12File - Fichier d'extraction UST12
+ * @param {File} files.agr1251File - Fichier d'extraction AGR_1251 (optionnel)
  * @param {Object} dateRange - Plage de dates pour le filtrage (optionnel)
  * @returns {Promise<Object>} - Résultats de l'analyse intégrée
  */
@@ -101,6 +102,9 @@ export const runIntegratedAnalysis = async (files, dateRange) => {
   if (files.ust12File) {
     formData.append('ust12_file', files.ust12File);
   }
+  if (files.agr1251File) {
+    formData.append('agr_1251_file', files.agr1251File);
+  }
   
   // Add date range only if both start and end dates are provided
   if (dateRange && Array.isArray(dateRange) && dateRange.length === 2 && dateRange[0] && dateRange[1]) {
@@ -167,6 +171,99 @@ export const getAnalysisById = async (analysisId) => {
   }
 };
 
+/**
+ * Récupère le détail d'un utilisateur (rôles et autorisations) d'une analyse
+ * @param {string} analysisId - ID de l'analyse
+ * @param {string} client - Mandant de l'utilisateur
+ * @param {string} username - Nom de l'utilisateur
+ * @returns {Promise<Object>} - Détail de l'utilisateur
+ */
+export const getAnalysisUserDetails = async (analysisId, client, username) => {
+  try {
+    const endpoint = `${ANALYSIS_SERVICE_URL}/api/integrated-analysis/${analysisId}/users/${encodeURIComponent(client)}/${encodeURIComponent(username)}`;
+    const response = await fetch(endpoint, {
+      method: 'GET',
+      headers: {
+        'Accept': 'application/json'
+      }
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.detail || 'Failed to retrieve user details');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error retrieving user details:', error);
+    throw new Error(error.message || 'Failed to retrieve user details');
+  }
+};
+
+/**
+ * Récupère les utilisateurs dont les autorisations couvrent une valeur
+ * @param {string} analysisId - ID de l'analyse
+ * @param {string} authObject - Objet d'autorisation (ex. S_TCODE)
+ * @param {string} field - Champ d'autorisation (ex. TCD)
+ * @param {string} value - Valeur recherchée (ex. SU01)
+ * @returns {Promise<Object>} - Utilisateurs ayant accès à la valeur
+ */
+export const getAnalysisValueAccess = async (analysisId, authObject, field, value) => {
+  try {
+    const params = new URLSearchParams({ object: authObject, field, value });
+    const endpoint = `${ANALYSIS_SERVICE_URL}/api/integrated-analysis/${analysisId}/access?${params.toString()}`;
+    const response = await fetch(endpoint, {
+      method: 'GET',
+      headers: {
+        'Accept': 'application/json'
+      }
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.detail || 'Failed to retrieve value access');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error retrieving value access:', error);
+    throw new Error(error.message || 'Failed to retrieve value access');
+  }
+};
+
+/**
+ * Regroupe les utilisateurs aux ensembles de rôles similaires (role mining)
+ * @param {string} analysisId - ID de l'analyse
+ * @param {number} threshold - Similarité de Jaccard minimale (optionnel, ex. 0.8)
+ * @returns {Promise<Object>} - Groupes d'utilisateurs et utilisateurs isolés
+ */
+export const getAnalysisRoleMining = async (analysisId, threshold = null) => {
+  try {
+    const params = new URLSearchParams();
+    if (threshold !== null && threshold !== undefined) {
+      params.append('threshold', threshold);
+    }
+    const query = params.toString() ? `?${params.toString()}` : '';
+    const endpoint = `${ANALYSIS_SERVICE_URL}/api/integrated-analysis/${analysisId}/role-mining${query}`;
+    const response = await fetch(endpoint, {
+      method: 'GET',
+      headers: {
+        'Accept': 'application/json'
+      }
+    });
+
+    if (!response.ok) {
+      const errorData = await response.json();
+      throw new Error(errorData.detail || 'Failed to retrieve role mining');
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error retrieving role mining:', error);
+    throw new Error(error.message || 'Failed to retrieve role mining');
+  }
+};
+
 /**
  * Filtre les résultats d'analyse par plage de dates
  * @param {string} analysisId - ID de l'analyse